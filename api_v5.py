@@ -7,6 +7,37 @@
     `-a` - `绑定地址, 默认"127.0.0.1"`
     `-p` - `绑定端口, 默认9880`
     `-c` - `TTS配置文件路径, 默认"GPT_SoVITS/configs/tts_infer.yaml"`
+    `--max_queue` - `同时受理的合成请求上限 (排队+运行中), 超出时返回 429, 默认32`
+    `--max_client_requests` - `单个客户端同时受理的请求上限, 0 为不限制, 默认4`
+    `--bulk_share` - `批量/字幕任务最多占用的受理名额比例, 为实时流式请求留出余量, 默认0.5`
+    `--batch_window` - `跨请求合批等待窗口(秒), 0 为关闭, 默认0`
+    `--batch_max_requests` - `单次合批的最大请求数, 默认8`
+    `--batch_max_size` - `合批后的 batch_size 上限, 取各请求 batch_size 之和, 不超过此值与其中最大的 batch_size 两者的较大者, 默认16`
+    `--audio_cache_dir` - `合成音频磁盘缓存目录, 默认"音频缓存"`
+    `--audio_cache_memory_mb` - `合成音频内存缓存上限(MB), 0 为关闭, 默认256`
+    `--audio_cache_disk_mb` - `合成音频磁盘缓存上限(MB), 0 为关闭, 默认2048`
+    `--cache_random_seed` - `seed 为 -1 的请求也写入缓存(同参数将复用同一段音频)`
+    `--ref_cache_dir` - `参考音频特征缓存目录, 空字符串为不落盘, 默认"参考音频缓存"`
+    `--ref_cache_size` - `内存中保留特征的参考音频数量, 默认32`
+    `--text_cache_size` - `内存中保留的分句文本前端结果 (规范化文本, 音素, BERT 特征) 数量, 0 为关闭, 默认2048`
+    `--text_cache_dir` - `分句文本前端结果的磁盘缓存目录, 空字符串为不落盘, 默认""`
+    `--precompute_ref` - `启动后在后台为 /speakers 列出的全部参考音频预先提取特征`
+    `--model_pool_mb` - `常驻模型池的参数内存预算(MB), 超出时淘汰最久未用的模型; 默认模型与最近一次加载的模型不会被淘汰, 因此 0 为只保留这两个, 默认0`
+    `--workers` - `推理工作进程数, 每个进程持有独立的 TTS 实例并共享任务队列, 崩溃后自动重启; 0 为在服务进程内推理, 默认0`
+    `--warmup_text` - `模型加载后用于预热的合成文本, 空字符串为不预热, 默认"你好, 这是一句预热用的句子。"`
+    `--warmup_lang` - `预热文本的语言, 默认"zh"`
+    `--warmup_ref_audio` - `预热使用的参考音频, 默认使用 config.py 中的 llama_audio`
+    `--srt_dir` - `字幕任务的输出目录, 每个任务一个子目录, 默认"音频输出"`
+    `--srt_job_ttl` - `字幕任务完成后保留输出文件的秒数, 默认3600`
+    `--max_batch_messages` - `/tts_batch 单次最多接受的消息数, 默认256`
+    `--first_fragment_chars` - `low_latency 模式下首段的最大字数, 超出时在此范围内最后一个标点处截断, 0 为不截断, 默认50`
+    `--shard_chars` - `文本超过此字数时按 text_split_method 切分后均分为至多 --workers 个分片, 由多个推理工作进程并行推理, 按顺序拼接 (流式时首个分片完成即开始输出); 各分片的 seed 为 seed + 分片序号; 需要 --workers 2 以上, 0 为关闭, 默认0`
+    `--spill_chars` - `非流式请求的文本超过此字数时逐段推理并把编码结果写入临时文件, 以文件响应返回, 内存占用不随文本长度增长; 落盘的请求不经过音频缓存与相同请求合并; 0 为关闭, 默认0`
+    `--spill_dir` - `落盘输出的临时目录, 默认"音频临时文件"`
+    `--spill_ttl` - `seed 固定 (带 ETag) 的落盘输出保留的秒数, 其间相同请求与 Range 请求直接由文件返回, 每次命中顺延; 0 为发送后即删除, 默认600`
+    `--catalog_interval` - `参考音频与权重目录的轮询间隔(秒), 目录有变化时更新内存中的索引, 0 为只在启动时扫描一次, 默认5`
+    `--stream_frame_ms` - `流式输出把推理分段重新切成此时长的固定帧后再编码发送, 0 为按推理分段发送, 默认100`
+    `--stream_crossfade_ms` - `流式输出在推理分段衔接处做交叉淡化的时长(毫秒), 0 为关闭, 默认5`
 
 ## 调用:
 
@@ -38,20 +69,109 @@ POST:
     "streaming_mode": False,      # bool. whether to return a streaming response.
     "seed": -1,                   # int. random seed for reproducibility.
     "parallel_infer": True,       # bool. whether to use parallel inference.
-    "repetition_penalty": 1.35    # float. repetition penalty for T2S model.
+    "repetition_penalty": 1.35,   # float. repetition penalty for T2S model.
+    "model": None,                # str.(optional) 常驻模型名, 见 /models, 为空时使用默认模型
+    "media_type": "wav",          # str. 输出格式: "wav", "raw", "ogg", "aac", "opus"(Ogg Opus), "webm"(WebM Opus)
+    "sample_rate": None,          # int.(optional) 输出采样率, 服务端重采样; opus/webm 默认 48000, 其余默认模型采样率
+    "bitrate": None,              # int.(optional) aac/opus/webm 的比特率(kbps), 默认 aac 192, opus/webm 32
+    "low_latency": False          # bool.(optional) 流式模式下首段单独以 batch_size=1 先行推理, 其余分段照常合批, 缩短首段音频的等待时间
 }
 ```
 
 RESP:
-成功: 直接返回 wav 音频流， http code 200
+成功: 直接返回 wav 音频流， http code 200 (seed 固定且参数相同的请求直接返回缓存的音频, 不经过模型)
+    流式请求的音频按 --stream_frame_ms 切成固定时长的帧发送, 推理分段的衔接处按 --stream_crossfade_ms 交叉淡化
+    非流式请求的文本超过 --spill_chars 字时, 音频边推理边写入临时文件, 完成后以文件响应返回;
+    seed 固定时带 ETag 并保留 --spill_ttl 秒, 其间支持 Range / If-Range, 相同请求不再推理, GET 请求可用 If-None-Match 得到 304;
+    seed 为 -1 时文件发送后即删除, 不支持 Range
 失败: 返回包含错误信息的 json, http code 400
+服务繁忙: 返回包含错误信息的 json 与 Retry-After 头, http code 429
+    流式请求优先于非流式请求, 非流式请求优先于 /tts_to_audio/ 和 /srt 等批量任务
+
+### 批量合成
+
+endpoint: `/tts_batch`
+
+一次提交多条消息 (如重放或朗读整段聊天记录), 服务端统一规划: 参考音频与推理参数相同的消息合并为同一次推理,
+结果按消息顺序逐条返回, 每条完成即发送.
+
+POST:
+```json
+{
+    "messages": [                 # list.(required) 消息列表, 元素为字符串或对象
+        "第一条消息",
+        {"text": "第二条消息", "voice": "female"},                 # voice: 参考音频文件夹中的音色名, 同 /speakers
+        {"text": "第三条消息", "ref_audio_path": "xxx.wav", "prompt_text": "..."}   # 也可以覆盖其余任意推理参数
+    ],
+    "format": "ndjson",           # str. "ndjson" 或 "multipart"
+    ...                           # 其余字段同 POST /, 作为各条消息的默认值 (streaming_mode 不生效)
+}
+```
+
+RESP:
+ndjson: 每行一个 json `{"index": 0, "media_type": "wav", "audio": "<base64>"}`, 失败的消息为 `{"index": 0, "error": "..."}`
+multipart: `multipart/mixed`, 每条消息一个部分, 头部 `X-Message-Index` 为消息序号, 失败的消息为 application/json 部分
+参数错误: 返回包含错误信息的 json, http code 400; 服务繁忙时 http code 429
+
+### 增量合成 (WebSocket)
+
+endpoint: `/ws/tts`
+
+适用于 LLM 逐 token 输出的场景: 客户端边收到文本边推送, 服务端按 text_split_method 的规则增量分句,
+每闭合一句即提交推理, 音频按句子顺序推回同一个连接. 首段音频在第一句闭合后即可开始播放.
+
+客户端发送 (json 文本帧):
+```
+{"type": "start", ...}            # 第一帧, 其余字段同 POST / (不含 text), 可用 "voice" 代替 ref_audio_path; media_type 默认 raw
+{"type": "text", "text": "..."}   # 新增的文本片段
+{"type": "end"}                   # 文本结束, 剩余文本作为最后一句
+{"type": "cancel"}                # 放弃尚未播放的句子并结束
+```
+服务端发送:
+```
+{"type": "audio_start", "media_type": "raw", "sample_rate": 32000}   # 第一段音频之前
+{"type": "sentence", "index": 0, "text": "..."}                      # 该句的音频紧随其后以二进制帧发送
+{"type": "error", "index": 0, "message": "..."}                      # 单句失败, 后续句子继续
+{"type": "error", "message": "..."}                                  # 消息无效; start 帧无效时随后关闭连接, 其余消息被忽略
+{"type": "done"}                                                     # 全部句子发送完毕, 随后关闭连接
+```
+
+### 字幕任务
+
+endpoint: `/srt`
+
+GET/POST 参数同 `/`, 提交一个后台合成任务 (批量优先级), 输出固定为 wav 音频与 srt 字幕.
+字幕按实际推理的分句边界生成, 每句的结束时间不含其后 fragment_interval 的静音.
+
+RESP:
+已提交: http code 202
+```json
+{
+    "job_id": "...",
+    "status": "http://127.0.0.1:9880/srt/jobs/<job_id>",
+    "audio": "http://127.0.0.1:9880/srt/jobs/<job_id>/audio.wav",
+    "srt": "http://127.0.0.1:9880/srt/jobs/<job_id>/subtitles.srt"
+}
+```
+失败: 返回包含错误信息的 json, http code 400; 服务繁忙时 http code 429
+
+endpoint: `/srt/jobs/<job_id>`
+
+GET: 任务状态 status (queued, running, done, failed, cancelled), 已完成分句数 fragments_done / fragments_total,
+     已写入的音频时长 audio_seconds, 失败原因 error
+DELETE: 取消任务并删除输出文件
+
+endpoint: `/srt/jobs/<job_id>/audio.wav`, `/srt/jobs/<job_id>/subtitles.srt`
+
+GET: 下载输出文件, 支持 Range 请求; 任务运行中即可读取已写入的部分.
+任务结束 `--srt_job_ttl` 秒后输出文件被删除, 之后返回 http code 404
 
 ### 命令控制
 
 endpoint: `/control`
 
 command:
-"restart": 重新运行
+"restart": 重新加载模型 (supervisor 模式下依次重启各推理工作进程), 服务本身不中断
 "exit": 结束运行
 
 GET:
@@ -81,184 +201,2968 @@ RESP:
 失败: 返回包含错误信息的 json, http code 400
 
 
-### 切换Sovits模型
+### 切换Sovits模型
+
+endpoint: `/set_sovits_weights`
+
+GET:
+```
+http://127.0.0.1:9880/set_sovits_weights?weights_path=GPT_SoVITS/pretrained_models/s2G488k.pth
+```
+
+RESP: 
+成功: 返回"success", http code 200
+失败: 返回包含错误信息的 json, http code 400
+
+
+### 常驻模型池
+
+切换权重 (`/set_model`, `/set_gpt_weights`, `/set_sovits_weights`) 在后台加载新模型, 加载完成前旧模型继续服务,
+加载完成后设为默认模型. 其余已加载的模型在 `--model_pool_mb` 预算内保持常驻, 请求可通过 `model` 字段指定.
+默认模型与最近一次加载的模型总是保留, 即使超出预算; 预算为 0 时 `/load_model` 加载的模型保持常驻, 直到加载下一个模型.
+
+endpoint: `/load_model`
+
+GET:
+```
+http://127.0.0.1:9880/load_model?gpt_weights_path=GPT_weights_v2/xxx.ckpt&sovits_weights_path=SoVITS_weights_v2/xxx.pth
+```
+RESP:
+已常驻: 返回模型名, http code 200
+开始加载: 返回模型名, http code 202
+
+endpoint: `/models`
+
+RESP: 默认模型, 常驻模型及其参数占用, 正在加载的模型
+
+
+### 启动状态
+
+服务启动后立即监听端口, 模型在后台加载并预热, 期间提交的合成请求排队等待.
+
+endpoint: `/health`
+
+RESP: 进程存活即返回 http code 200, 内容同 /ready
+
+endpoint: `/ready`
+
+RESP:
+就绪: http code 200
+加载中/失败: http code 503 (加载中带 Retry-After 头)
+内容: 当前阶段 stage (loading_weights, warming_up, ready, failed), 就绪的推理工作进程数,
+      各阶段耗时 timings (imports, config, weights, warmup, 单位秒), 失败原因 error
+
+### 监控指标
+
+endpoint: `/metrics`
+
+RESP: Prometheus 文本格式的监控指标
+    tts_requests_total{endpoint, voice}                  请求数
+    tts_errors_total{endpoint, error}                    失败数, error 为 invalid_params, overloaded, disconnected, failed
+    tts_queue_wait_seconds                               任务在推理队列中的等待时间
+    tts_synthesis_seconds                                单个推理任务的执行时间
+    tts_real_time_factor                                 产出音频时长 / 推理时间 (每秒墙钟时间产出的音频秒数, 大于 1 快于实时)
+    tts_time_to_first_byte_seconds{streaming}            从收到请求到发出第一段音频的时间
+    tts_encode_seconds{media_type}                       音频编码耗时 (流式为每段)
+    tts_text_feature_cache_total{result}                 分句文本前端缓存的查询次数, result 为 memory_hit, disk_hit, miss
+    tts_queue_depth, tts_active_requests, tts_resident_models, tts_workers_ready    当前值
+
+### 音色与权重列表
+
+endpoint: `/speakers`
+
+RESP: 参考音频文件夹中的音色列表, 每项包含 name, voice_id, ref_audio_path (实际的文件名与扩展名),
+      duration (秒), sample_rate, channels, prompt_text (同名 .txt / .lab 文件的内容, 没有时为 null)
+
+endpoint: `/available_models`
+
+RESP: 各权重目录中的文件名 (gpt_weights, sovits_weights, gpt_weights_v2, sovits_weights_v2),
+      details 中为每个文件的 dir, file, kind (gpt / sovits), version (v1 / v2), size, mtime
+
+两个列表在启动时扫描一次并保存在内存中, 之后每 `--catalog_interval` 秒检查目录的修改时间, 只为新增或变化的文件重新读取元数据.
+响应带 ETag, 请求头 If-None-Match 与之相同时返回 http code 304.
+
+### 运行状态
+
+endpoint: `/stats`
+
+RESP: 推理队列长度 queue_depth, 因客户端断开而取消的任务数 cancelled_jobs, 在途合成数 inflight,
+      已受理的请求数 active_requests, 因过载被拒绝的请求数 rejected_requests,
+      推理工作进程状态 workers (pid, 是否存活, 是否就绪, 是否忙碌, 重启次数),
+      分句文本前端缓存 text_feature_cache (各结果的查询次数与命中率 hit_rate)
+    
+"""
+import os
+import sys
+import time
+import json
+import math
+import uuid
+import base64
+import queue
+import pickle
+import shutil
+import struct
+import tempfile
+import hashlib
+import asyncio
+import threading
+import itertools
+import traceback
+import concurrent.futures
+import multiprocessing
+from typing import Generator
+from collections import OrderedDict, deque
+
+startup_started = time.perf_counter()
+
+now_dir = os.getcwd()
+sys.path.append(now_dir)
+sys.path.append("%s/GPT_SoVITS" % (now_dir))
+
+from starlette.middleware.cors import CORSMiddleware  #引入 CORS中间件模块
+
+#设置允许访问的域名
+origins = ["*"]  #"*"，即为所有。
+
+import config as global_config
+
+import argparse
+import subprocess
+import wave
+import signal
+import weakref
+import numpy as np
+import torch
+import soundfile as sf
+from fastapi import FastAPI, Request, HTTPException, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
+from starlette.background import BackgroundTask
+from fastapi import FastAPI, UploadFile, File
+from fastapi.staticfiles import StaticFiles
+import uvicorn
+from io import BytesIO
+from tools.i18n.i18n import I18nAuto
+from GPT_SoVITS.TTS_infer_pack.TTS import TTS, TTS_Config
+from GPT_SoVITS.TTS_infer_pack.text_segmentation_method import get_method_names as get_cut_method_names
+from GPT_SoVITS.TTS_infer_pack.text_segmentation_method import get_method as get_cut_method
+from GPT_SoVITS.TTS_infer_pack.text_segmentation_method import splits as cut_punctuation
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+# print(sys.path)
+import_seconds = time.perf_counter() - startup_started
+i18n = I18nAuto()
+cut_method_names = get_cut_method_names()
+
+parser = argparse.ArgumentParser(description="GPT-SoVITS api")
+parser.add_argument("-c", "--tts_config", type=str, default="GPT_SoVITS/configs/tts_infer.yaml", help="tts_infer路径")
+parser.add_argument("-a", "--bind_addr", type=str, default="127.0.0.1", help="default: 127.0.0.1")
+parser.add_argument("-p", "--port", type=int, default="9880", help="default: 9880")
+parser.add_argument("--max_queue", type=int, default=32, help="同时受理的合成请求上限, default: 32")
+parser.add_argument("--max_client_requests", type=int, default=4, help="单个客户端同时受理的请求上限, 0 为不限制, default: 4")
+parser.add_argument("--bulk_share", type=float, default=0.5, help="批量任务最多占用的受理名额比例, default: 0.5")
+parser.add_argument("--batch_window", type=float, default=0.0, help="跨请求合批等待窗口(秒), 0 为关闭, default: 0")
+parser.add_argument("--batch_max_requests", type=int, default=8, help="单次合批的最大请求数, default: 8")
+parser.add_argument("--batch_max_size", type=int, default=16, help="合批后的 batch_size 上限, default: 16")
+parser.add_argument("--audio_cache_dir", type=str, default="音频缓存", help="合成音频磁盘缓存目录, default: 音频缓存")
+parser.add_argument("--audio_cache_memory_mb", type=int, default=256, help="合成音频内存缓存上限(MB), 0 为关闭, default: 256")
+parser.add_argument("--audio_cache_disk_mb", type=int, default=2048, help="合成音频磁盘缓存上限(MB), 0 为关闭, default: 2048")
+parser.add_argument("--cache_random_seed", action="store_true", help="seed 为 -1 的请求也写入缓存")
+parser.add_argument("--ref_cache_dir", type=str, default="参考音频缓存", help="参考音频特征缓存目录, 空字符串为不落盘, default: 参考音频缓存")
+parser.add_argument("--ref_cache_size", type=int, default=32, help="内存中保留特征的参考音频数量, default: 32")
+parser.add_argument("--text_cache_size", type=int, default=2048, help="内存中保留的分句文本前端结果数量, 0 为关闭, default: 2048")
+parser.add_argument("--text_cache_dir", type=str, default="", help="分句文本前端结果的磁盘缓存目录, 空字符串为不落盘")
+parser.add_argument("--precompute_ref", action="store_true", help="启动后在后台预先提取全部参考音频的特征")
+parser.add_argument("--model_pool_mb", type=int, default=0, help="常驻模型池的参数内存预算(MB), 0 为只保留默认模型与最近一次加载的模型, default: 0")
+parser.add_argument("--workers", type=int, default=0, help="推理工作进程数, 0 为在服务进程内推理, default: 0")
+parser.add_argument("--warmup_text", type=str, default="你好, 这是一句预热用的句子。", help="模型加载后用于预热的合成文本, 空字符串为不预热")
+parser.add_argument("--warmup_lang", type=str, default="zh", help="预热文本的语言, default: zh")
+parser.add_argument("--warmup_ref_audio", type=str, default=None, help="预热使用的参考音频, 默认使用 config.py 中的 llama_audio")
+parser.add_argument("--srt_dir", type=str, default="音频输出", help="字幕任务的输出目录, default: 音频输出")
+parser.add_argument("--srt_job_ttl", type=int, default=3600, help="字幕任务完成后保留输出文件的秒数, default: 3600")
+parser.add_argument("--max_batch_messages", type=int, default=256, help="/tts_batch 单次最多接受的消息数, default: 256")
+parser.add_argument("--first_fragment_chars", type=int, default=50, help="low_latency 模式下首段的最大字数, 0 为不截断, default: 50")
+parser.add_argument("--shard_chars", type=int, default=0, help="长文本分片并行推理的字数阈值, 需要 --workers 2 以上, 0 为关闭, default: 0")
+parser.add_argument("--spill_chars", type=int, default=0, help="非流式输出落盘的文本字数阈值, 0 为关闭, default: 0")
+parser.add_argument("--spill_dir", type=str, default="音频临时文件", help="落盘输出的临时目录, default: 音频临时文件")
+parser.add_argument("--spill_ttl", type=int, default=600, help="带 ETag 的落盘输出保留的秒数, 0 为发送后即删除, default: 600")
+parser.add_argument("--catalog_interval", type=float, default=5, help="参考音频与权重目录的轮询间隔(秒), 0 为只扫描一次, default: 5")
+parser.add_argument("--stream_frame_ms", type=int, default=100, help="流式输出的帧时长(毫秒), 0 为按推理分段发送, default: 100")
+parser.add_argument("--stream_crossfade_ms", type=float, default=5, help="流式输出分段衔接处的交叉淡化时长(毫秒), 0 为关闭, default: 5")
+args = parser.parse_args()
+config_path = args.tts_config
+# device = args.device
+port = args.port
+host = args.bind_addr
+
+if config_path in [None, ""]:
+    config_path = "GPT-SoVITS/configs/tts_infer.yaml"
+
+config_started = time.perf_counter()
+tts_config = TTS_Config(config_path)
+config_seconds = time.perf_counter() - config_started
+print(tts_config)
+
+
+class StartupProgress:
+    """启动进度与各阶段耗时(秒), 由 /health 与 /ready 报告"""
+    def __init__(self):
+        self.stage = "loading_weights"
+        self.stage_started = time.perf_counter()
+        self.timings:OrderedDict = OrderedDict(imports=round(import_seconds, 3), config=round(config_seconds, 3))
+        self.error:str = None
+        self.ready = threading.Event()
+
+    def enter(self, stage:str):
+        self.stage = stage
+        self.stage_started = time.perf_counter()
+
+    def record(self, phase:str, seconds:float):
+        self.timings[phase] = round(seconds, 3)
+
+    def finish(self, timings:dict=None):
+        if self.ready.is_set():
+            return
+        self.timings.update(timings or {})
+        self.stage = "ready"
+        self.error = None
+        self.ready.set()
+        print("startup finished: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.timings.items()))
+
+    def fail(self, error:Exception):
+        self.stage = "failed"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def snapshot(self) -> dict:
+        return {
+            "stage": self.stage,
+            "stage_seconds": None if self.ready.is_set() else round(time.perf_counter() - self.stage_started, 1),
+            "uptime": round(time.perf_counter() - startup_started, 1),
+            "timings": dict(self.timings),
+            "error": self.error,
+        }
+
+
+startup_progress = StartupProgress()
+
+
+def model_name(gpt_path:str, sovits_path:str) -> str:
+    return f"{os.path.normpath(gpt_path)}|{os.path.normpath(sovits_path)}"
+
+
+def model_weights(name:str) -> tuple:
+    gpt_path, sovits_path = name.split("|", 1)
+    return gpt_path, sovits_path
+
+
+def pipeline_nbytes(pipeline:TTS) -> int:
+    total = 0
+    for value in vars(pipeline).values():
+        if isinstance(value, torch.nn.Module):
+            total += sum(param.numel() * param.element_size() for param in value.parameters())
+    return total
+
+
+class ModelPool:
+    """
+    常驻模型池: 以 "GPT权重|SoVITS权重" 为名保存多个 TTS 实例, 请求可通过 model 字段指定其中之一.
+    新权重在后台线程中构建, 期间已有模型照常服务; 参数总占用超过 budget_bytes 时淘汰最久未用的模型
+    (默认模型与最近一次加载的模型除外, 因此 budget_bytes 为 0 时最多常驻这两个).
+    """
+    def __init__(self, pipeline:TTS, budget_bytes:int=0):
+        self.default = model_name(pipeline.configs.t2s_weights_path, pipeline.configs.vits_weights_path)
+        self.pipelines:OrderedDict = OrderedDict({self.default: pipeline})
+        self.sizes = {self.default: pipeline_nbytes(pipeline)}
+        self.budget_bytes = budget_bytes
+        self.loading:dict = {}
+        self.lock = threading.Lock()
+        self.loader = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-loader")
+
+    def has(self, name:str) -> bool:
+        with self.lock:
+            return name in self.pipelines
+
+    def resolve(self, name:str=None) -> str:
+        return name or self.default
+
+    def get(self, name:str=None) -> TTS:
+        name = self.resolve(name)
+        with self.lock:
+            if name not in self.pipelines:
+                raise KeyError(f"model {name} is not resident")
+            self.pipelines.move_to_end(name)
+            return self.pipelines[name]
+
+    def load(self, gpt_path:str, sovits_path:str) -> concurrent.futures.Future:
+        """在后台加载一对权重, 返回的 Future 完成时结果为模型名"""
+        name = model_name(gpt_path, sovits_path)
+        with self.lock:
+            if name in self.pipelines:
+                future = concurrent.futures.Future()
+                future.set_result(name)
+                return future
+            if name not in self.loading:
+                self.loading[name] = self.loader.submit(self._build, name, gpt_path, sovits_path)
+            return self.loading[name]
+
+    def _build(self, name:str, gpt_path:str, sovits_path:str) -> str:
+        try:
+            pipeline = self._construct(gpt_path, sovits_path)
+            with self.lock:
+                self.pipelines[name] = pipeline
+                self.sizes[name] = pipeline_nbytes(pipeline)
+                self._evict(keep=name)
+            return name
+        finally:
+            with self.lock:
+                self.loading.pop(name, None)
+
+    @staticmethod
+    def _construct(gpt_path:str, sovits_path:str) -> TTS:
+        for path in (gpt_path, sovits_path):
+            if not os.path.exists(path):
+                raise ValueError(f"{path} not exists")
+        config = TTS_Config(config_path)
+        config.t2s_weights_path = gpt_path
+        config.vits_weights_path = sovits_path
+        return new_pipeline(config)
+
+    def reload(self) -> str:
+        """重新读取配置并构建默认模型, 构建期间旧实例继续服务"""
+        name = self.default
+        pipeline = self._construct(*model_weights(name))
+        with self.lock:
+            self.pipelines[name] = pipeline
+            self.sizes[name] = pipeline_nbytes(pipeline)
+        return name
+
+    def _evict(self, keep:str):
+        evicted = False
+        while sum(self.sizes.values()) > self.budget_bytes and len(self.pipelines) > 1:
+            victim = next((name for name in self.pipelines if name not in (keep, self.default)), None)
+            if victim is None:
+                break
+            del self.pipelines[victim]
+            del self.sizes[victim]
+            evicted = True
+        if evicted and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def set_default(self, name:str):
+        with self.lock:
+            if name not in self.pipelines:
+                raise KeyError(f"model {name} is not resident")
+            self.default = name
+            self._evict(keep=name)
+
+    def status(self) -> dict:
+        with self.lock:
+            return {
+                "default": self.default,
+                "budget_mb": round(self.budget_bytes / 1024 / 1024, 1),
+                "resident": [{"model": name, "size_mb": round(self.sizes[name] / 1024 / 1024, 1)} for name in self.pipelines],
+                "loading": list(self.loading),
+            }
+
+
+def run_pool_op(pool:ModelPool, op:str, *args):
+    """模型池操作. 单进程模式下由前端线程调用, supervisor 模式下在每个推理工作进程内调用"""
+    if op == "load":
+        return pool.load(*args).result()
+    if op == "switch":
+        name = pool.load(*args).result()
+        pool.set_default(name)
+        return name
+    if op == "reload":
+        return pool.reload()
+    if op == "status":
+        return pool.default
+    raise ValueError(f"unknown model pool operation: {op}")
+
+
+def portable_error(e:Exception) -> Exception:
+    """工作进程的异常要经管道送回前端, 无法 pickle 的异常改为 RuntimeError"""
+    try:
+        pickle.dumps(e)
+        return e
+    except Exception:
+        return RuntimeError(f"{type(e).__name__}: {e}")
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(pairs) -> str:
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Prometheus 计数器, 按标签值分别计数. 推理线程与事件循环都会调用, 以锁保护"""
+    kind = "counter"
+
+    def __init__(self, name:str, help:str, labelnames:tuple=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values:dict = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount:float=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            for labels, value in self.values.items():
+                yield self.name, zip(self.labelnames, labels), value
+
+
+def drain_counter(counter:Counter) -> dict:
+    """取出并清零计数器的各项计数, 推理工作进程借此把进程内的计数交给前端累加"""
+    with counter.lock:
+        values = dict(counter.values)
+        counter.values.clear()
+    return values
+
+
+class Histogram(Counter):
+    """Prometheus 直方图, 输出累计的 _bucket, _sum 与 _count"""
+    kind = "histogram"
+
+    def __init__(self, name:str, help:str, buckets:tuple, labelnames:tuple=()):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value:float, *labels):
+        with self.lock:
+            counts, total = self.values.get(labels) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[next((index for index, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))] += 1
+            self.values[labels] = (counts, total + value)
+
+    def samples(self):
+        with self.lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+        for labels, counts, total in values:
+            pairs = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", pairs + [("le", "+Inf" if bound == float("inf") else repr(bound))], cumulative
+            yield f"{self.name}_sum", pairs, total
+            yield f"{self.name}_count", pairs, cumulative
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+REQUESTS = Counter("tts_requests_total", "TTS requests by endpoint and voice", ("endpoint", "voice"))
+ERRORS = Counter("tts_errors_total", "Failed TTS requests by endpoint and error class", ("endpoint", "error"))
+QUEUE_WAIT = Histogram("tts_queue_wait_seconds", "Time an inference job waits in the queue", LATENCY_BUCKETS)
+SYNTHESIS = Histogram("tts_synthesis_seconds", "Run time of an inference job", LATENCY_BUCKETS)
+REAL_TIME_FACTOR = Histogram("tts_real_time_factor", "Seconds of audio produced per second of inference time",
+                             (0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 20))
+TIME_TO_FIRST_BYTE = Histogram("tts_time_to_first_byte_seconds", "Time from request to the first audio bytes", LATENCY_BUCKETS, ("streaming",))
+ENCODE = Histogram("tts_encode_seconds", "Audio encoding time per call", (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5), ("media_type",))
+TEXT_FEATURES = Counter("tts_text_feature_cache_total", "Sentence text front-end cache lookups by result", ("result",))
+METRICS = [REQUESTS, ERRORS, QUEUE_WAIT, SYNTHESIS, REAL_TIME_FACTOR, TIME_TO_FIRST_BYTE, ENCODE, TEXT_FEATURES]
+
+
+def voice_label(req:dict) -> str:
+    path = req.get("ref_audio_path") or ""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def item_audio_seconds(item) -> float:
+    """推理任务产出项中的音频时长: (sr, audio, ...) 或其列表 (run_merged), 其余产出项计为 0"""
+    if isinstance(item, list):
+        return sum(item_audio_seconds(value) for value in item)
+    if isinstance(item, tuple) and len(item) >= 2 and isinstance(item[1], np.ndarray) and item[0]:
+        return len(item[1]) / item[0]
+    return 0.0
+
+
+def render_metrics(gauges:list) -> str:
+    """gauges 为 (名称, 说明, 当前值) 列表, 在抓取时计算"""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, pairs, value in metric.samples():
+            lines.append(f"{name}{format_labels(pairs)} {value}")
+    for name, help, value in gauges:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# 任务优先级, 数值越小越先执行
+PRIORITY_INTERACTIVE = 0  # 流式请求, 用户正在等待播放
+PRIORITY_NORMAL = 1  # 非流式请求
+PRIORITY_BULK = 2  # /tts_to_audio/, /srt, 预计算等批量任务
+
+
+class InferenceJob:
+    """
+    一个推理任务: 在推理线程 (或推理工作进程) 上执行 fn(pipeline, *args), 产出的每一项经事件循环交回异步处理函数.
+    使用 `async for item in job` 逐项读取, 或 `await job.result()` 只取第一项.
+    stopper 由执行器在任务开始运行时设置, 用于中断正在进行的推理.
+    """
+    _DONE = object()
+
+    def __init__(self, fn, args:tuple, loop:asyncio.AbstractEventLoop, model:str=None, priority:int=PRIORITY_NORMAL):
+        self.fn = fn
+        self.args = args
+        self.model = model
+        self.priority = priority
+        self.loop = loop
+        self.items:asyncio.Queue = asyncio.Queue()
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        self.stopper = None
+        self.submitted = time.perf_counter()
+        self.started:float = None
+        self.audio_seconds = 0.0
+
+    def begin(self):
+        """执行器开始运行任务时调用, 记录排队时间"""
+        self.started = time.perf_counter()
+        QUEUE_WAIT.observe(self.started - self.submitted)
+
+    def put(self, item):
+        self.audio_seconds += item_audio_seconds(item)
+        self.loop.call_soon_threadsafe(self.items.put_nowait, (item, None))
+
+    def finish(self, error:Exception=None):
+        if self.started is not None and error is None and not self.cancelled.is_set():
+            elapsed = time.perf_counter() - self.started
+            SYNTHESIS.observe(elapsed)
+            if self.audio_seconds > 0 and elapsed > 0:
+                REAL_TIME_FACTOR.observe(self.audio_seconds / elapsed)
+        self.loop.call_soon_threadsafe(self.items.put_nowait, (InferenceJob._DONE, error))
+
+    def cancel(self):
+        """
+        请求取消: 排队中的任务不再执行; 运行中的任务在当前分段后停止, 
+        同时调用 TTS.stop() 使推理在下一个 batch 前退出.
+        """
+        with self.lock:
+            if self.cancelled.is_set():
+                return
+            self.cancelled.set()
+            if self.stopper is not None:
+                self.stopper()
+
+    async def __aiter__(self):
+        while True:
+            item, error = await self.items.get()
+            if error is not None:
+                raise error
+            if item is InferenceJob._DONE:
+                return
+            yield item
+
+    async def result(self):
+        async for item in self:
+            return item
+        raise RuntimeError("inference job produced no result")
+
+
+class InferenceExecutor:
+    """
+    推理执行器: 独占模型池中的 TTS 实例, 在专用线程上执行有界优先队列中的任务, 使事件循环不被推理阻塞.
+    同优先级的任务按提交顺序执行; 任务在 job.model 指定的常驻模型上执行 (None 为默认模型). 队列满时 submit 抛出 queue.Full.
+    模型池在推理线程启动后才构建并预热, 期间提交的任务在队列中等待.
+    """
+    def __init__(self, max_queue:int=32):
+        self.pool:ModelPool = None
+        self.loaded = threading.Event()
+        self.jobs:queue.PriorityQueue = queue.PriorityQueue(maxsize=max(1, max_queue))
+        self.sequence = itertools.count()
+        self.cancelled_jobs = 0
+        self.busy = False
+        self.thread = threading.Thread(target=self._worker, name="tts-inference", daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args, model:str=None, priority:int=PRIORITY_NORMAL) -> InferenceJob:
+        job = InferenceJob(fn, args, asyncio.get_running_loop(), model, priority)
+        self.jobs.put_nowait((priority, next(self.sequence), job))
+        return job
+
+    def next_job(self, timeout:float=None) -> InferenceJob:
+        """取出下一个待执行的任务; 超时或取到已取消的任务时返回 None"""
+        try:
+            _, _, job = self.jobs.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if job.cancelled.is_set():
+            self.cancelled_jobs += 1
+            job.finish()
+            return None
+        return job
+
+    def _load(self):
+        try:
+            timings = load_model_pool()
+            self.pool = model_pool
+            model_registry.update(self.pool.status())
+            startup_progress.finish(timings)
+        except Exception as e:
+            traceback.print_exc()
+            startup_progress.fail(e)
+        finally:
+            self.loaded.set()
+
+    def _worker(self):
+        self._load()
+        while True:
+            job = self.next_job()
+            if job is None:
+                continue
+            self.busy = True
+            job.begin()
+            generator = None
+            try:
+                if self.pool is None:
+                    raise RuntimeError(f"model failed to load: {startup_progress.error}")
+                pipeline = self.pool.get(job.model)
+                with job.lock:
+                    job.stopper = getattr(pipeline, "stop", None)
+                generator = job.fn(pipeline, *job.args)
+                for item in generator:
+                    if job.cancelled.is_set():
+                        break
+                    job.put(item)
+                job.finish()
+            except Exception as e:
+                traceback.print_exc()
+                job.finish(e)
+            finally:
+                with job.lock:
+                    job.stopper = None
+                if hasattr(generator, "close"):
+                    generator.close()
+                self.busy = False
+            if job.cancelled.is_set():
+                self.cancelled_jobs += 1
+
+    def control(self, op:str, *args) -> tuple:
+        """执行模型池操作 (阻塞), 返回 (结果, 模型池状态)"""
+        self.loaded.wait()
+        if self.pool is None:
+            raise RuntimeError(f"model failed to load: {startup_progress.error}")
+        return run_pool_op(self.pool, op, *args), self.pool.status()
+
+    def restart(self):
+        threading.Thread(target=self.control, args=("reload",), name="tts-reload", daemon=True).start()
+
+    def status(self) -> list:
+        return [{"worker": 0, "pid": os.getpid(), "alive": self.thread.is_alive(), "ready": self.pool is not None,
+                 "busy": self.busy, "restarts": 0}]
+
+
+def worker_cancel_loop(cancel_event, state:dict):
+    while True:
+        cancel_event.wait()
+        stop = getattr(state.get("pipeline"), "stop", None)
+        if stop is not None:
+            stop()
+        while cancel_event.is_set():
+            time.sleep(0.05)
+
+
+def worker_control_loop(control_conn):
+    while True:
+        try:
+            op, op_args = control_conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            control_conn.send((True, (run_pool_op(model_pool, op, *op_args), model_pool.status())))
+        except Exception as e:
+            traceback.print_exc()
+            control_conn.send((False, portable_error(e)))
+
+
+def warm_up(pipeline:TTS):
+    """
+    用 --warmup_text 完整合成一次, 触发 CUDA kernel 选择, cudnn/JIT 编译与 BERT/G2P 等缓存初始化,
+    使第一个真实请求不再承担这部分耗时. 未配置文本或参考音频时跳过.
+    """
+    ref_audio_path = args.warmup_ref_audio or getattr(global_config, "llama_audio", None)
+    if not args.warmup_text or ref_audio_path in [None, ""] or not os.path.exists(ref_audio_path):
+        print("warm-up skipped: no warm-up text or reference audio")
+        return
+    req = TTS_Request(text=args.warmup_text,
+                      text_lang=args.warmup_lang,
+                      ref_audio_path=ref_audio_path,
+                      prompt_text=getattr(global_config, "llama_text", "") if not args.warmup_ref_audio else "",
+                      prompt_lang=getattr(global_config, "llama_prompt_lang", args.warmup_lang)).dict()
+    for _ in run_tts(pipeline, dict(req, return_fragment=False)):
+        pass
+
+
+def load_model_pool(default:str=None, resident:list=()) -> dict:
+    """
+    构建模型池 (按需恢复默认模型与其余常驻模型) 并预热, 结果存入全局 model_pool, 返回 weights / warmup 两个阶段的耗时.
+    """
+    global model_pool
+    started = time.perf_counter()
+    startup_progress.enter("loading_weights")
+    pool = ModelPool(new_pipeline(tts_config), args.model_pool_mb * 1024 * 1024)
+    if default is not None:
+        for name in [default] + [name for name in resident if name != default]:
+            try:
+                run_pool_op(pool, "switch" if name == default else "load", *model_weights(name))
+            except Exception:
+                traceback.print_exc()
+    timings = {"weights": round(time.perf_counter() - started, 3)}
+
+    started = time.perf_counter()
+    startup_progress.enter("warming_up")
+    try:
+        warm_up(pool.get())
+    except Exception:
+        traceback.print_exc()
+    timings["warmup"] = round(time.perf_counter() - started, 3)
+    model_pool = pool
+    return timings
+
+
+def worker_main(conn, control_conn, cancel_event, default:str, resident:list, num_threads:int):
+    """
+    推理工作进程入口: 构建自己的模型池并恢复前端记录的默认模型与常驻模型, 之后逐个执行前端经 conn 派发的任务.
+    模型池操作由 control_conn 上的线程处理, 取消信号由 cancel_event 上的线程转为 TTS.stop().
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 由前端处理
+    torch.set_num_threads(num_threads)
+    timings = load_model_pool(default, resident)
+
+    state = {"pipeline": None}
+    threading.Thread(target=worker_control_loop, args=(control_conn,), name="tts-control", daemon=True).start()
+    threading.Thread(target=worker_cancel_loop, args=(cancel_event, state), name="tts-cancel", daemon=True).start()
+    conn.send(("ready", (os.getpid(), model_pool.status(), timings)))
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        fn, fn_args, model = message
+        generator = None
+        try:
+            state["pipeline"] = model_pool.get(model)
+            generator = fn(state["pipeline"], *fn_args)
+            for item in generator:
+                if cancel_event.is_set():
+                    break
+                conn.send(("item", item))
+            conn.send(("done", drain_counter(TEXT_FEATURES)))
+        except Exception as e:
+            traceback.print_exc()
+            conn.send(("error", portable_error(e)))
+        finally:
+            state["pipeline"] = None
+            if hasattr(generator, "close"):
+                generator.close()
+
+
+class WorkerDied(Exception):
+    pass
+
+
+class WorkerSlot:
+    """
+    一个推理工作进程及其在前端的派发线程. 派发线程从执行器的共享队列取任务, 经管道交给进程执行并转交产出;
+    空闲时每秒检查一次进程是否存活. 进程退出 (崩溃或被 restart 终止) 时当前任务以错误结束, 随后重新拉起进程.
+    draining 为 True 时不再从队列取任务, 滚动重启据此等待进程空闲; 取任务与置 busy 之间由 dispatching 覆盖, 两者都在 lock 下设置.
+    """
+    def __init__(self, executor, index:int):
+        self.executor = executor
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.control_conn = None
+        self.cancel_event = None
+        self.pid = None
+        self.ready = False
+        self.busy = False
+        self.dispatching = False
+        self.draining = False
+        self.lock = threading.Lock()
+        self.restarts = 0
+        self.failures = 0
+        self.timings:dict = None
+        self.thread = threading.Thread(target=self._run, name=f"tts-worker-{index}", daemon=True)
+        self.thread.start()
+
+    def _spawn(self):
+        context = self.executor.context
+        self.conn, child_conn = context.Pipe()
+        self.control_conn, child_control_conn = context.Pipe()
+        self.cancel_event = context.Event()
+        self.process = context.Process(target=worker_main, name=f"tts-worker-{self.index}", daemon=True,
+                                       args=(child_conn, child_control_conn, self.cancel_event, model_registry.default,
+                                             list(model_registry.resident), self.executor.num_threads))
+        self.process.start()
+        child_conn.close()
+        child_control_conn.close()
+        _, (self.pid, status, self.timings) = self._recv()
+        model_registry.update(status)
+        self.ready = True
+        self.failures = 0
+        print(f"inference worker {self.index} ready, pid {self.pid}")
+        startup_progress.finish(self.timings)
+
+    def _recv(self):
+        while not self.conn.poll(1.0):
+            if not self.process.is_alive():
+                raise WorkerDied(f"inference worker {self.index} exited with code {self.process.exitcode}")
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            raise WorkerDied(f"inference worker {self.index} exited with code {self.process.exitcode}")
+
+    def _run(self):
+        while True:
+            try:
+                self._spawn()
+                self._serve()
+            except WorkerDied as e:
+                print(e)
+                if not self.ready and not startup_progress.ready.is_set():
+                    startup_progress.fail(e)
+            except Exception:
+                traceback.print_exc()
+            if not self.ready:
+                self.failures += 1
+            self.ready = False
+            self._cleanup()
+            self.restarts += 1
+            time.sleep(min(30, 2 ** self.failures) if self.failures else 0.1)
+
+    def _serve(self):
+        while True:
+            with self.lock:
+                draining = self.draining
+                self.dispatching = not draining
+            if draining:
+                job = None
+                time.sleep(0.1)
+            else:
+                try:
+                    job = self.executor.next_job(timeout=1.0)
+                    self.busy = job is not None
+                finally:
+                    self.dispatching = False
+            if job is None:
+                if not self.process.is_alive():
+                    raise WorkerDied(f"inference worker {self.index} exited with code {self.process.exitcode}")
+                continue
+            try:
+                self._execute(job)
+            finally:
+                self.busy = False
+            if job.cancelled.is_set():
+                self.executor.cancelled_jobs += 1
+
+    def _execute(self, job:InferenceJob):
+        job.begin()
+        self.cancel_event.clear()
+        with job.lock:
+            job.stopper = self.cancel_event.set
+            if job.cancelled.is_set():
+                self.cancel_event.set()
+        try:
+            try:
+                self.conn.send((job.fn, job.args, job.model))
+            except (BrokenPipeError, EOFError, OSError):
+                raise WorkerDied(f"inference worker {self.index} is gone")
+            while True:
+                kind, payload = self._recv()
+                if kind == "item":
+                    if not job.cancelled.is_set():
+                        job.put(payload)
+                elif kind == "error":
+                    job.finish(payload)
+                    return
+                else:
+                    for labels, amount in (payload or {}).items():
+                        TEXT_FEATURES.inc(*labels, amount=amount)
+                    job.finish()
+                    return
+        except WorkerDied as e:
+            job.finish(RuntimeError(str(e)))
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            job.finish(e)
+        finally:
+            with job.lock:
+                job.stopper = None
+
+    def _cleanup(self):
+        for conn in (self.conn, self.control_conn):
+            if conn is not None:
+                conn.close()
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+        if self.process is not None:
+            self.process.join(1)
+
+    def control(self, op:str, *args) -> tuple:
+        self.control_conn.send((op, args))
+        ok, payload = self.control_conn.recv()
+        if not ok:
+            raise payload
+        return payload
+
+    def terminate(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+
+    def status(self) -> dict:
+        return {"worker": self.index, "pid": self.pid, "alive": self.process is not None and self.process.is_alive(),
+                "ready": self.ready, "busy": self.busy, "restarts": self.restarts, "timings": self.timings}
+
+
+class WorkerPoolExecutor(InferenceExecutor):
+    """
+    supervisor 模式的推理执行器: num_workers 个推理工作进程 (spawn) 各自构建 TTS 实例与模型池, 共享同一个有界优先队列,
+    接口与 InferenceExecutor 相同. 任务函数与参数经管道 pickle 传给进程, 因此必须是模块级函数.
+    CPU 推理时各进程分摊 torch 线程数, 使多核得到利用.
+    """
+    def __init__(self, num_workers:int, max_queue:int=32):
+        self.jobs:queue.PriorityQueue = queue.PriorityQueue(maxsize=max(1, max_queue))
+        self.sequence = itertools.count()
+        self.cancelled_jobs = 0
+        self.context = multiprocessing.get_context("spawn")
+        self.num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+        self.control_lock = threading.Lock()
+        self.slots = [WorkerSlot(self, index) for index in range(num_workers)]
+
+    def control(self, op:str, *args) -> tuple:
+        """对每个就绪的工作进程执行同一模型池操作, 返回第一个进程的 (结果, 模型池状态); 未就绪的进程启动时按前端记录恢复"""
+        with self.control_lock:
+            outcome = None
+            for slot in self.slots:
+                if not slot.ready:
+                    continue
+                try:
+                    result = slot.control(op, *args)
+                except (EOFError, OSError):
+                    continue
+                if outcome is None:
+                    outcome = result
+            if outcome is None:
+                raise RuntimeError("no inference worker is ready")
+            return outcome
+
+    def restart(self):
+        threading.Thread(target=self._rolling_restart, name="tts-restart", daemon=True).start()
+
+    def _rolling_restart(self):
+        """
+        逐个重启工作进程: 先将其标记为 draining 不再取新任务, 等待其空闲 (最多 60 秒) 后终止,
+        等新进程就绪后恢复取任务并处理下一个, 其余进程继续服务
+        """
+        for slot in self.slots:
+            with slot.lock:
+                slot.draining = True
+            try:
+                deadline = time.time() + 60
+                while (slot.busy or slot.dispatching) and time.time() < deadline:
+                    time.sleep(0.1)
+                restarts = slot.restarts
+                slot.terminate()
+                deadline = time.time() + 600
+                while (slot.restarts == restarts or not slot.ready) and time.time() < deadline:
+                    time.sleep(0.5)
+            finally:
+                with slot.lock:
+                    slot.draining = False
+
+    def status(self) -> list:
+        return [slot.status() for slot in self.slots]
+
+
+# prompt_cache 中与参考文本相关的字段, 其余字段 (prompt_semantic, refer_spec 等) 只取决于参考音频和模型
+REF_TEXT_KEYS = ("ref_audio_path", "aux_ref_audio_paths", "prompt_text", "prompt_lang", "phones", "bert_features", "norm_text")
+
+
+def move_tensors(obj, device):
+    if isinstance(obj, torch.Tensor):
+        return obj.to(device)
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(move_tensors(item, device) for item in obj)
+    if isinstance(obj, dict):
+        return {key: move_tensors(value, device) for key, value in obj.items()}
+    return obj
+
+
+class RefAudioCache:
+    """
+    参考音频特征缓存: 保存 set_ref_audio 提取出的 prompt_semantic / refer_spec 等特征,
+    以 (路径, mtime, 大小, 模型版本, SoVITS 权重) 为键. 内存中保留最近使用的 max_entries 条, 并写入 disk_dir 使重启后仍可命中.
+    只在推理线程上使用; supervisor 模式下每个工作进程各有一份内存缓存, 磁盘缓存共享.
+    """
+    def __init__(self, disk_dir:str=None, max_entries:int=32):
+        self.memory:OrderedDict = OrderedDict()
+        self.max_entries = max(1, max_entries)
+        self.disk_dir = disk_dir or None
+        self.applied:dict = {}
+        if self.disk_dir is not None:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(pipeline:TTS, path:str) -> str:
+        stat = os.stat(path)
+        payload = json.dumps([os.path.abspath(path), stat.st_mtime_ns, stat.st_size,
+                              pipeline.configs.version, pipeline.configs.vits_weights_path], ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _load(self, pipeline:TTS, key:str):
+        features = self.memory.get(key)
+        if features is not None:
+            self.memory.move_to_end(key)
+            return features
+        if self.disk_dir is None:
+            return None
+        path = os.path.join(self.disk_dir, f"{key}.pt")
+        if not os.path.exists(path):
+            return None
+        try:
+            features = torch.load(path, map_location=pipeline.configs.device)
+        except Exception:
+            traceback.print_exc()
+            return None
+        self._remember(key, features)
+        return features
+
+    def _remember(self, key:str, features:dict):
+        self.memory[key] = features
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def prepare(self, pipeline:TTS, path:str):
+        """确保 pipeline 的 prompt_cache 已装入 path 的特征, TTS.run 遇到相同路径时不再重新提取"""
+        if path in [None, ""] or not os.path.exists(path):
+            return
+        key = self.key(pipeline, path)
+        if self.applied.get(id(pipeline)) == key and pipeline.prompt_cache.get("ref_audio_path") == path:
+            return
+        features = self._load(pipeline, key)
+        if features is None:
+            pipeline.set_ref_audio(path)
+            features = {name: value for name, value in pipeline.prompt_cache.items()
+                        if name not in REF_TEXT_KEYS and value is not None}
+            if "refer_spec" in features:
+                # set_ref_audio 只覆盖第 0 项, 其后可能残留上一个请求的辅助参考音频, 只缓存主参考音频的一项
+                features["refer_spec"] = features["refer_spec"][:1]
+            self._remember(key, features)
+            if self.disk_dir is not None:
+                # 多个推理工作进程共用缓存目录, 先写临时文件再替换, 避免读到写了一半的文件
+                cache_path = os.path.join(self.disk_dir, f"{key}.pt")
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                torch.save(move_tensors(features, "cpu"), tmp_path)
+                os.replace(tmp_path, cache_path)
+        # 复制一层列表, 防止 TTS.run 拼接辅助参考音频时改动缓存的条目
+        pipeline.prompt_cache.update({name: list(value) if isinstance(value, list) else value for name, value in features.items()})
+        pipeline.prompt_cache["ref_audio_path"] = path
+        # refer_spec 只剩主参考音频, 清空已记录的辅助参考音频, 由 TTS.run 按请求重新提取
+        pipeline.prompt_cache["aux_ref_audio_paths"] = []
+        self.applied[id(pipeline)] = key
+
+
+class TextFeatureCache:
+    """
+    分句文本前端缓存: 包装 text_preprocessor.segment_and_extract_feature_for_text (分句之后, T2S 之前),
+    保存每个分句的 (音素, BERT 特征, 规范化文本), 以 (分句文本, 语言, 模型版本, BERT 模型) 为键.
+    内存中在 CPU 上保留最近使用的 max_entries 条, 命中时移回推理设备; 给出 disk_dir 时同时落盘, 重启后仍可命中.
+    目标文本与参考文本都经过这里. 只在推理线程上使用.
+    """
+    def __init__(self, disk_dir:str=None, max_entries:int=2048):
+        self.memory:OrderedDict = OrderedDict()
+        self.max_entries = max(1, max_entries)
+        self.disk_dir = disk_dir or None
+        if self.disk_dir is not None:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(pipeline:TTS, text:str, language:str, version:str) -> str:
+        payload = json.dumps([text.strip(), language, version or pipeline.configs.version,
+                              getattr(pipeline.configs, "bert_base_path", None)], ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _remember(self, key:str, features:tuple):
+        self.memory[key] = features
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _load(self, key:str):
+        features = self.memory.get(key)
+        if features is not None:
+            self.memory.move_to_end(key)
+            TEXT_FEATURES.inc("memory_hit")
+            return features
+        path = os.path.join(self.disk_dir, f"{key}.pt") if self.disk_dir is not None else None
+        if path is not None and os.path.exists(path):
+            try:
+                features = tuple(torch.load(path, map_location="cpu"))
+                self._remember(key, features)
+                TEXT_FEATURES.inc("disk_hit")
+                return features
+            except Exception:
+                traceback.print_exc()
+        TEXT_FEATURES.inc("miss")
+        return None
+
+    def _store(self, key:str, features:tuple):
+        self._remember(key, features)
+        if self.disk_dir is not None:
+            # 多个推理工作进程共用缓存目录, 先写临时文件再替换
+            path = os.path.join(self.disk_dir, f"{key}.pt")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            torch.save(list(features), tmp_path)
+            os.replace(tmp_path, path)
+
+    def install(self, pipeline:TTS):
+        preprocessor = pipeline.text_preprocessor
+        extract = getattr(preprocessor, "segment_and_extract_feature_for_text", None)
+        if extract is None:
+            return
+
+        def cached_extract(text, language, version=None, *args, **kwargs):
+            if not isinstance(text, str):
+                # 旧版接口一次传入分句列表, 不缓存
+                return extract(text, language, *([] if version is None else [version]), *args, **kwargs)
+            key = self.key(pipeline, text, language, version)
+            features = self._load(key)
+            if features is None:
+                phones, bert_features, norm_text = extract(text, language, *([] if version is None else [version]), *args, **kwargs)
+                if phones is None:
+                    return phones, bert_features, norm_text
+                features = (list(phones), move_tensors(bert_features, "cpu"), norm_text)
+                self._store(key, features)
+            phones, bert_features, norm_text = features
+            # 返回副本, 调用方修改音素列表不影响缓存的条目
+            return list(phones), move_tensors(bert_features, pipeline.configs.device), norm_text
+
+        preprocessor.segment_and_extract_feature_for_text = cached_extract
+
+
+def new_pipeline(config:TTS_Config) -> TTS:
+    pipeline = TTS(config)
+    if text_feature_cache is not None:
+        text_feature_cache.install(pipeline)
+    return pipeline
+
+
+def run_tts(pipeline:TTS, req:dict):
+    ref_audio_cache.prepare(pipeline, req.get("ref_audio_path"))
+    yield from pipeline.run(req)
+
+
+def load_ref_audio(pipeline:TTS, path:str):
+    if path in [None, ""] or not os.path.exists(path):
+        raise ValueError(f"{path} not exists")
+    ref_audio_cache.prepare(pipeline, path)
+    yield None
+
+
+# 合批要求这些参数完全一致, 否则各请求单独推理
+BATCH_KEY_FIELDS = ("model", "ref_audio_path", "aux_ref_audio_paths", "prompt_text", "prompt_lang", "text_lang",
+                    "top_k", "top_p", "temperature", "text_split_method", "batch_threshold", "speed_factor",
+                    "fragment_interval", "seed", "parallel_infer", "repetition_penalty")
+
+
+def run_single(pipeline:TTS, req:dict):
+    ref_audio_cache.prepare(pipeline, req.get("ref_audio_path"))
+    req = dict(req, return_fragment=False)
+    generator = pipeline.run(req)
+    try:
+        return next(generator)
+    finally:
+        generator.close()
+
+
+def run_merged(pipeline:TTS, reqs:list):
+    """
+    将多个请求的文本分段合并为一次 TTS.run, 输出按请求拆回, 产出一个 [(sr, audio), ...] 列表.
+    合并后的文本以换行分隔各段并使用 cut0, 使 pre_seg_text 按原分段切开; 
+    任何一段过短(会被 merge_short_text_in_array 跨请求合并)或推理结果段数对不上时退回逐个推理.
+    """
+    ref_audio_cache.prepare(pipeline, reqs[0].get("ref_audio_path"))
+    preprocessor = pipeline.text_preprocessor
+    texts, counts = [], []
+    for req in reqs:
+        fragments = preprocessor.pre_seg_text(req["text"], req["text_lang"], req["text_split_method"])
+        if len(fragments) == 0 or min(len(fragment) for fragment in fragments) < 5:
+            yield [run_single(pipeline, req) for req in reqs]
+            return
+        texts.extend(fragments)
+        counts.append(len(fragments))
+
+    # 各请求 batch_size 之和, 以 --batch_max_size 为上限 (单个请求本身的 batch_size 更大时以它为准), 避免显存溢出
+    batch_sizes = [max(1, int(req.get("batch_size", 1))) for req in reqs]
+    merged = dict(reqs[0],
+                  text="\n".join(texts),
+                  text_split_method="cut0",
+                  split_bucket=False,
+                  return_fragment=False,
+                  batch_size=min(sum(batch_sizes), max(max(batch_sizes), args.batch_max_size)))
+
+    postprocess = pipeline.audio_postprocess
+    def split_postprocess(audio, sr, batch_index_list=None, *args, **kwargs):
+        # split_bucket=False 时各 batch 保持原顺序, 展平后即为按文本顺序排列的分段
+        fragments = sum(audio, [])
+        if len(fragments) != len(texts):
+            return sr, None
+        outputs, start = [], 0
+        for count in counts:
+            outputs.append(postprocess([fragments[start:start + count]], sr, None, *args, **kwargs))
+            start += count
+        return sr, outputs
+
+    pipeline.audio_postprocess = split_postprocess
+    try:
+        sr, outputs = run_single(pipeline, merged)
+    finally:
+        del pipeline.audio_postprocess
+    if not isinstance(outputs, list):
+        outputs = [run_single(pipeline, req) for req in reqs]
+    yield outputs
+
+
+def run_timed(pipeline:TTS, req:dict):
+    """
+    以 return_fragment 方式推理并给出分句边界: 先产出分句文本列表, 之后每段音频产出 (sr, audio, lengths),
+    lengths 为该段中各分句的采样点数 (含其后 fragment_interval 的静音), 总和等于 len(audio).
+    """
+    ref_audio_cache.prepare(pipeline, req.get("ref_audio_path"))
+    yield pipeline.text_preprocessor.pre_seg_text(req["text"], req["text_lang"], req["text_split_method"])
+
+    lengths = []
+    postprocess = pipeline.audio_postprocess
+    def timed_postprocess(audio, sr, batch_index_list=None, speed_factor=1.0, split_bucket=True, fragment_interval=0.3):
+        # return_fragment 模式下 split_bucket 关闭, 每次调用只有一个 batch, 分句按文本顺序排列
+        sizes = [fragment.shape[-1] + int(sr * fragment_interval) for fragment in sum(audio, [])]
+        sr, data = postprocess(audio, sr, batch_index_list, speed_factor, split_bucket, fragment_interval)
+        # 按比例校正到实际输出长度, 兼容在后处理中变速的版本
+        scale = len(data) / max(1, sum(sizes))
+        bounds = np.round(np.cumsum(sizes) * scale).astype(np.int64)
+        lengths.append(np.diff(bounds, prepend=0).tolist())
+        return sr, data
+
+    pipeline.audio_postprocess = timed_postprocess
+    try:
+        for sr, audio in pipeline.run(dict(req, return_fragment=True)):
+            yield sr, audio, lengths.pop(0) if lengths else [len(audio)]
+    finally:
+        del pipeline.audio_postprocess
+
+
+class MicroBatcher:
+    """
+    跨请求动态合批: 在 window 秒内到达且 BATCH_KEY_FIELDS 一致的非流式请求合并为一次推理, 
+    各自的文本分段组成同一批次, 结果再拆回给每个调用者. 单个请求最多额外等待 window 秒.
+    """
+    def __init__(self, executor:InferenceExecutor, window:float, max_requests:int=8):
+        self.executor = executor
+        self.window = window
+        self.max_requests = max(1, max_requests)
+        self.pending:dict = {}
+
+    @staticmethod
+    def batch_key(req:dict) -> str:
+        return json.dumps([req.get(field) for field in BATCH_KEY_FIELDS], ensure_ascii=False, default=str)
+
+    async def run(self, req:dict, priority:int=PRIORITY_NORMAL):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = self.batch_key(req)
+        group = self.pending.get(key)
+        if group is None:
+            group = self.pending[key] = []
+            loop.call_later(self.window, self._flush, key, group)
+        entry = (req, future, priority)
+        group.append(entry)
+        if len(group) >= self.max_requests:
+            self._flush(key, group)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # 尚未发出的请求从分组中撤回, 不再占用合并后的批次
+            if self.pending.get(key) is group and entry in group:
+                group.remove(entry)
+                if not group:
+                    del self.pending[key]
+            raise
+
+    def _flush(self, key:str, group:list):
+        if self.pending.get(key) is not group:
+            return
+        del self.pending[key]
+        asyncio.ensure_future(self._dispatch(group))
+
+    async def _dispatch(self, group:list):
+        group = [entry for entry in group if not entry[1].done()]
+        if not group:
+            return
+        reqs = [req for req, _, _ in group]
+        model = reqs[0].get("model")
+        priority = min(priority for _, _, priority in group)
+        try:
+            if len(reqs) == 1:
+                results = [await self.executor.submit(run_tts, dict(reqs[0], return_fragment=False), model=model, priority=priority).result()]
+            else:
+                results = await self.executor.submit(run_merged, reqs, model=model, priority=priority).result()
+        except Exception as e:
+            for _, future, _ in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+
+# 决定合成结果的请求字段, 作为音频缓存键的一部分 (media_type / streaming_mode 只影响封装, 不参与)
+CACHE_KEY_FIELDS = ("text", "text_lang", "ref_audio_path", "aux_ref_audio_paths", "prompt_text", "prompt_lang",
+                    "top_k", "top_p", "temperature", "text_split_method", "batch_size", "batch_threshold",
+                    "split_bucket", "speed_factor", "fragment_interval", "seed", "parallel_infer", "repetition_penalty")
+
+
+def file_signature(path:str):
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return [path, None, None]
+    return [path, stat.st_mtime_ns, stat.st_size]
+
+
+def normalize_request(req:dict) -> dict:
+    normalized = {}
+    for field in CACHE_KEY_FIELDS:
+        value = req.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+            if field in ("text_lang", "prompt_lang"):
+                value = value.lower()
+        elif isinstance(value, float) or (isinstance(value, int) and not isinstance(value, bool)):
+            value = round(float(value), 6)
+        normalized[field] = value
+    return normalized
+
+
+def request_hash(req:dict) -> str:
+    """请求的规范化哈希: 归一化后的请求字段 + 参考音频文件签名 + 当前加载的权重"""
+    normalized = normalize_request(req)
+    normalized["ref_audio"] = file_signature(req.get("ref_audio_path"))
+    normalized["aux_ref_audio"] = [file_signature(path) for path in (req.get("aux_ref_audio_paths") or [])]
+    normalized["model"] = model_registry.resolve(req.get("model"))
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    合成音频缓存, 以 request_hash 为键保存 (sr, int16 音频).
+    内存层为按字节数限制的 LRU; 磁盘层将音频存为 wav 文件, 总大小超限时删除最久未访问的文件.
+    """
+    def __init__(self, memory_bytes:int, disk_dir:str=None, disk_bytes:int=0):
+        self.memory:OrderedDict = OrderedDict()
+        self.memory_bytes = memory_bytes
+        self.memory_used = 0
+        self.disk_dir = disk_dir if disk_bytes > 0 else None
+        self.disk_bytes = disk_bytes
+        self.disk_used = 0
+        self.lock = threading.Lock()
+        if self.disk_dir is not None:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self.disk_used = sum(entry.stat().st_size for entry in os.scandir(self.disk_dir) if entry.name.endswith(".wav"))
+
+    def _remember(self, key:str, sr:int, audio:np.ndarray):
+        if audio.nbytes > self.memory_bytes:
+            return
+        with self.lock:
+            old = self.memory.pop(key, None)
+            if old is not None:
+                self.memory_used -= old[1].nbytes
+            self.memory[key] = (sr, audio)
+            self.memory_used += audio.nbytes
+            while self.memory_used > self.memory_bytes:
+                _, (_, evicted) = self.memory.popitem(last=False)
+                self.memory_used -= evicted.nbytes
+
+    def _disk_path(self, key:str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.wav")
+
+    def _read_disk(self, key:str):
+        path = self._disk_path(key)
+        try:
+            audio, sr = sf.read(path, dtype="int16")
+            os.utime(path)
+        except Exception:
+            return None
+        return sr, audio
+
+    def _write_disk(self, key:str, sr:int, audio:np.ndarray):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            sf.write(tmp_path, audio, sr, format="wav", subtype="PCM_16")
+            with self.lock:
+                # 同一键重写时 os.replace 覆盖旧文件, 先减去旧文件的大小
+                if os.path.exists(path):
+                    self.disk_used -= os.path.getsize(path)
+                os.replace(tmp_path, path)
+                self.disk_used += os.path.getsize(path)
+        except Exception:
+            traceback.print_exc()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self.lock:
+            if self.disk_used <= self.disk_bytes:
+                return
+            entries = sorted((entry for entry in os.scandir(self.disk_dir) if entry.name.endswith(".wav")),
+                             key=lambda entry: entry.stat().st_mtime)
+            for entry in entries:
+                if self.disk_used <= self.disk_bytes:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                self.disk_used -= size
+
+    async def get(self, key:str):
+        with self.lock:
+            hit = self.memory.get(key)
+            if hit is not None:
+                self.memory.move_to_end(key)
+                return hit
+        if self.disk_dir is None:
+            return None
+        hit = await asyncio.to_thread(self._read_disk, key)
+        if hit is not None:
+            self._remember(key, *hit)
+        return hit
+
+    async def put(self, key:str, sr:int, audio:np.ndarray):
+        self._remember(key, sr, audio)
+        if self.disk_dir is not None:
+            await asyncio.to_thread(self._write_disk, key, sr, audio)
+
+
+class SharedJob:
+    """
+    一次正在进行的合成, 可被多个等待者共享: 后加入的流式等待者先收到已产出的分段, 再接收后续分段.
+    所有等待者都在拿到完整结果之前离开时取消底层任务; 已拿到所需结果的等待者离开不算放弃.
+    """
+    def __init__(self, source, cancel=None, on_finish=None):
+        self.items = []
+        self.finished = False
+        self.error:Exception = None
+        self.waiters = 0
+        self.abandoned = False
+        self.cancel = cancel
+        self.on_finish = on_finish
+        self.condition = asyncio.Condition()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source):
+        try:
+            async for item in source:
+                self.items.append(item)
+                async with self.condition:
+                    self.condition.notify_all()
+        except asyncio.CancelledError:
+            self.error = RuntimeError("tts job cancelled")
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+            async with self.condition:
+                self.condition.notify_all()
+            if self.on_finish is not None:
+                await self.on_finish(self)
+
+    async def stream(self, limit:int=None):
+        """依次交出产出的分段; limit 为需要的分段数, 交出第 limit 个分段后即视为已拿到完整结果"""
+        self.waiters += 1
+        index = 0
+        delivered = False
+        try:
+            while True:
+                while index < len(self.items):
+                    index += 1
+                    delivered = limit is not None and index >= limit
+                    yield self.items[index - 1]
+                    if delivered:
+                        return
+                if self.finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                async with self.condition:
+                    await self.condition.wait_for(lambda: index < len(self.items) or self.finished)
+        finally:
+            self.waiters -= 1
+            if self.waiters == 0 and not self.finished and not delivered:
+                self.abandoned = True
+                if self.cancel is not None:
+                    self.cancel()
+                self.task.cancel()
+
+    async def result(self):
+        items = self.stream(limit=1)
+        try:
+            async for item in items:
+                return item
+        finally:
+            # 立即关闭生成器, 不留给 GC 的 asyncgen 终结器在任务结束前执行 finally
+            await items.aclose()
+        raise RuntimeError("tts job produced no result")
+
+
+class SingleFlight:
+    """按请求的规范化哈希合并相同的在途合成, 重复请求挂到已在运行的任务上而不再调用模型"""
+    def __init__(self):
+        self.inflight:dict = {}
+
+    def join(self, key:str, start) -> SharedJob:
+        shared = self.inflight.get(key)
+        if shared is None or shared.abandoned:
+            shared = start()
+            self.inflight[key] = shared
+        return shared
+
+    def release(self, key:str, shared:SharedJob):
+        if self.inflight.get(key) is shared:
+            del self.inflight[key]
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after:int):
+        super().__init__(f"server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    def __init__(self, controller:"AdmissionController", client:str, priority:int):
+        self.controller = controller
+        self.client = client
+        self.priority = priority
+        self.start = time.perf_counter()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self, time.perf_counter() - self.start)
+
+
+class AdmissionController:
+    """
+    准入控制: 限制同时受理的请求数和每个客户端的并发请求数, 批量任务最多占用 bulk_share 比例的名额, 
+    为实时流式请求留出余量. 超限时 admit 立即抛出 Overloaded, 其 retry_after 按近期请求的平均耗时估算.
+    只在事件循环线程上使用.
+    """
+    def __init__(self, max_active:int, max_per_client:int=0, bulk_share:float=0.5):
+        self.max_active = max(1, max_active)
+        self.max_per_client = max_per_client
+        self.bulk_limit = max(1, int(self.max_active * bulk_share))
+        self.active = 0
+        self.active_bulk = 0
+        self.per_client:dict = {}
+        self.avg_seconds = 2.0
+        self.rejected = 0
+
+    def retry_after(self) -> int:
+        return max(1, min(60, math.ceil(self.avg_seconds * max(1, self.active))))
+
+    def admit(self, client:str, priority:int) -> AdmissionTicket:
+        if (self.active >= self.max_active
+                or (priority >= PRIORITY_BULK and self.active_bulk >= self.bulk_limit)
+                or (self.max_per_client > 0 and self.per_client.get(client, 0) >= self.max_per_client)):
+            self.rejected += 1
+            raise Overloaded(self.retry_after())
+        self.active += 1
+        if priority >= PRIORITY_BULK:
+            self.active_bulk += 1
+        self.per_client[client] = self.per_client.get(client, 0) + 1
+        return AdmissionTicket(self, client, priority)
+
+    def _release(self, ticket:AdmissionTicket, seconds:float):
+        self.active -= 1
+        if ticket.priority >= PRIORITY_BULK:
+            self.active_bulk -= 1
+        self.per_client[ticket.client] -= 1
+        if self.per_client[ticket.client] <= 0:
+            del self.per_client[ticket.client]
+        self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * seconds
+
+
+def client_id(request:Request=None) -> str:
+    if request is None or request.client is None:
+        return "local"
+    return request.client.host
+
+
+def audio_cache_key(req:dict):
+    if audio_cache is None:
+        return None
+    if req.get("seed", -1) == -1 and not args.cache_random_seed:
+        return None
+    return request_hash(req)
+
+
+def srt_timestamp(seconds:float) -> str:
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+
+class SrtJob:
+    """
+    一个字幕任务: 音频与字幕写入 dir 下的 audio.wav 和 subtitles.srt, 每收到一段推理结果就追加写入.
+    wave 模块每次写入都会更新头部长度, 任务运行中读取到的文件也是完整可播放的 wav.
+    write / close 在线程池中执行.
+    """
+    def __init__(self, job_id:str, dir:str, fragment_interval:float):
+        self.id = job_id
+        self.dir = dir
+        self.fragment_interval = fragment_interval
+        self.status = "queued"
+        self.error:str = None
+        self.created = time.time()
+        self.finished:float = None
+        self.texts:list = []
+        self.fragments_done = 0
+        self.samples = 0
+        self.sr:int = None
+        self.inference:InferenceJob = None
+        self.task:asyncio.Task = None
+        self.wav:wave.Wave_write = None
+        self.srt = None
+        os.makedirs(dir, exist_ok=True)
+
+    def path(self, name:str) -> str:
+        return os.path.join(self.dir, name)
+
+    def write(self, sr:int, audio:np.ndarray, lengths:list):
+        if self.wav is None:
+            self.sr = sr
+            self.wav = wave.open(self.path("audio.wav"), "wb")
+            self.wav.setnchannels(1)
+            self.wav.setsampwidth(2)
+            self.wav.setframerate(sr)
+            self.srt = open(self.path("subtitles.srt"), "w", encoding="utf-8")
+        self.wav.writeframes(pcm_bytes(audio))
+        interval = int(sr * self.fragment_interval)
+        for length in lengths:
+            start = self.samples / sr
+            end = (self.samples + max(0, length - interval)) / sr
+            text = self.texts[self.fragments_done] if self.fragments_done < len(self.texts) else ""
+            self.fragments_done += 1
+            self.samples += length
+            self.srt.write(f"{self.fragments_done}\n{srt_timestamp(start)} --> {srt_timestamp(end)}\n{text.strip()}\n\n")
+        self.srt.flush()
+
+    def close(self):
+        if self.wav is not None:
+            self.wav.close()
+            self.srt.close()
+            self.wav = self.srt = None
+
+    def done(self) -> bool:
+        return self.status in ["done", "failed", "cancelled"]
+
+    def snapshot(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "fragments_done": self.fragments_done,
+            "fragments_total": len(self.texts),
+            "audio_seconds": round(self.samples / self.sr, 3) if self.sr else 0,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class SrtJobs:
+    """字幕任务表: 任务在后台执行, 结束 ttl 秒后连同输出目录一起删除; 启动时清理上次运行遗留的过期目录"""
+    def __init__(self, root:str, ttl:int=3600):
+        self.root = root
+        self.ttl = ttl
+        self.jobs:dict = {}
+        os.makedirs(root, exist_ok=True)
+
+    def get(self, job_id:str) -> SrtJob:
+        return self.jobs.get(job_id)
+
+    def submit(self, req:dict, ticket:AdmissionTicket) -> SrtJob:
+        """提交推理任务 (队列满时抛出 queue.Full), 返回的 SrtJob 在后台写出结果并在结束时释放 ticket"""
+        job_id = uuid.uuid4().hex
+        inference = submit_synthesis(run_timed, req, PRIORITY_BULK)
+        job = self.jobs[job_id] = SrtJob(job_id, os.path.join(self.root, job_id), float(req.get("fragment_interval", 0.3)))
+        job.inference = inference
+        job.task = asyncio.ensure_future(self._run(job, ticket))
+        return job
+
+    async def _run(self, job:SrtJob, ticket:AdmissionTicket):
+        try:
+            async for item in job.inference:
+                if isinstance(item, list):
+                    # 分句列表; 分片任务的每个分片在其音频之前各给出一次
+                    job.status = "running"
+                    job.texts.extend(item)
+                    continue
+                await asyncio.to_thread(job.write, *item)
+            job.status = "done"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            ERRORS.inc("/srt", "failed")
+        finally:
+            job.finished = time.time()
+            ticket.release()
+            await asyncio.to_thread(job.close)
+
+    async def delete(self, job_id:str) -> bool:
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return False
+        job.inference.cancel()
+        if not job.task.done():
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+        await asyncio.to_thread(shutil.rmtree, job.dir, True)
+        return True
+
+    async def collect(self, interval:float=60):
+        while True:
+            now = time.time()
+            for job_id in [job.id for job in self.jobs.values() if job.done() and now - job.finished > self.ttl]:
+                await self.delete(job_id)
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if name not in self.jobs and os.path.isdir(path) and now - os.path.getmtime(path) > self.ttl:
+                    await asyncio.to_thread(shutil.rmtree, path, True)
+            await asyncio.sleep(interval)
+
+
+class ModelRegistry:
+    """
+    前端持有的模型池状态副本: 模型实例在推理执行器一侧 (可能在其他进程), 每次模型池操作后用返回的状态刷新,
+    供参数检查, 缓存键和 /models 使用.
+    """
+    def __init__(self, default:str):
+        self.default = default
+        self.resident = [default]
+        self.loading:set = set()
+        self.status = {"default": default, "budget_mb": args.model_pool_mb, "resident": [{"model": default, "size_mb": None}]}
+
+    def update(self, status:dict):
+        self.status = status
+        self.resident = [item["model"] for item in status["resident"]]
+        self.default = status["default"]
+
+    def has(self, name:str) -> bool:
+        return name in self.resident
+
+    def resolve(self, name:str=None) -> str:
+        return name or self.default
+
+    def weights(self, name:str=None) -> tuple:
+        return model_weights(self.resolve(name))
+
+    def snapshot(self) -> dict:
+        return dict(self.status, loading=sorted(self.loading))
+
+
+ref_audio_cache = RefAudioCache(args.ref_cache_dir, args.ref_cache_size)
+text_feature_cache = TextFeatureCache(args.text_cache_dir, args.text_cache_size) if args.text_cache_size > 0 else None
+model_registry = ModelRegistry(model_name(tts_config.t2s_weights_path, tts_config.vits_weights_path))
+single_flight = SingleFlight()
+admission = AdmissionController(args.max_queue, args.max_client_requests, args.bulk_share)
+
+
+class DirectoryIndex:
+    """
+    若干目录的内存索引: 保存每个文件的 (mtime, size) 与 describe 给出的元数据.
+    scan 只在目录 mtime 变化时重新列目录, 并只为新增的文件调用 describe; full=True 时逐个 stat, 覆盖原地改写的文件.
+    只在 Catalog 的扫描线程上调用.
+    """
+    def __init__(self, dirs:list, accept, describe):
+        self.dirs = dirs
+        self.accept = accept
+        self.describe = describe
+        self.entries:dict = {}
+        self.dir_mtimes:dict = {}
+
+    def scan(self, full:bool=False) -> bool:
+        changed = False
+        seen = set()
+        for dir in self.dirs:
+            try:
+                mtime = os.stat(dir).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime is not None and not full and self.dir_mtimes.get(dir) == mtime:
+                seen.update(key for key in self.entries if key[0] == dir)
+                continue
+            self.dir_mtimes[dir] = mtime
+            names = [name for name in os.listdir(dir) if self.accept(name)] if mtime is not None else []
+            for name in names:
+                key = (dir, name)
+                if not full and key in self.entries:
+                    seen.add(key)
+                    continue
+                path = os.path.join(dir, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                if not os.path.isfile(path):
+                    continue
+                seen.add(key)
+                signature = (info.st_mtime_ns, info.st_size)
+                old = self.entries.get(key)
+                if old is None or old[0] != signature:
+                    self.entries[key] = (signature, self.describe(path, name, info))
+                    changed = True
+        for key in [key for key in self.entries if key not in seen]:
+            del self.entries[key]
+            changed = True
+        return changed
+
+    def items(self) -> list:
+        return [(dir, name, entry) for (dir, name), (_, entry) in sorted(self.entries.items())]
+
+
+VOICE_DIR = "参考音频"
+VOICE_EXTENSIONS = [".wav", ".mp3", ".flac", ".ogg", ".m4a"]
+PROMPT_TEXT_EXTENSIONS = [".txt", ".lab"]
+WEIGHT_DIRS = {"gpt_weights": "GPT_weights", "sovits_weights": "SoVITS_weights",
+               "gpt_weights_v2": "GPT_weights_v2", "sovits_weights_v2": "SoVITS_weights_v2"}
+
+
+def describe_voice_file(path:str, name:str, info:os.stat_result) -> dict:
+    extension = os.path.splitext(name)[1].lower()
+    if extension in PROMPT_TEXT_EXTENSIONS:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return {"prompt_text": f.read().strip()}
+    entry = {"duration": None, "sample_rate": None, "channels": None}
+    try:
+        audio_info = sf.info(path)
+        entry.update(duration=round(audio_info.duration, 3), sample_rate=audio_info.samplerate, channels=audio_info.channels)
+    except Exception as e:
+        print(f"read {path} failed: {e}")
+    return entry
+
+
+def describe_weight_file(path:str, name:str, info:os.stat_result) -> dict:
+    dir = os.path.basename(os.path.dirname(path))
+    return {
+        "dir": dir,
+        "file": name,
+        "kind": "gpt" if name.endswith(".ckpt") else "sovits",
+        "version": "v2" if dir.endswith("_v2") else "v1",
+        "size": info.st_size,
+        "mtime": info.st_mtime,
+    }
+
+
+class Catalog:
+    """
+    参考音频与权重目录的内存索引: 启动时在线程中扫描一次, 之后按间隔轮询. 
+    /speakers 与 /available_models 的响应体和 ETag 只在内容变化时重新生成, 请求直接返回内存中的结果.
+    """
+    def __init__(self, voice_dir:str=VOICE_DIR, weight_dirs:dict=WEIGHT_DIRS):
+        self.voice_dir = voice_dir
+        self.weight_dirs = weight_dirs
+        self.voices = DirectoryIndex([voice_dir], lambda name: os.path.splitext(name)[1].lower() in VOICE_EXTENSIONS + PROMPT_TEXT_EXTENSIONS,
+                                     describe_voice_file)
+        self.weights = DirectoryIndex(list(weight_dirs.values()), lambda name: name.endswith((".ckpt", ".pth")), describe_weight_file)
+        self.voice_paths:dict = {}
+        self.payloads:dict = {}
+        self.scans = 0
+        self.built = asyncio.Event()
+
+    @staticmethod
+    def render(content) -> tuple:
+        body = json.dumps(content, ensure_ascii=False).encode("utf-8")
+        return body, f'"{hashlib.sha1(body).hexdigest()}"'
+
+    def _render_speakers(self):
+        prompt_texts, audio, voices, paths = {}, [], [], {}
+        for dir, name, entry in self.voices.items():
+            stem, extension = os.path.splitext(name)
+            if extension.lower() in PROMPT_TEXT_EXTENSIONS:
+                prompt_texts.setdefault(stem, entry["prompt_text"])
+            else:
+                audio.append((VOICE_EXTENSIONS.index(extension.lower()), stem, os.path.join(dir, name), entry))
+        # 同名的多个音频文件按 VOICE_EXTENSIONS 的顺序取第一个
+        for _, stem, path, entry in sorted(audio, key=lambda item: item[0]):
+            if stem in paths:
+                continue
+            paths[stem] = path
+            voices.append(dict(name=stem, voice_id=stem, ref_audio_path=paths[stem], prompt_text=prompt_texts.get(stem), **entry))
+        voices.sort(key=lambda voice: voice["name"])
+        self.voice_paths = paths
+        self.payloads["speakers"] = self.render(voices)
+
+    def _render_models(self):
+        content = {key: [] for key in self.weight_dirs}
+        details = []
+        extensions = {"gpt": ".ckpt", "sovits": ".pth"}
+        for dir, name, entry in self.weights.items():
+            for key, weight_dir in self.weight_dirs.items():
+                if weight_dir == dir and name.endswith(extensions[key.split("_")[0]]):
+                    content[key].append(name)
+            details.append(entry)
+        content["details"] = details
+        self.payloads["available_models"] = self.render(content)
+
+    def refresh(self, full:bool=False):
+        if self.voices.scan(full) or "speakers" not in self.payloads:
+            self._render_speakers()
+        if self.weights.scan(full) or "available_models" not in self.payloads:
+            self._render_models()
+
+    async def watch(self, interval:float, full_every:int=12):
+        """首次完整扫描后每 interval 秒轮询, 每 full_every 次轮询做一次完整 stat 检查"""
+        await asyncio.to_thread(self.refresh, True)
+        self.built.set()
+        while interval > 0:
+            await asyncio.sleep(interval)
+            self.scans += 1
+            try:
+                await asyncio.to_thread(self.refresh, self.scans % full_every == 0)
+            except Exception:
+                traceback.print_exc()
+
+    async def payload(self, name:str) -> tuple:
+        await self.built.wait()
+        return self.payloads[name]
+
+    def voice_path(self, voice:str) -> str:
+        return self.voice_paths.get(voice)
+
+
+# 以下由 init_server 在服务启动时创建; 推理工作进程导入本模块时不创建, 只在 worker_main 中构建自己的 model_pool
+model_pool:ModelPool = None
+tts_executor:InferenceExecutor = None
+micro_batcher:MicroBatcher = None
+audio_cache:AudioCache = None
+srt_jobs:SrtJobs = None
+catalog:Catalog = None
+spill_store:"SpillStore" = None
+
+
+def init_server():
+    """创建推理执行器与前端缓存, 不等待模型加载: 模型在推理线程或工作进程中构建, 进度见 startup_progress"""
+    global tts_executor, micro_batcher, audio_cache, srt_jobs, catalog, spill_store
+    if args.workers > 0:
+        tts_executor = WorkerPoolExecutor(args.workers, args.max_queue)
+    else:
+        tts_executor = InferenceExecutor(args.max_queue)
+    if args.batch_window > 0:
+        micro_batcher = MicroBatcher(tts_executor, args.batch_window, args.batch_max_requests)
+    if args.audio_cache_memory_mb > 0 or args.audio_cache_disk_mb > 0:
+        audio_cache = AudioCache(args.audio_cache_memory_mb * 1024 * 1024, args.audio_cache_dir, args.audio_cache_disk_mb * 1024 * 1024)
+    srt_jobs = SrtJobs(args.srt_dir, args.srt_job_ttl)
+    catalog = Catalog()
+    if args.spill_chars > 0:
+        clear_spill_dir(args.spill_dir)
+        if args.spill_ttl > 0:
+            spill_store = SpillStore(args.spill_ttl)
+
+APP = FastAPI()
+
+
+APP.add_middleware(
+    CORSMiddleware, 
+    allow_origins=origins,  #设置允许的origins来源
+    allow_credentials=True,
+    allow_methods=["*"],  # 设置允许跨域的http方法，比如 get、post、put等。
+    allow_headers=["*"])  #允许跨域的headers，可以用来鉴别来源等作用。
+
+
+class TTS_Request(BaseModel):
+    text: str = None
+    text_lang: str = None
+    ref_audio_path: str = None
+    aux_ref_audio_paths: list = None
+    prompt_lang: str = None
+    prompt_text: str = ""
+    top_k:int = 5
+    top_p:float = 1
+    temperature:float = 1
+    text_split_method:str = "cut5"
+    batch_size:int = 1
+    batch_threshold:float = 0.75
+    split_bucket:bool = True
+    speed_factor:float = 1.0
+    fragment_interval:float = 0.3
+    seed:int = -1
+    media_type:str = "wav"
+    streaming_mode:bool = False
+    parallel_infer:bool = True
+    repetition_penalty:float = 1.35
+    model:str = None
+    sample_rate:int = None
+    bitrate:int = None
+    low_latency:bool = False
+
+
+class TTS_Batch_Request(TTS_Request):
+    messages: list = None
+    format: str = "ndjson"
+
+### modify from https://github.com/RVC-Boss/GPT-SoVITS/pull/894/files
+def pack_ogg(io_buffer:BytesIO, data:np.ndarray, rate:int):
+    with sf.SoundFile(io_buffer, mode='w', samplerate=rate, channels=1, format='ogg') as audio_file:
+        audio_file.write(data)
+    return io_buffer
+
+def replace_speaker(text):
+
+    return re.sub(r"\[.*?\]", "", text, flags=re.UNICODE)
+
+
+PCM_BLOCK = 1 << 16
+
+
+def pcm16(data:np.ndarray, out:np.ndarray=None) -> np.ndarray:
+    """
+    转换为 C 连续的小端 int16 PCM. int16 输入在不需要拷贝时原样返回; 浮点输入视为 [-1, 1],
+    按 PCM_BLOCK 分块缩放, 取整并截断, 临时内存不随音频长度增长. 给出 out 时直接写入 out.
+    """
+    data = np.asarray(data).reshape(-1)
+    if out is None and data.dtype == np.dtype("<i2"):
+        return np.ascontiguousarray(data)
+    if out is None:
+        out = np.empty(len(data), dtype="<i2")
+    if not np.issubdtype(data.dtype, np.floating):
+        np.clip(data, -32768, 32767, out=out, casting="unsafe")
+        return out
+    block = np.empty(min(len(data), PCM_BLOCK), dtype=np.float32)
+    for start in range(0, len(data), PCM_BLOCK):
+        end = min(start + PCM_BLOCK, len(data))
+        chunk = block[:end - start]
+        np.multiply(data[start:end], 32767, out=chunk, casting="unsafe")
+        np.rint(chunk, out=chunk)
+        np.clip(chunk, -32768, 32767, out=chunk)
+        out[start:end] = chunk
+    return out
+
+
+def pcm_bytes(data:np.ndarray) -> memoryview:
+    """int16 PCM 的字节视图, 与 numpy 数组共用内存, 不经过 tobytes 拷贝"""
+    return memoryview(pcm16(data)).cast("B")
+
+
+def wav_header(sample_rate:int, num_samples:int, channels:int=1, sample_width:int=2) -> bytes:
+    data_size = num_samples * channels * sample_width
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + data_size, b"WAVE", b"fmt ", 16, 1, channels, sample_rate,
+                       sample_rate * channels * sample_width, channels * sample_width, sample_width * 8, b"data", data_size)
+
+
+def pack_wav_buffer(data:np.ndarray, rate:int) -> memoryview:
+    """整段 wav 写入一块预分配的缓冲区: 先写头部, PCM 直接转换到其后, 返回缓冲区的 memoryview"""
+    header = wav_header(rate, len(data))
+    buffer = np.empty(len(header) + len(data) * 2, dtype=np.uint8)
+    buffer[:len(header)] = np.frombuffer(header, dtype=np.uint8)
+    pcm16(data, out=buffer[len(header):].view("<i2"))
+    return memoryview(buffer)
+
+
+def pack_raw(io_buffer:BytesIO, data:np.ndarray, rate:int):
+    io_buffer.write(pcm_bytes(data))
+    return io_buffer
+
+
+def pack_wav(io_buffer:BytesIO, data:np.ndarray, rate:int):
+    io_buffer.write(pack_wav_buffer(data, rate))
+    return io_buffer
+
+def pack_aac(io_buffer:BytesIO, data:np.ndarray, rate:int, bitrate:int=None):
+    process = subprocess.Popen([
+        'ffmpeg',
+        '-f', 's16le',  # 输入16位有符号小端整数PCM
+        '-ar', str(rate),  # 设置采样率
+        '-ac', '1',  # 单声道
+        '-i', 'pipe:0',  # 从管道读取输入
+        '-c:a', 'aac',  # 音频编码器为AAC
+        '-b:a', f'{bitrate or 192}k',  # 比特率
+        '-vn',  # 不包含视频
+        '-f', 'adts',  # 输出AAC数据流格式
+        'pipe:1'  # 将输出写入管道
+    ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, _ = process.communicate(input=pcm_bytes(data))
+    io_buffer.write(out)
+    return io_buffer
+
+def pack_opus(io_buffer:BytesIO, data:np.ndarray, rate:int, container:str="ogg", bitrate:int=None):
+    encoder = FFmpegStreamEncoder(rate, opus_codec_args(container, bitrate), container)
+    io_buffer.write(encoder.write(data))
+    io_buffer.write(encoder.close())
+    return io_buffer
+
+def pack_audio(io_buffer:BytesIO, data:np.ndarray, rate:int, media_type:str, bitrate:int=None):
+    if media_type == "ogg":
+        io_buffer = pack_ogg(io_buffer, data, rate)
+    elif media_type == "aac":
+        io_buffer = pack_aac(io_buffer, data, rate, bitrate)
+    elif media_type == "opus":
+        io_buffer = pack_opus(io_buffer, data, rate, "ogg", bitrate)
+    elif media_type == "webm":
+        io_buffer = pack_opus(io_buffer, data, rate, "webm", bitrate)
+    elif media_type == "wav":
+        io_buffer = pack_wav(io_buffer, data, rate)
+    else:
+        io_buffer = pack_raw(io_buffer, data, rate)
+    io_buffer.seek(0)
+    return io_buffer
+
+
+class StreamEncoder:
+    """
+    流式编码器: 每个流式响应一个实例, 持续写入 PCM 分段.
+    write 返回此时已编码好的字节 (可能为空), close 冲刷编码器并返回剩余字节, abort 用于客户端断开时直接丢弃.
+    write_frames 依次写入一个推理分段切出的各帧, 返回非空的编码输出列表.
+    """
+    def write(self, data:np.ndarray) -> bytes:
+        raise NotImplementedError
+
+    def write_frames(self, frames:list) -> list:
+        return [data for data in (self.write(frame) for frame in frames) if data]
+
+    def close(self) -> bytes:
+        return b""
+
+    def abort(self):
+        pass
+
+
+class RawStreamEncoder(StreamEncoder):
+    def write(self, data:np.ndarray) -> memoryview:
+        return pcm_bytes(data)
+
+
+class _ChunkSink:
+    """只追加写入的类文件对象, 供 libsndfile 顺序写出编码后的页, 写出的数据由 drain 取走"""
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset:int, whence:int=0) -> int:
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def read(self, size:int=-1) -> bytes:
+        return b""
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class SoundFileStreamEncoder(StreamEncoder):
+    """在进程内用 libsndfile 编码 (ogg/vorbis 等), 整个响应只写一个容器, 每次写入后取走已完成的页"""
+    def __init__(self, rate:int, format:str="ogg", subtype:str=None):
+        self.sink = _ChunkSink()
+        self.audio_file = sf.SoundFile(self.sink, mode='w', samplerate=rate, channels=1, format=format, subtype=subtype)
+
+    def write(self, data:np.ndarray) -> bytes:
+        self.audio_file.write(data)
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        if not self.audio_file.closed:
+            self.audio_file.close()
+        return self.sink.drain()
+
+    def abort(self):
+        self.close()
+
+
+class FFmpegStreamEncoder(StreamEncoder):
+    """
+    每个响应启动一个常驻 ffmpeg 进程: PCM 从 stdin 持续写入, 读线程把 stdout 上的编码数据放入队列.
+    write 写入后最多等待 first_output_timeout 秒以取到本段的输出, 避免输出总是滞后一个分段.
+    """
+    first_output_timeout = 0.1
+
+    def __init__(self, rate:int, codec_args:list, format:str):
+        self.process = subprocess.Popen([
+            'ffmpeg',
+            '-loglevel', 'error',
+            '-f', 's16le',  # 输入16位有符号小端整数PCM
+            '-ar', str(rate),  # 设置采样率
+            '-ac', '1',  # 单声道
+            '-i', 'pipe:0',  # 从管道读取输入
+            *codec_args,
+            '-vn',  # 不包含视频
+            '-flush_packets', '1',  # 每个包立即写出
+            '-f', format,
+            'pipe:1'  # 将输出写入管道
+        ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.output:queue.Queue = queue.Queue()
+        self.reader = threading.Thread(target=self._read, name="ffmpeg-reader", daemon=True)
+        self.reader.start()
+
+    def _read(self):
+        while True:
+            data = self.process.stdout.read1(65536)
+            if not data:
+                break
+            self.output.put(data)
+        self.output.put(None)
+
+    def _drain(self, timeout:float=0) -> bytes:
+        chunks = []
+        try:
+            chunk = self.output.get(timeout=timeout) if timeout > 0 else self.output.get_nowait()
+            while chunk is not None:
+                chunks.append(chunk)
+                chunk = self.output.get_nowait()
+        except queue.Empty:
+            pass
+        return b"".join(chunks)
+
+    def write(self, data:np.ndarray) -> bytes:
+        self.process.stdin.write(pcm_bytes(data))
+        self.process.stdin.flush()
+        return self._drain(self.first_output_timeout)
+
+    def write_frames(self, frames:list) -> list:
+        # ogg / webm 封装会积攒约一秒的输出, 逐帧等待输出会使每帧都等满超时; 整个分段写入后只等待一次
+        if not frames:
+            return []
+        for frame in frames:
+            self.process.stdin.write(pcm_bytes(frame))
+        self.process.stdin.flush()
+        data = self._drain(self.first_output_timeout)
+        return [data] if data else []
+
+    def close(self) -> bytes:
+        if self.process.stdin.closed:
+            return b""
+        self.process.stdin.close()
+        self.reader.join()
+        self.process.wait()
+        return self._drain()
+
+    def abort(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+
+class StreamResampler:
+    """
+    流式多相 FIR 重采样: 有理数比 up/down, Kaiser 窗 sinc 低通, 每相 taps 个系数.
+    分段之间保留输入历史与输出相位, 连续调用 process 的结果与一次性重采样整段音频相同, 分段拼接处没有接缝.
+    """
+    block = 8192
+
+    def __init__(self, sr_in:int, sr_out:int, taps:int=32):
+        g = math.gcd(sr_in, sr_out)
+        self.up, self.down = sr_out // g, sr_in // g
+        self.taps = taps
+        length = taps * self.up
+        cutoff = 0.95 / max(self.up, self.down)
+        n = np.arange(length) - (length - 1) / 2
+        h = cutoff * np.sinc(cutoff * n) * np.kaiser(length, 8.0) * self.up
+        # phases[p, j] = h[p + j * up]
+        self.phases = h.reshape(taps, self.up).T.astype(np.float32)
+        self.delay = (length - 1) // 2
+        self.history = np.zeros(taps - 1, dtype=np.float32)
+        self.received = 0
+        self.next_t = self.delay
+
+    def process(self, data:np.ndarray) -> np.ndarray:
+        buf = np.concatenate([self.history, data.astype(np.float32)])
+        start = self.received - (self.taps - 1)
+        self.received += len(data)
+        # 上采样域中的输出位置 t 需要输入样本 t // up 已经到达
+        last_t = self.received * self.up - 1
+        count = 0 if self.next_t > last_t else (last_t - self.next_t) // self.down + 1
+        t = self.next_t + np.arange(count, dtype=np.int64) * self.down
+        self.next_t += count * self.down
+        self.history = buf[len(buf) - (self.taps - 1):]
+
+        out = np.empty(count, dtype=np.float32)
+        offsets = np.arange(self.taps)
+        for i in range(0, count, self.block):
+            tb = t[i:i + self.block]
+            index = (tb // self.up - start)[:, None] - offsets[None, :]
+            out[i:i + self.block] = np.einsum("ij,ij->i", self.phases[tb % self.up], buf[index])
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16)
+
+    def flush(self) -> np.ndarray:
+        return self.process(np.zeros(self.delay // self.up + 1, dtype=np.float32))
+
+
+def resample_audio(data:np.ndarray, sr_in:int, sr_out:int) -> np.ndarray:
+    if sr_out in [None, sr_in]:
+        return data
+    resampler = StreamResampler(sr_in, sr_out)
+    return np.concatenate([resampler.process(data), resampler.flush()])
+
+
+class ResamplingStreamEncoder(StreamEncoder):
+    def __init__(self, encoder:StreamEncoder, resampler:StreamResampler):
+        self.encoder = encoder
+        self.resampler = resampler
+
+    def write(self, data:np.ndarray) -> bytes:
+        return self.encoder.write(self.resampler.process(data))
+
+    def write_frames(self, frames:list) -> list:
+        return self.encoder.write_frames([self.resampler.process(frame) for frame in frames])
+
+    def close(self) -> bytes:
+        tail = self.resampler.flush()
+        return b"".join([self.encoder.write(tail) if len(tail) else b"", self.encoder.close()])
+
+    def abort(self):
+        self.encoder.abort()
+
+
+OPUS_SAMPLE_RATES = [8000, 12000, 16000, 24000, 48000]
+
+# 流式响应的 Content-Type, 未列出的为 audio/{media_type}
+MEDIA_MIME_TYPES = {"opus": "audio/ogg", "webm": "audio/webm"}
+
+
+def mime_type(media_type:str) -> str:
+    return MEDIA_MIME_TYPES.get(media_type, f"audio/{media_type}")
+
+
+def opus_codec_args(container:str, bitrate:int=None) -> list:
+    codec_args = ['-c:a', 'libopus', '-b:a', f'{bitrate or 32}k', '-application', 'voip']
+    if container == "webm":
+        codec_args += ['-live', '1']  # 输出到管道, 不回写 Cues
+    return codec_args
+
+
+def output_sample_rate(media_type:str, sample_rate:int=None):
+    """请求的输出采样率; opus/webm 未指定时为 48000, 其余格式未指定时保持模型采样率 (None)"""
+    if sample_rate in [None, 0] and media_type in ["opus", "webm"]:
+        return 48000
+    return sample_rate or None
+
+
+def open_stream_encoder(media_type:str, rate:int, sample_rate:int=None, bitrate:int=None) -> StreamEncoder:
+    out_rate = sample_rate or rate
+    if media_type == "aac":
+        encoder = FFmpegStreamEncoder(out_rate, ['-c:a', 'aac', '-b:a', f'{bitrate or 192}k'], 'adts')
+    elif media_type == "ogg":
+        encoder = SoundFileStreamEncoder(out_rate, "ogg")
+    elif media_type in ["opus", "webm"]:
+        container = "ogg" if media_type == "opus" else "webm"
+        encoder = FFmpegStreamEncoder(out_rate, opus_codec_args(container, bitrate), container)
+    else:
+        encoder = RawStreamEncoder()
+    if out_rate != rate:
+        encoder = ResamplingStreamEncoder(encoder, StreamResampler(rate, out_rate))
+    return encoder
+
+
+def encode_audio(sr:int, audio_data:np.ndarray, req:dict) -> bytes:
+    """
+    非流式输出: 按需重采样后整段封装. wav 写入一块预分配的缓冲区, raw 直接引用 PCM 数组,
+    其余格式引用 BytesIO 的内部缓冲区; 最后只拷贝一次转为 bytes (Starlette 0.27 之前的 Response 不接受 memoryview).
+    """
+    media_type = req.get("media_type", "wav")
+    started = time.perf_counter()
+    sample_rate = output_sample_rate(media_type, req.get("sample_rate"))
+    audio_data = resample_audio(audio_data, sr, sample_rate)
+    if media_type == "wav":
+        data = pack_wav_buffer(audio_data, sample_rate or sr)
+    elif media_type == "raw":
+        data = pcm_bytes(audio_data)
+    else:
+        data = pack_audio(BytesIO(), audio_data, sample_rate or sr, media_type, req.get("bitrate")).getbuffer()
+    data = bytes(data)
+    ENCODE.observe(time.perf_counter() - started, media_type)
+    return data
+
+
+class StreamFramer:
+    """
+    流式分帧: 把长短不一的推理分段重新切成固定 frame 个采样点的帧, 分段衔接处做 fade 个采样点的等功率交叉淡化.
+    不足一帧的余量留在预分配的缓冲区中, 与下一分段拼成整帧; 每个分段末尾 fade 个采样点暂不输出, 与下一分段开头混合.
+    整帧直接引用分段数组, 只有跨分段的帧需要拷贝; flush 输出剩余的样本 (最后一帧可能不足 frame).
+    frame 为 0 时不重新切分, 每个分段作为一帧输出.
+    """
+    def __init__(self, frame:int, fade:int=0):
+        self.frame = frame
+        self.fade = fade
+        ramp = (np.arange(fade, dtype=np.float32) + 0.5) * (np.pi / 2 / max(fade, 1))
+        self.fade_in, self.fade_out = np.sin(ramp), np.cos(ramp)
+        self.buffer:np.ndarray = None
+        self.fill = 0
+        self.tail:np.ndarray = None
+
+    def _join(self, data:np.ndarray) -> np.ndarray:
+        if self.tail is None:
+            return data
+        tail, self.tail = self.tail, None
+        if len(data) < self.fade:
+            return np.concatenate([tail, data])
+        mixed = tail * self.fade_out + data[:self.fade] * self.fade_in
+        if np.issubdtype(data.dtype, np.integer):
+            info = np.iinfo(data.dtype)
+            mixed = np.clip(np.rint(mixed), info.min, info.max)
+        return np.concatenate([mixed.astype(data.dtype), data[self.fade:]])
+
+    def _frames(self, data:np.ndarray) -> list:
+        if self.frame <= 0:
+            return [data] if len(data) else []
+        if self.buffer is None:
+            self.buffer = np.empty(self.frame, dtype=data.dtype)
+        frames = []
+        if self.fill:
+            take = min(self.frame - self.fill, len(data))
+            self.buffer[self.fill:self.fill + take] = data[:take]
+            self.fill += take
+            data = data[take:]
+            if self.fill < self.frame:
+                return frames
+            frames.append(self.buffer.copy())
+            self.fill = 0
+        whole = len(data) - len(data) % self.frame
+        frames.extend(data[start:start + self.frame] for start in range(0, whole, self.frame))
+        self.fill = len(data) - whole
+        self.buffer[:self.fill] = data[whole:]
+        return frames
+
+    def write(self, data:np.ndarray) -> list:
+        data = self._join(np.asarray(data).reshape(-1))
+        if self.fade and len(data) > self.fade:
+            data, self.tail = data[:-self.fade], data[-self.fade:]
+        return self._frames(data)
+
+    def flush(self) -> list:
+        rest = [self.buffer[:self.fill]] if self.fill else []
+        if self.tail is not None:
+            rest.append(self.tail)
+        self.fill, self.tail = 0, None
+        return [np.concatenate(rest)] if rest else []
+
+
+def open_stream_framer(sr:int) -> StreamFramer:
+    frame = max(1, sr * args.stream_frame_ms // 1000) if args.stream_frame_ms > 0 else 0
+    return StreamFramer(frame, int(sr * args.stream_crossfade_ms / 1000))
+
+
+async def stream_audio(fragments, req:dict):
+    """
+    流式输出: 推理分段先经 StreamFramer 切成固定时长的帧 (衔接处交叉淡化), 整个响应使用同一个编码器 (按需带重采样).
+    wav 先输出一个按实际输出采样率生成的 wav 头, 之后都是裸 PCM.
+    """
+    media_type = req.get("media_type", "wav")
+    sample_rate = output_sample_rate(media_type, req.get("sample_rate"))
+    encoder:StreamEncoder = None
+    framer:StreamFramer = None
+    try:
+        async for sr, chunk in fragments:
+            if encoder is None:
+                if media_type == "wav":
+                    yield wav_header(sample_rate or sr, 0)
+                encoder = open_stream_encoder("raw" if media_type == "wav" else media_type, sr, sample_rate, req.get("bitrate"))
+                framer = open_stream_framer(sr)
+            started = time.perf_counter()
+            frames = framer.write(chunk)
+            encoded = await asyncio.to_thread(encoder.write_frames, frames) if frames else []
+            ENCODE.observe(time.perf_counter() - started, media_type)
+            for data in encoded:
+                # 编码器输出可能是 PCM 数组的 memoryview, 流式响应与 WebSocket 帧需要 bytes
+                yield bytes(data)
+        if encoder is not None:
+            encoded = await asyncio.to_thread(encoder.write_frames, framer.flush())
+            tail = await asyncio.to_thread(encoder.close)
+            for data in encoded + ([tail] if tail else []):
+                yield bytes(data)
+    finally:
+        if encoder is not None:
+            encoder.abort()
+
+
+SPILL_PREFIX = "spill_"
+
+
+def clear_spill_dir(dir:str):
+    """启动时删除上次运行遗留的落盘输出"""
+    os.makedirs(dir, exist_ok=True)
+    for name in os.listdir(dir):
+        if name.startswith(SPILL_PREFIX):
+            try:
+                os.remove(os.path.join(dir, name))
+            except OSError:
+                pass
+
+
+class SpillFile:
+    """
+    大段非流式输出的落盘文件: 每个推理分段经流式编码器 (按需重采样) 编码后立即追加写入, 内存中只保留当前分段.
+    wav 先写入长度为 0 的头部, 结束时回写实际长度. write / close 在线程池中执行.
+    """
+    def __init__(self, dir:str, media_type:str, sample_rate:int=None, bitrate:int=None):
+        self.media_type = media_type
+        self.sample_rate = sample_rate
+        self.bitrate = bitrate
+        self.encoder:StreamEncoder = None
+        self.out_rate:int = None
+        self.data_bytes = 0
+        fd, self.path = tempfile.mkstemp(prefix=SPILL_PREFIX, suffix=f".{media_type}", dir=dir)
+        self.file = os.fdopen(fd, "wb")
+
+    def _append(self, data):
+        if data:
+            self.file.write(data)
+            self.data_bytes += len(data)
+
+    def write(self, sr:int, chunk:np.ndarray):
+        if self.encoder is None:
+            self.out_rate = self.sample_rate or sr
+            if self.media_type == "wav":
+                self.file.write(wav_header(self.out_rate, 0))
+            self.encoder = open_stream_encoder("raw" if self.media_type == "wav" else self.media_type, sr, self.sample_rate, self.bitrate)
+        self._append(self.encoder.write(chunk))
+
+    def close(self) -> str:
+        if self.encoder is None:
+            self.discard()
+            raise RuntimeError("tts job produced no result")
+        self._append(self.encoder.close())
+        if self.media_type == "wav":
+            self.file.seek(0)
+            self.file.write(wav_header(self.out_rate, self.data_bytes // 2))
+        self.file.close()
+        return self.path
+
+    def discard(self):
+        if self.encoder is not None:
+            self.encoder.abort()
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def should_spill(req:dict) -> bool:
+    return args.spill_chars > 0 and not req.get("return_fragment", False) and len(req.get("text") or "") > args.spill_chars
+
+
+def spill_etag(req:dict):
+    """
+    固定 seed 的请求输出确定, 以请求哈希加上输出格式, 采样率, 比特率作为 ETag (请求哈希不含这些封装字段);
+    seed 为 -1 时每次结果不同, 不给出 ETag
+    """
+    if req.get("seed", -1) == -1:
+        return None
+    media_type = req.get("media_type", "wav")
+    packaging = [request_hash(req), media_type, output_sample_rate(media_type, req.get("sample_rate")), req.get("bitrate")]
+    return f'"{hashlib.sha256(json.dumps(packaging).encode("utf-8")).hexdigest()}"'
+
+
+async def spill_synthesis(req:dict, priority:int) -> str:
+    """以 return_fragment 方式推理, 分段写入 SpillFile, 返回完成的文件路径; 失败或被取消时删除文件并取消推理"""
+    media_type = req.get("media_type", "wav")
+    # 先提交再建文件: 队列已满时 submit 抛出 queue.Full, 不留下空的临时文件
+    job = submit_synthesis(run_tts, dict(req, return_fragment=True), priority)
+    try:
+        spill = SpillFile(args.spill_dir, media_type, output_sample_rate(media_type, req.get("sample_rate")), req.get("bitrate"))
+    except BaseException:
+        job.cancel()
+        raise
+    try:
+        async for sr, chunk in job:
+            started = time.perf_counter()
+            await asyncio.to_thread(spill.write, sr, chunk)
+            ENCODE.observe(time.perf_counter() - started, media_type)
+        return await asyncio.to_thread(spill.close)
+    except BaseException:
+        job.cancel()
+        spill.discard()
+        raise
+
+
+class SpillStore:
+    """
+    按 ETag 保留的落盘输出: 保留 ttl 秒, 每次命中顺延, 其间相同请求 (包括 Range 请求) 直接由文件返回而不再推理.
+    过期的文件在之后的 get / put 时删除, 启动时 clear_spill_dir 清理上次运行遗留的文件. 只在事件循环上使用.
+    """
+    def __init__(self, ttl:float):
+        self.ttl = ttl
+        self.files:dict = {}
+
+    def expire(self):
+        now = time.time()
+        for etag, (path, expires) in list(self.files.items()):
+            if expires <= now:
+                del self.files[etag]
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def get(self, etag:str):
+        self.expire()
+        entry = self.files.get(etag)
+        if entry is None:
+            return None
+        if not os.path.exists(entry[0]):
+            del self.files[etag]
+            return None
+        entry[1] = time.time() + self.ttl
+        return entry[0]
+
+    def put(self, etag:str, path:str) -> str:
+        """登记新生成的文件; 同一 ETag 已有文件时 (并发的相同请求) 删除新文件, 返回已有的"""
+        existing = self.get(etag)
+        if existing is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return existing
+        self.files[etag] = [path, time.time() + self.ttl]
+        return path
+
+
+def spill_response(path:str, request:Request, media_type:str, etag:str=None, retained:bool=False):
+    """
+    返回落盘输出. retained 为 True 时文件由 spill_store 按 ETag 保留, 支持 Range (If-Range 与 ETag 不符时返回整个文件),
+    无 Range 时以 FileResponse 发送 (ASGI 服务器支持 zerocopysend 时走 sendfile);
+    否则发送完毕后删除文件, 之后的 Range 请求只能重新推理, 因此忽略 Range 且不给出 Accept-Ranges.
+    """
+    headers = {"ETag": etag} if etag is not None else {}
+    if not retained:
+        return file_range_response(path, request, media_type, headers=headers, background=BackgroundTask(os.remove, path), ranges=False)
+    headers["Accept-Ranges"] = "bytes"
+    if request is None or request.headers.get("range") in [None, ""] or request.headers.get("if-range") not in [None, etag]:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    return file_range_response(path, request, media_type, headers=headers)
+
+
+def handle_control(command:str):
+    if command == "restart":
+        tts_executor.restart()
+    elif command == "exit":
+        os.kill(os.getpid(), signal.SIGTERM)
+        exit(0)
+
+
+def cached_audio_response(sr:int, audio_data:np.ndarray, req:dict):
+    media_type = req.get("media_type", "wav")
+    if not req.get("streaming_mode", False):
+        return Response(encode_audio(sr, audio_data, req), media_type=mime_type(media_type))
+
+    async def fragments():
+        yield sr, audio_data
+    return StreamingResponse(stream_audio(fragments(), req), media_type=mime_type(media_type))
+
+
+def split_first_fragment(req:dict) -> tuple:
+    """
+    按 text_split_method 切分文本, 返回 (首段, 其余分段). 首段超过 --first_fragment_chars 时在此范围内最后一个标点处截断,
+    截下的部分归入其余分段; 过短的首段 (少于 5 字, TTS 会与后句合并) 与后续分段合并.
+    """
+    fragments = cut_fragments(req)
+    if len(fragments) == 0:
+        return req["text"], []
+    head, rest = fragments[0], fragments[1:]
+    limit = args.first_fragment_chars
+    if limit > 0 and len(head) > limit:
+        cut = max((index for index, char in enumerate(head[:limit]) if char in cut_punctuation), default=-1)
+        if 0 <= cut < len(head) - 1:
+            rest.insert(0, head[cut + 1:].strip())
+            head = head[:cut + 1]
+    while len(head) < 5 and rest:
+        head += rest.pop(0)
+    return head, rest
+
+
+def low_latency_source(req:dict, priority:int) -> tuple:
+    """
+    首段单独以 batch_size=1 提交, 其余分段以原 batch_size 合批提交, 两个任务同时进入队列 (多个推理工作进程时并行执行),
+    输出按首段, 其余的顺序拼接. 两次推理都按 fragment_interval 在每段后补静音, 拼接后的间隔与一次推理相同.
+    返回 (产出 (sr, audio) 的异步生成器, 取消函数).
+    """
+    head, rest = split_first_fragment(req)
+    # 切分已在此完成, 两个任务都使用 cut0 并以换行分隔各段, 使 TTS 内部的分段与之一致
+    jobs = [tts_executor.submit(run_tts, dict(req, text=head, text_split_method="cut0", batch_size=1), model=req.get("model"), priority=priority)]
+    if rest:
+        try:
+            jobs.append(tts_executor.submit(run_tts, dict(req, text="\n".join(rest), text_split_method="cut0"), model=req.get("model"), priority=priority))
+        except queue.Full:
+            jobs[0].cancel()
+            raise
+
+    async def source():
+        for job in jobs:
+            async for item in job:
+                yield item
+
+    def cancel():
+        for job in jobs:
+            job.cancel()
+    return source(), cancel
+
 
-endpoint: `/set_sovits_weights`
+def cut_fragments(req:dict) -> list:
+    return [fragment.strip() for fragment in get_cut_method(req["text_split_method"])(req["text"]).split("\n") if fragment.strip()]
 
-GET:
-```
-http://127.0.0.1:9880/set_sovits_weights?weights_path=GPT_SoVITS/pretrained_models/s2G488k.pth
-```
 
-RESP: 
-成功: 返回"success", http code 200
-失败: 返回包含错误信息的 json, http code 400
-    
-"""
-import os
-import sys
-import traceback
-from typing import Generator
+def shard_requests(req:dict) -> list:
+    """
+    长文本按 text_split_method 切分, 按字数把分段均分为至多 --workers 个连续的分片, 返回各分片的请求;
+    不需要分片时返回 None. 分片使用 cut0 并以换行分隔各段, seed 固定时第 i 个分片的 seed 为 seed + i.
+    """
+    if args.shard_chars <= 0 or args.workers < 2 or len(req.get("text") or "") <= args.shard_chars:
+        return None
+    fragments = cut_fragments(req)
+    count = min(args.workers, len(fragments))
+    if count < 2:
+        return None
+    target = sum(len(fragment) for fragment in fragments) / count
+    shards, done = [[]], 0
+    for fragment in fragments:
+        if shards[-1] and len(shards) < count and done >= target * len(shards):
+            shards.append([])
+        shards[-1].append(fragment)
+        done += len(fragment)
+    seed = req.get("seed", -1)
+    return [dict(req, text="\n".join(shard), text_split_method="cut0", seed=seed if seed == -1 else seed + index)
+            for index, shard in enumerate(shards)]
 
-now_dir = os.getcwd()
-sys.path.append(now_dir)
-sys.path.append("%s/GPT_SoVITS" % (now_dir))
 
-from starlette.middleware.cors import CORSMiddleware  #引入 CORS中间件模块
+class ShardedJob:
+    """
+    多个分片任务按顺序组成的一个任务, 接口同 InferenceJob (async for / result / cancel).
+    各分片同时进入队列, 由不同的推理工作进程并行执行; 产出按分片顺序交出, 后续分片的产出在各自的队列中等待.
+    merge 为 True 时 (非流式 run_tts) 把各分片的整段音频拼接为一项.
+    """
+    def __init__(self, jobs:list, merge:bool=False):
+        self.jobs = jobs
+        self.merge = merge
 
-#设置允许访问的域名
-origins = ["*"]  #"*"，即为所有。
+    def cancel(self):
+        for job in self.jobs:
+            job.cancel()
 
-import config as global_config
+    async def _items(self):
+        for job in self.jobs:
+            async for item in job:
+                yield item
 
-import argparse
-import subprocess
-import wave
-import signal
-import numpy as np
-import soundfile as sf
-from fastapi import FastAPI, Request, HTTPException, Response
-from fastapi.responses import StreamingResponse, JSONResponse
-from fastapi import FastAPI, UploadFile, File
-from fastapi.staticfiles import StaticFiles
-import uvicorn
-from io import BytesIO
-from tools.i18n.i18n import I18nAuto
-from GPT_SoVITS.TTS_infer_pack.TTS import TTS, TTS_Config
-from GPT_SoVITS.TTS_infer_pack.text_segmentation_method import get_method_names as get_cut_method_names
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-# print(sys.path)
-i18n = I18nAuto()
-cut_method_names = get_cut_method_names()
+    async def __aiter__(self):
+        if not self.merge:
+            async for item in self._items():
+                yield item
+            return
+        items = [item async for item in self._items()]
+        if items:
+            yield items[0][0], np.concatenate([audio for _, audio in items])
 
-parser = argparse.ArgumentParser(description="GPT-SoVITS api")
-parser.add_argument("-c", "--tts_config", type=str, default="GPT_SoVITS/configs/tts_infer.yaml", help="tts_infer路径")
-parser.add_argument("-a", "--bind_addr", type=str, default="127.0.0.1", help="default: 127.0.0.1")
-parser.add_argument("-p", "--port", type=int, default="9880", help="default: 9880")
-args = parser.parse_args()
-config_path = args.tts_config
-# device = args.device
-port = args.port
-host = args.bind_addr
-argv = sys.argv
+    async def result(self):
+        async for item in self:
+            return item
+        raise RuntimeError("inference job produced no result")
 
-if config_path in [None, ""]:
-    config_path = "GPT-SoVITS/configs/tts_infer.yaml"
 
-tts_config = TTS_Config(config_path)
-print(tts_config)
-tts_pipeline = TTS(tts_config)
+def submit_synthesis(fn, req:dict, priority:int):
+    """提交 run_tts / run_timed 任务; 长文本在有多个推理工作进程时拆成分片并行推理, 见 shard_requests"""
+    shards = shard_requests(req)
+    if shards is None:
+        return tts_executor.submit(fn, req, model=req.get("model"), priority=priority)
+    jobs = []
+    try:
+        for shard in shards:
+            jobs.append(tts_executor.submit(fn, shard, model=req.get("model"), priority=priority))
+    except queue.Full:
+        for job in jobs:
+            job.cancel()
+        raise
+    return ShardedJob(jobs, merge=fn is run_tts and not req.get("return_fragment", False))
 
-APP = FastAPI()
 
+def join_synthesis(req:dict, cache_key:str=None, priority:int=PRIORITY_NORMAL) -> SharedJob:
+    """
+    启动一次合成, 或挂到参数完全相同的在途合成上. 
+    流式(分段返回)与非流式的产出形式不同, 两者分开合并. 完成后结果写入音频缓存.
+    """
+    return_fragment = bool(req.get("return_fragment", False))
+    flight_key = f"{request_hash(req)}:{int(return_fragment)}"
 
-APP.mount("/srt", StaticFiles(directory="音频输出"), name="音频输出")
+    def start() -> SharedJob:
+        if return_fragment and req.get("low_latency"):
+            return SharedJob(*low_latency_source(req, priority), on_finish)
+        if shard_requests(req) is not None:
+            job = submit_synthesis(run_tts, req, priority)
+            return SharedJob(job, job.cancel, on_finish)
+        if not return_fragment and micro_batcher is not None:
+            future = asyncio.ensure_future(micro_batcher.run(req, priority))
+            async def source():
+                yield await future
+            return SharedJob(source(), future.cancel, on_finish)
+        job = tts_executor.submit(run_tts, req, model=req.get("model"), priority=priority)
+        return SharedJob(job, job.cancel, on_finish)
 
-APP.add_middleware(
-    CORSMiddleware, 
-    allow_origins=origins,  #设置允许的origins来源
-    allow_credentials=True,
-    allow_methods=["*"],  # 设置允许跨域的http方法，比如 get、post、put等。
-    allow_headers=["*"])  #允许跨域的headers，可以用来鉴别来源等作用。
+    async def on_finish(shared:SharedJob):
+        single_flight.release(flight_key, shared)
+        if cache_key is not None and shared.error is None and shared.items:
+            sr = shared.items[0][0]
+            await audio_cache.put(cache_key, sr, np.concatenate([chunk for _, chunk in shared.items]))
 
+    return single_flight.join(flight_key, start)
 
-class TTS_Request(BaseModel):
-    text: str = None
-    text_lang: str = None
-    ref_audio_path: str = None
-    aux_ref_audio_paths: list = None
-    prompt_lang: str = None
-    prompt_text: str = ""
-    top_k:int = 5
-    top_p:float = 1
-    temperature:float = 1
-    text_split_method:str = "cut5"
-    batch_size:int = 1
-    batch_threshold:float = 0.75
-    split_bucket:bool = True
-    speed_factor:float = 1.0
-    fragment_interval:float = 0.3
-    seed:int = -1
-    media_type:str = "wav"
-    streaming_mode:bool = False
-    parallel_infer:bool = True
-    repetition_penalty:float = 1.35
 
-### modify from https://github.com/RVC-Boss/GPT-SoVITS/pull/894/files
-def pack_ogg(io_buffer:BytesIO, data:np.ndarray, rate:int):
-    with sf.SoundFile(io_buffer, mode='w', samplerate=rate, channels=1, format='ogg') as audio_file:
-        audio_file.write(data)
-    return io_buffer
+class ClientDisconnected(Exception):
+    pass
 
-def replace_speaker(text):
 
-    return re.sub(r"\[.*?\]", "", text, flags=re.UNICODE)
+async def wait_disconnect(request:Request):
+    # 请求体已被读完, 之后 receive 只会在连接断开时返回 http.disconnect
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
 
 
-def pack_raw(io_buffer:BytesIO, data:np.ndarray, rate:int):
-    io_buffer.write(data.tobytes())
-    return io_buffer
+async def until_disconnected(awaitable, request:Request=None):
+    """
+    等待 awaitable, 同时通过 ASGI receive 监听客户端断开. 
+    断开时取消 awaitable (进而取消底层推理任务) 并抛出 ClientDisconnected.
+    流式响应由 StreamingResponse 自行监听断开并关闭输出生成器.
+    """
+    if request is None:
+        return await awaitable
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(wait_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+    if not task.done():
+        task.cancel()
+        raise ClientDisconnected()
+    return task.result()
 
 
-def pack_wav(io_buffer:BytesIO, data:np.ndarray, rate:int):
-    io_buffer = BytesIO()
-    sf.write(io_buffer, data, rate, format='wav')
-    return io_buffer
+def overloaded_response(retry_after:int):
+    return JSONResponse(status_code=429, content={"message": "server busy, please retry later"}, headers={"Retry-After": str(retry_after)})
 
-def pack_aac(io_buffer:BytesIO, data:np.ndarray, rate:int):
-    process = subprocess.Popen([
-        'ffmpeg',
-        '-f', 's16le',  # 输入16位有符号小端整数PCM
-        '-ar', str(rate),  # 设置采样率
-        '-ac', '1',  # 单声道
-        '-i', 'pipe:0',  # 从管道读取输入
-        '-c:a', 'aac',  # 音频编码器为AAC
-        '-b:a', '192k',  # 比特率
-        '-vn',  # 不包含视频
-        '-f', 'adts',  # 输出AAC数据流格式
-        'pipe:1'  # 将输出写入管道
-    ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    out, _ = process.communicate(input=data.tobytes())
-    io_buffer.write(out)
-    return io_buffer
 
-def pack_audio(io_buffer:BytesIO, data:np.ndarray, rate:int, media_type:str):
-    if media_type == "ogg":
-        io_buffer = pack_ogg(io_buffer, data, rate)
-    elif media_type == "aac":
-        io_buffer = pack_aac(io_buffer, data, rate)
-    elif media_type == "wav":
-        io_buffer = pack_wav(io_buffer, data, rate)
+def queue_full_response():
+    return overloaded_response(admission.retry_after())
+
+
+def parse_range(header:str, size:int):
+    """解析单段 Range 头, 返回 (start, end) 闭区间; 无 Range 时返回 None, 无法满足时抛出 ValueError"""
+    if header in [None, ""]:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError(f"unsupported range {header}")
+    first, _, last = spec.strip().partition("-")
+    if first == "":
+        length = int(last)
+        if length <= 0:
+            raise ValueError(f"unsatisfiable range {header}")
+        start, end = max(0, size - length), size - 1
     else:
-        io_buffer = pack_raw(io_buffer, data, rate)
-    io_buffer.seek(0)
-    return io_buffer
+        start = int(first)
+        end = min(int(last), size - 1) if last != "" else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"unsatisfiable range {header}")
+    return start, end
 
 
+def file_range_response(path:str, request:Request, media_type:str, chunk_size:int=64 * 1024, headers:dict=None, background=None,
+                        ranges:bool=True):
+    """
+    以流式响应返回文件, 支持单段 Range 请求 (206). 以请求到达时的文件大小为准, 因此可以读取仍在写入的文件.
+    ranges 为 False 时忽略 Range 头, 总是返回整个文件且不给出 Accept-Ranges.
+    """
+    size = os.path.getsize(path)
+    headers = dict(headers or {})
+    byte_range = None
+    if ranges:
+        headers["Accept-Ranges"] = "bytes"
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"}, background=background)
+    start, end = byte_range if byte_range is not None else (0, size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range is not None:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
 
-# from https://huggingface.co/spaces/coqui/voice-chat-with-mistral/blob/main/app.py
-def wave_header_chunk(frame_input=b"", channels=1, sample_width=2, sample_rate=32000):
-    # This will create a wave header then append the frame input
-    # It should be first on a streaming wav file
-    # Other frames better should not have it (else you will hear some artifacts each chunk start)
-    wav_buf = BytesIO()
-    with wave.open(wav_buf, "wb") as vfout:
-        vfout.setnchannels(channels)
-        vfout.setsampwidth(sample_width)
-        vfout.setframerate(sample_rate)
-        vfout.writeframes(frame_input)
+    def chunks():
+        with open(path, "rb") as file:
+            file.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = file.read(min(chunk_size, remaining))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
+    return StreamingResponse(chunks(), status_code=206 if byte_range is not None else 200, media_type=media_type, headers=headers,
+                             background=background)
 
-    wav_buf.seek(0)
-    return wav_buf.read()
 
+async def observe_stream(stream, started:float, endpoint:str):
+    """记录流式响应发出第一段音频的时间; 输出中途失败计入错误数"""
+    first = True
+    try:
+        async for data in stream:
+            if first:
+                first = False
+                TIME_TO_FIRST_BYTE.observe(time.perf_counter() - started, "true")
+            yield data
+    except Exception:
+        ERRORS.inc(endpoint, "failed")
+        raise
 
-def handle_control(command:str):
-    if command == "restart":
-        os.execl(sys.executable, sys.executable, *argv)
-    elif command == "exit":
-        os.kill(os.getpid(), signal.SIGTERM)
-        exit(0)
+
+async def release_after(stream, ticket:AdmissionTicket):
+    try:
+        async for data in stream:
+            yield data
+    finally:
+        ticket.release()
 
 
 def check_params(req:dict):
@@ -269,6 +3173,9 @@ def check_params(req:dict):
     media_type:str = req.get("media_type", "wav")
     prompt_lang:str = req.get("prompt_lang", "")
     text_split_method:str = req.get("text_split_method", "cut5")
+    model:str = req.get("model", None)
+    sample_rate:int = req.get("sample_rate", None)
+    bitrate:int = req.get("bitrate", None)
 
     if ref_audio_path in [None, ""]:
         return JSONResponse(status_code=400, content={"message": "ref_audio_path is required"})
@@ -282,17 +3189,26 @@ def check_params(req:dict):
         return JSONResponse(status_code=400, content={"message": "prompt_lang is required"})
     elif prompt_lang.lower() not in tts_config.languages:
         return JSONResponse(status_code=400, content={"message": f"prompt_lang: {prompt_lang} is not supported in version {tts_config.version}"})
-    if media_type not in ["wav", "raw", "ogg", "aac"]:
+    if media_type not in ["wav", "raw", "ogg", "aac", "opus", "webm"]:
         return JSONResponse(status_code=400, content={"message": f"media_type: {media_type} is not supported"})
     elif media_type == "ogg" and  not streaming_mode:
         return JSONResponse(status_code=400, content={"message": "ogg format is not supported in non-streaming mode"})
+    if sample_rate not in [None, 0]:
+        if not 8000 <= sample_rate <= 48000:
+            return JSONResponse(status_code=400, content={"message": f"sample_rate: {sample_rate} must be between 8000 and 48000"})
+        if media_type in ["opus", "webm"] and sample_rate not in OPUS_SAMPLE_RATES:
+            return JSONResponse(status_code=400, content={"message": f"sample_rate: {sample_rate} is not supported by opus, use one of {OPUS_SAMPLE_RATES}"})
+    if bitrate not in [None, 0] and not 6 <= bitrate <= 510:
+        return JSONResponse(status_code=400, content={"message": f"bitrate: {bitrate} must be between 6 and 510 kbps"})
     
     if text_split_method not in cut_method_names:
         return JSONResponse(status_code=400, content={"message": f"text_split_method:{text_split_method} is not supported"})
+    if model not in [None, ""] and not model_registry.has(model):
+        return JSONResponse(status_code=400, content={"message": f"model: {model} is not resident, load it with /load_model first"})
 
     return None
 
-async def tts_handle(req:dict):
+async def tts_handle(req:dict, request:Request=None, priority:int=None):
     """
     Text to speech handler.
     
@@ -315,10 +3231,14 @@ async def tts_handle(req:dict):
                 "speed_factor":1.0,           # float. control the speed of the synthesized audio.
                 "fragment_interval":0.3,      # float. to control the interval of the audio fragment.
                 "seed": -1,                   # int. random seed for reproducibility.
-                "media_type": "wav",          # str. media type of the output audio, support "wav", "raw", "ogg", "aac".
+                "media_type": "wav",          # str. media type of the output audio, support "wav", "raw", "ogg", "aac", "opus", "webm".
                 "streaming_mode": False,      # bool. whether to return a streaming response.
                 "parallel_infer": True,       # bool.(optional) whether to use parallel inference.
-                "repetition_penalty": 1.35    # float.(optional) repetition penalty for T2S model.          
+                "repetition_penalty": 1.35,   # float.(optional) repetition penalty for T2S model.
+                "model": None,                # str.(optional) resident model name, see /models.
+                "sample_rate": None,          # int.(optional) output sample rate, resampled on the server.
+                "bitrate": None,              # int.(optional) bitrate in kbps for "aac", "opus" and "webm".
+                "low_latency": False          # bool.(optional) streaming only, synthesize the first fragment alone before the rest.
             }
     returns:
         StreamingResponse: audio stream response.
@@ -327,40 +3247,82 @@ async def tts_handle(req:dict):
     streaming_mode = req.get("streaming_mode", False)
     return_fragment = req.get("return_fragment", False)
     media_type = req.get("media_type", "wav")
+    endpoint = request.url.path if request is not None else "/"
+    started = time.perf_counter()
+    REQUESTS.inc(endpoint, voice_label(req))
 
     check_res = check_params(req)
     if check_res is not None:
+        ERRORS.inc(endpoint, "invalid_params")
         return check_res
 
     if streaming_mode or return_fragment:
         req["return_fragment"] = True
     
+    if priority is None:
+        priority = PRIORITY_INTERACTIVE if streaming_mode else PRIORITY_NORMAL
+    cache_key = audio_cache_key(req)
+    ticket:AdmissionTicket = None
+
     try:
-        tts_generator=tts_pipeline.run(req)
+        cached = await audio_cache.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            TIME_TO_FIRST_BYTE.observe(time.perf_counter() - started, str(bool(streaming_mode)).lower())
+            return cached_audio_response(*cached, req)
+
+        if should_spill(req):
+            # 大段输出不经过 single-flight 与音频缓存 (二者都会在内存中保留整段音频)
+            etag = spill_etag(req)
+            if etag is not None and request is not None and request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers={"ETag": etag})
+            retained = etag is not None and spill_store is not None
+            path = spill_store.get(etag) if retained else None
+            if path is None:
+                ticket = admission.admit(client_id(request), priority)
+                path = await until_disconnected(spill_synthesis(req, priority), request)
+                if retained:
+                    path = spill_store.put(etag, path)
+            TIME_TO_FIRST_BYTE.observe(time.perf_counter() - started, "false")
+            return spill_response(path, request, mime_type(media_type), etag, retained)
+
+        ticket = admission.admit(client_id(request), priority)
+        shared = join_synthesis(req, cache_key, priority)
         
         if streaming_mode:
-            def streaming_generator(tts_generator:Generator, media_type:str):
-                if media_type == "wav":
-                    yield wave_header_chunk()
-                    media_type = "raw"
-                for sr, chunk in tts_generator:
-                    yield pack_audio(BytesIO(), chunk, sr, media_type).getvalue()
             # _media_type = f"audio/{media_type}" if not (streaming_mode and media_type in ["wav", "raw"]) else f"audio/x-{media_type}"
-            return StreamingResponse(streaming_generator(tts_generator, media_type, ), media_type=f"audio/{media_type}")
+            stream = release_after(observe_stream(stream_audio(shared.stream(), req), started, endpoint), ticket)
+            # 客户端在响应开始前断开时生成器不会被迭代, 由回收时的回调兜底释放名额
+            weakref.finalize(stream, ticket.release)
+            ticket = None
+            return StreamingResponse(stream, media_type=mime_type(media_type))
     
         else:
-            sr, audio_data = next(tts_generator)
-            audio_data = pack_audio(BytesIO(), audio_data, sr, media_type).getvalue()
-            return Response(audio_data, media_type=f"audio/{media_type}")
+            sr, audio_data = await until_disconnected(shared.result(), request)
+            audio_data = await asyncio.to_thread(encode_audio, sr, audio_data, req)
+            TIME_TO_FIRST_BYTE.observe(time.perf_counter() - started, "false")
+            return Response(audio_data, media_type=mime_type(media_type))
+    except ClientDisconnected:
+        ERRORS.inc(endpoint, "disconnected")
+        return Response(status_code=499)
+    except Overloaded as e:
+        ERRORS.inc(endpoint, "overloaded")
+        return overloaded_response(e.retry_after)
+    except queue.Full:
+        ERRORS.inc(endpoint, "overloaded")
+        return queue_full_response()
     except Exception as e:
+        ERRORS.inc(endpoint, "failed")
         return JSONResponse(status_code=400, content={"message": f"tts failed", "Exception": str(e)})
+    finally:
+        if ticket is not None:
+            ticket.release()
 
 
 
 
-async def tts_handle_srt(req:dict,request):
+async def tts_handle_srt(req:dict, request:Request):
     """
-    Text to speech handler.
+    Submit a subtitle job.
     
     Args:
         req (dict): 
@@ -376,41 +3338,390 @@ async def tts_handle_srt(req:dict,request):
                 "text_split_method": "cut5",  # str. text split method, see text_segmentation_method.py for details.
                 "batch_size": 1,              # int. batch size for inference
                 "batch_threshold": 0.75,      # float. threshold for batch splitting.
-                "split_bucket: True,          # bool. whether to split the batch into multiple buckets.
                 "speed_factor":1.0,           # float. control the speed of the synthesized audio.
                 "fragment_interval":0.3,      # float. to control the interval of the audio fragment.
                 "seed": -1,                   # int. random seed for reproducibility.
-                "media_type": "wav",          # str. media type of the output audio, support "wav", "raw", "ogg", "aac".
-                "streaming_mode": False,      # bool. whether to return a streaming response.
                 "parallel_infer": True,       # bool.(optional) whether to use parallel inference.
-                "repetition_penalty": 1.35    # float.(optional) repetition penalty for T2S model.          
+                "repetition_penalty": 1.35,   # float.(optional) repetition penalty for T2S model.
+                "model": None                 # str.(optional) resident model name, see /models.
             }
     returns:
-        StreamingResponse: audio stream response.
+        JSONResponse: job id and the urls of the job status, audio and subtitles, http code 202.
     """
-    
-    streaming_mode = req.get("streaming_mode", False)
-    media_type = req.get("media_type", "wav")
-
+    # 输出固定为 wav, 不受 media_type / streaming_mode 影响
+    req = dict(req, media_type="wav", streaming_mode=False, sample_rate=None, bitrate=None)
+    REQUESTS.inc("/srt", voice_label(req))
     check_res = check_params(req)
     if check_res is not None:
+        ERRORS.inc("/srt", "invalid_params")
         return check_res
 
-    
+    ticket:AdmissionTicket = None
     try:
-        tts_generator=tts_pipeline.run(req)
-        
-        sr, audio_data = next(tts_generator)
-        print(audio_data)
-        #audio_data = pack_audio(BytesIO(), audio_data, sr, media_type).getvalue()
-        #return Response(audio_data, media_type=f"audio/{media_type}")
-        return JSONResponse({"code":"200", "srt":f"http://{request.url.hostname}:{request.url.port}/srt/tts-out.srt","audio":f"http://{request.url.hostname}:{request.url.port}/srt/audio.wav"})
+        ticket = admission.admit(client_id(request), PRIORITY_BULK)
+        job = srt_jobs.submit(req, ticket)
+        ticket = None  # 由任务结束时释放
+    except Overloaded as e:
+        ERRORS.inc("/srt", "overloaded")
+        return overloaded_response(e.retry_after)
+    except queue.Full:
+        ERRORS.inc("/srt", "overloaded")
+        return queue_full_response()
     except Exception as e:
+        ERRORS.inc("/srt", "failed")
         return JSONResponse(status_code=400, content={"message": f"tts failed", "Exception": str(e)})
-    
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+    base = f"{request.url.scheme}://{request.url.netloc}/srt/jobs/{job.id}"
+    return JSONResponse(status_code=202, content={"job_id": job.id, "status": base, "audio": f"{base}/audio.wav", "srt": f"{base}/subtitles.srt"})
+
+
+SRT_JOB_FILES = {"audio.wav": "audio/wav", "subtitles.srt": "application/x-subrip"}
+
+
+def voice_path(voice:str) -> str:
+    """音色名 (/speakers 中的 voice_id) 对应的参考音频路径, 扩展名以索引中的实际文件为准"""
+    path = catalog.voice_path(voice) if catalog is not None else None
+    if path is not None:
+        return path
+    for extension in VOICE_EXTENSIONS:
+        path = os.path.join(VOICE_DIR, f"{voice}{extension}")
+        if os.path.exists(path):
+            return path
+    return os.path.join(VOICE_DIR, f"{voice}.wav")
+
+
+def batch_message_request(defaults:dict, message) -> dict:
+    """以请求顶层参数为默认值, 合并单条消息中的覆盖项, 得到这条消息的推理参数"""
+    if isinstance(message, str):
+        message = {"text": message}
+    if not isinstance(message, dict):
+        raise ValueError(f"message must be a string or an object, got {type(message).__name__}")
+    req = dict(defaults)
+    req.update({name: value for name, value in message.items() if name in TTS_Request.__fields__ and value is not None})
+    if message.get("voice") and not message.get("ref_audio_path"):
+        req["ref_audio_path"] = voice_path(message["voice"])
+    for name in ["text_lang", "prompt_lang"]:
+        if isinstance(req.get(name), str):
+            req[name] = req[name].lower()
+    req["streaming_mode"] = False
+    req["return_fragment"] = False
+    return req
+
+
+def plan_batch(reqs:list, indexes:list, max_requests:int) -> list:
+    """
+    按 MicroBatcher.batch_key 把消息分组 (参考音频, 模型与推理参数相同的消息可以合并推理), 每组至多 max_requests 条,
+    各组按其第一条消息的顺序排列, 使结果能尽早按顺序发出.
+    """
+    groups:OrderedDict = OrderedDict()
+    for index in indexes:
+        groups.setdefault(MicroBatcher.batch_key(reqs[index]), []).append(index)
+    plan = []
+    for group in groups.values():
+        plan.extend(group[start:start + max_requests] for start in range(0, len(group), max_requests))
+    plan.sort(key=lambda group: group[0])
+    return plan
+
+
+async def batch_results(reqs:list, max_inflight:int=2):
+    """
+    按计划逐组提交 run_merged 任务 (同时至多 max_inflight 组在推理队列中), 按消息顺序产出 (index, sr, audio, error).
+    命中音频缓存的消息不参与推理; 生成器被关闭 (客户端断开) 时取消尚未完成的任务.
+    """
+    results:dict = {}
+    cache_keys = [audio_cache_key(req) for req in reqs]
+    for index, cache_key in enumerate(cache_keys):
+        cached = await audio_cache.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            results[index] = (*cached, None)
+    pending = deque(plan_batch(reqs, [index for index in range(len(reqs)) if index not in results], args.batch_max_requests))
+    inflight = deque()
+    try:
+        for index in range(len(reqs)):
+            while index not in results:
+                while pending and len(inflight) < max_inflight:
+                    group = pending[0]
+                    try:
+                        job = tts_executor.submit(run_merged, [reqs[i] for i in group], model=reqs[group[0]].get("model"), priority=PRIORITY_BULK)
+                    except queue.Full:
+                        break
+                    pending.popleft()
+                    inflight.append((group, job, asyncio.ensure_future(job.result())))
+                if not inflight:
+                    await asyncio.sleep(0.5)
+                    continue
+                group, job, task = inflight.popleft()
+                try:
+                    outputs = await task
+                except Exception as e:
+                    ERRORS.inc("/tts_batch", "failed", amount=len(group))
+                    results.update({i: (None, None, e) for i in group})
+                    continue
+                for i, (sr, audio) in zip(group, outputs):
+                    results[i] = (sr, audio, None)
+                    if cache_keys[i] is not None:
+                        await audio_cache.put(cache_keys[i], sr, audio)
+            yield (index, *results.pop(index))
+    finally:
+        for _, job, task in inflight:
+            job.cancel()
+            task.cancel()
+
+
+async def batch_ndjson(reqs:list, ticket:AdmissionTicket):
+    try:
+        async for index, sr, audio, error in batch_results(reqs):
+            if error is not None:
+                line = {"index": index, "error": str(error)}
+            else:
+                data = await asyncio.to_thread(encode_audio, sr, audio, reqs[index])
+                line = {"index": index, "media_type": reqs[index]["media_type"], "audio": base64.b64encode(data).decode("ascii")}
+            yield (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+    finally:
+        ticket.release()
+
+
+async def batch_multipart(reqs:list, ticket:AdmissionTicket, boundary:str):
+    try:
+        async for index, sr, audio, error in batch_results(reqs):
+            if error is not None:
+                content_type, data = "application/json", json.dumps({"index": index, "error": str(error)}, ensure_ascii=False).encode("utf-8")
+            else:
+                content_type, data = mime_type(reqs[index]["media_type"]), await asyncio.to_thread(encode_audio, sr, audio, reqs[index])
+            yield (f"--{boundary}\r\nContent-Type: {content_type}\r\nContent-Length: {len(data)}\r\n"
+                   f"X-Message-Index: {index}\r\n\r\n").encode("ascii")
+            yield data
+            yield b"\r\n"
+        yield f"--{boundary}--\r\n".encode("ascii")
+    finally:
+        ticket.release()
+
+
+class IncrementalSegmenter:
+    """
+    增量分句: 对累计的文本套用 text_split_method 对应的切分函数 (与 TTS.run 同一套规则),
+    除最后一段外都视为已闭合的句子; 最后一段可能仍在增长, 留到后续文本到达或 flush 时处理.
+    短于 min_length 的句子与下一句合并后再输出, 避免过短的文本单独推理.
+    """
+    def __init__(self, method:str, min_length:int=5):
+        self.split = get_cut_method(method)
+        self.min_length = min_length
+        self.buffer = ""
+        self.pending = ""
+
+    def _emit(self, segments:list) -> list:
+        sentences = []
+        for segment in segments:
+            self.pending += segment
+            if len(self.pending.strip()) >= self.min_length:
+                sentences.append(self.pending.strip())
+                self.pending = ""
+        return sentences
+
+    def feed(self, text:str) -> list:
+        self.buffer += text
+        segments = self.split(self.buffer).split("\n")
+        if len(segments) < 2:
+            return []
+        # 切分函数可能丢弃纯标点的片段, 以最后一段在原文中的位置确定剩余文本
+        position = self.buffer.rfind(segments[-1]) if segments[-1] else len(self.buffer)
+        if position < 0:
+            return []
+        self.buffer = self.buffer[position:]
+        return self._emit(segment for segment in segments[:-1] if segment.strip())
+
+    def flush(self) -> list:
+        segments = [segment for segment in self.split(self.buffer).split("\n") if segment.strip()] if self.buffer.strip() else []
+        self.buffer = ""
+        sentences = self._emit(segments)
+        if self.pending.strip():
+            sentences.append(self.pending.strip())
+        self.pending = ""
+        return sentences
+
+
+async def synthesize_sentence(req:dict):
+    cache_key = audio_cache_key(req)
+    cached = await audio_cache.get(cache_key) if cache_key is not None else None
+    if cached is not None:
+        return cached
+    return await join_synthesis(req, cache_key, PRIORITY_INTERACTIVE).result()
+
+
+async def send_sentences(websocket:WebSocket, req:dict, sentences:asyncio.Queue):
+    """按提交顺序等待各句的合成结果, 经同一个流式编码器编码后以二进制帧发送"""
+    media_type = req["media_type"]
+
+    async def fragments():
+        started = False
+        while True:
+            item = await sentences.get()
+            if item is None:
+                return
+            index, text, task = item
+            try:
+                sr, audio = await task
+            except queue.Full:
+                # queue.Full 不带消息, 与 HTTP 的 429 一样给出明确的提示
+                ERRORS.inc("/ws/tts", "overloaded")
+                await websocket.send_json({"type": "error", "index": index, "message": "queue full, please retry later",
+                                           "retry_after": admission.retry_after()})
+                continue
+            except Exception as e:
+                ERRORS.inc("/ws/tts", "failed")
+                await websocket.send_json({"type": "error", "index": index, "message": str(e)})
+                continue
+            if not started:
+                started = True
+                await websocket.send_json({"type": "audio_start", "media_type": media_type,
+                                           "sample_rate": output_sample_rate(media_type, req.get("sample_rate")) or sr})
+            await websocket.send_json({"type": "sentence", "index": index, "text": text})
+            yield sr, audio
+
+    async for data in stream_audio(fragments(), req):
+        await websocket.send_bytes(data)
+    await websocket.send_json({"type": "done"})
+
+
+async def tts_handle_incremental(websocket:WebSocket):
+    """
+    WebSocket 增量合成: 见模块文档 "增量合成". 每个闭合的句子立即作为一个流式优先级的任务提交,
+    推理与后续文本的接收并行进行; 连接断开或收到 cancel 时取消尚未完成的句子.
+    """
+    start = await websocket.receive_json()
+    if not isinstance(start, dict) or start.get("type") != "start":
+        await websocket.send_json({"type": "error", "message": "the first message must be of type start"})
+        await websocket.close()
+        return
+    start.pop("type")
+    try:
+        defaults = TTS_Request(**{name: value for name, value in start.items() if name in TTS_Request.__fields__ and value is not None}).dict()
+    except ValidationError as e:
+        ERRORS.inc("/ws/tts", "invalid_params")
+        await websocket.send_json({"type": "error", "message": f"invalid start message: {e}"})
+        await websocket.close()
+        return
+    if "media_type" not in start:
+        defaults["media_type"] = "raw"
+    req = batch_message_request(defaults, dict(start, text="..."))
+    req["streaming_mode"] = True  # 按流式请求检查 media_type, 使 ogg 等流式格式可用
+    REQUESTS.inc("/ws/tts", voice_label(req))
+    check_res = check_params(req)
+    if check_res is not None:
+        ERRORS.inc("/ws/tts", "invalid_params")
+        await websocket.send_json({"type": "error", "message": json.loads(check_res.body)["message"]})
+        await websocket.close()
+        return
+    req["streaming_mode"] = False
+
+    try:
+        ticket = admission.admit(websocket.client.host if websocket.client else "local", PRIORITY_INTERACTIVE)
+    except Overloaded as e:
+        ERRORS.inc("/ws/tts", "overloaded")
+        await websocket.send_json({"type": "error", "message": "server busy, please retry later", "retry_after": e.retry_after})
+        await websocket.close()
+        return
+
+    segmenter = IncrementalSegmenter(req["text_split_method"])
+    sentences:asyncio.Queue = asyncio.Queue()
+    tasks = []
+    sender = asyncio.ensure_future(send_sentences(websocket, req, sentences))
+
+    def submit(texts:list):
+        for text in texts:
+            task = asyncio.ensure_future(synthesize_sentence(dict(req, text=text)))
+            tasks.append(task)
+            sentences.put_nowait((len(tasks) - 1, text, task))
+
+    try:
+        while True:
+            receiver = asyncio.ensure_future(websocket.receive_json())
+            await asyncio.wait({receiver, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if not receiver.done():
+                # 发送端先结束 (连接断开或发送出错)
+                receiver.cancel()
+                error = sender.exception()
+                if error is not None and not isinstance(error, WebSocketDisconnect):
+                    print(f"incremental tts failed: {error}")
+                break
+            message = receiver.result()
+            if not isinstance(message, dict) or not isinstance(message.get("text", ""), str):
+                await websocket.send_json({"type": "error", "message": "messages must be objects with a string text"})
+                continue
+            kind = message.get("type")
+            if kind == "text":
+                submit(segmenter.feed(message.get("text", "")))
+            elif kind == "end":
+                submit(segmenter.flush())
+                sentences.put_nowait(None)
+                await sender
+                await websocket.close()
+                break
+            elif kind == "cancel":
+                await websocket.close()
+                break
+    finally:
+        sender.cancel()
+        for task in tasks:
+            task.cancel()
+        ticket.release()
+
+
+async def tts_handle_batch(req:dict, request:Request):
+    """
+    Synthesize a list of messages as one pipelined job.
 
+    Args:
+        req (dict): the fields of POST / as defaults for every message, plus
+            {
+                "messages": [],               # list.(required) strings, or objects with "text" and optional "voice" and overrides
+                "format": "ndjson"            # str. "ndjson" or "multipart"
+            }
+    returns:
+        StreamingResponse: one result per message, in message order.
+    """
+    messages = req.pop("messages", None)
+    output_format = req.pop("format", "ndjson")
+    if not messages:
+        return JSONResponse(status_code=400, content={"message": "messages is required"})
+    if len(messages) > args.max_batch_messages:
+        return JSONResponse(status_code=400, content={"message": f"at most {args.max_batch_messages} messages are allowed"})
+    if output_format not in ["ndjson", "multipart"]:
+        return JSONResponse(status_code=400, content={"message": f"format: {output_format} is not supported"})
 
+    reqs = []
+    for index, message in enumerate(messages):
+        try:
+            message_req = batch_message_request(req, message)
+        except ValueError as e:
+            ERRORS.inc("/tts_batch", "invalid_params")
+            return JSONResponse(status_code=400, content={"message": f"message {index}: {e}"})
+        check_res = check_params(message_req)
+        if check_res is not None:
+            ERRORS.inc("/tts_batch", "invalid_params")
+            return JSONResponse(status_code=400, content={"message": f"message {index}: {json.loads(check_res.body)['message']}"})
+        reqs.append(message_req)
+    for message_req in reqs:
+        REQUESTS.inc("/tts_batch", voice_label(message_req))
 
+    try:
+        ticket = admission.admit(client_id(request), PRIORITY_BULK)
+    except Overloaded as e:
+        ERRORS.inc("/tts_batch", "overloaded")
+        return overloaded_response(e.retry_after)
+    if output_format == "multipart":
+        boundary = uuid.uuid4().hex
+        stream = batch_multipart(reqs, ticket, boundary)
+        media_type = f"multipart/mixed; boundary={boundary}"
+    else:
+        stream = batch_ndjson(reqs, ticket)
+        media_type = "application/x-ndjson"
+    # 客户端在响应开始前断开时生成器不会被迭代, 由回收时的回调兜底释放名额
+    weakref.finalize(stream, ticket.release)
+    return StreamingResponse(stream, media_type=media_type)
 
 
 @APP.get("/control")
@@ -440,7 +3751,10 @@ async def tts_get_endpoint_srt(request: Request,
                         media_type:str = "wav",
                         streaming_mode:bool = False,
                         parallel_infer:bool = True,
-                        repetition_penalty:float = 1.35
+                        repetition_penalty:float = 1.35,
+                        model: str = None,
+                        sample_rate: int = None,
+                        bitrate: int = None
                         ):
     req = {
         "text": text,
@@ -461,7 +3775,10 @@ async def tts_get_endpoint_srt(request: Request,
         "media_type":media_type,
         "streaming_mode":streaming_mode,
         "parallel_infer":parallel_infer,
-        "repetition_penalty":float(repetition_penalty)
+        "repetition_penalty":float(repetition_penalty),
+        "model":model,
+        "sample_rate":sample_rate,
+        "bitrate":bitrate
     }
     return await tts_handle_srt(req,request)
 
@@ -471,9 +3788,33 @@ async def tts_post_endpoint_srt(request: TTS_Request,req1: Request):
     return await tts_handle_srt(req,req1)
 
 
+@APP.get("/srt/jobs/{job_id}")
+async def srt_job_status(job_id: str):
+    job = srt_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"message": f"job {job_id} not found"})
+    return JSONResponse(job.snapshot(), status_code=200)
+
+
+@APP.delete("/srt/jobs/{job_id}")
+async def srt_job_delete(job_id: str):
+    if not await srt_jobs.delete(job_id):
+        return JSONResponse(status_code=404, content={"message": f"job {job_id} not found"})
+    return JSONResponse({"message": "deleted"}, status_code=200)
+
+
+@APP.get("/srt/jobs/{job_id}/{name}")
+async def srt_job_file(request: Request, job_id: str, name: str):
+    job = srt_jobs.get(job_id)
+    if job is None or name not in SRT_JOB_FILES or not os.path.exists(job.path(name)):
+        return JSONResponse(status_code=404, content={"message": f"{name} of job {job_id} not found"})
+    return file_range_response(job.path(name), request, SRT_JOB_FILES[name])
+
+
 
 @APP.get("/")
 async def tts_get_endpoint(
+                        request: Request,
                         text: str = None,
                         text_lang: str = None,
                         ref_audio_path: str = None,
@@ -493,7 +3834,11 @@ async def tts_get_endpoint(
                         media_type:str = "wav",
                         streaming_mode:bool = False,
                         parallel_infer:bool = True,
-                        repetition_penalty:float = 1.35
+                        repetition_penalty:float = 1.35,
+                        model: str = None,
+                        sample_rate: int = None,
+                        bitrate: int = None,
+                        low_latency: bool = False
                         ):
     req = {
         "text": text,
@@ -515,21 +3860,42 @@ async def tts_get_endpoint(
         "media_type":media_type,
         "streaming_mode":streaming_mode,
         "parallel_infer":parallel_infer,
-        "repetition_penalty":float(repetition_penalty)
+        "repetition_penalty":float(repetition_penalty),
+        "model":model,
+        "sample_rate":sample_rate,
+        "bitrate":bitrate,
+        "low_latency":low_latency
     }
-    return await tts_handle(req)
+    return await tts_handle(req, request)
                 
 
 @APP.post("/")
-async def tts_post_endpoint(request: TTS_Request):
+async def tts_post_endpoint(request: TTS_Request, raw_request: Request):
+    req = request.dict()
+    return await tts_handle(req, raw_request)
+
+
+@APP.post("/tts_batch")
+async def tts_batch_endpoint(request: TTS_Batch_Request, raw_request: Request):
     req = request.dict()
-    return await tts_handle(req)
+    return await tts_handle_batch(req, raw_request)
+
+
+@APP.websocket("/ws/tts")
+async def tts_websocket(websocket: WebSocket):
+    await websocket.accept()
+    try:
+        await tts_handle_incremental(websocket)
+    except WebSocketDisconnect:
+        pass
 
 
 @APP.get("/set_refer_audio")
 async def set_refer_aduio(refer_audio_path: str = None):
     try:
-        tts_pipeline.set_ref_audio(refer_audio_path)
+        await tts_executor.submit(load_ref_audio, refer_audio_path).result()
+    except queue.Full:
+        return queue_full_response()
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": f"set refer audio failed", "Exception": str(e)})
     return JSONResponse(status_code=200, content={"message": "success"})
@@ -553,16 +3919,41 @@ async def set_refer_aduio(refer_audio_path: str = None):
 #         return JSONResponse(status_code=400, content={"message": f"set refer audio failed", "Exception": str(e)})
 #     return JSONResponse(status_code=200, content={"message": "success"})
 
+async def pool_control(op:str, *args):
+    """在推理执行器一侧执行模型池操作, 完成后刷新前端的模型状态"""
+    name = model_name(*args) if op in ["load", "switch"] else None
+    if name is not None:
+        model_registry.loading.add(name)
+    try:
+        result, status = await asyncio.to_thread(tts_executor.control, op, *args)
+    finally:
+        model_registry.loading.discard(name)
+    model_registry.update(status)
+    return result
+
+
+async def switch_model(gpt_path:str, sovits_path:str) -> str:
+    """在后台加载权重并设为默认模型, 加载期间原模型继续服务"""
+    return await pool_control("switch", gpt_path, sovits_path)
+
+
+async def load_model_in_background(gpt_path:str, sovits_path:str):
+    try:
+        await pool_control("load", gpt_path, sovits_path)
+    except Exception as e:
+        print(f"load model {model_name(gpt_path, sovits_path)} failed: {e}")
+
+
 @APP.get("/set_gpt_weights")
 async def set_gpt_weights(weights_path: str = None):
     try:
         if weights_path in ["", None]:
             return JSONResponse(status_code=400, content={"message": "gpt weight path is required"})
-        tts_pipeline.init_t2s_weights(weights_path)
+        name = await switch_model(weights_path, model_registry.weights()[1])
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": f"change gpt weight failed", "Exception": str(e)})
 
-    return JSONResponse(status_code=200, content={"message": "success"})
+    return JSONResponse(status_code=200, content={"message": "success", "model": name})
 
 
 @APP.get("/set_sovits_weights")
@@ -570,28 +3961,44 @@ async def set_sovits_weights(weights_path: str = None):
     try:
         if weights_path in ["", None]:
             return JSONResponse(status_code=400, content={"message": "sovits weight path is required"})
-        tts_pipeline.init_vits_weights(weights_path)
+        name = await switch_model(model_registry.weights()[0], weights_path)
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": f"change sovits weight failed", "Exception": str(e)})
-    return JSONResponse(status_code=200, content={"message": "success"})
-    
+    return JSONResponse(status_code=200, content={"message": "success", "model": name})
+
+
+@APP.get("/load_model")
+async def load_model(gpt_weights_path: str = None, sovits_weights_path: str = None):
+    if gpt_weights_path in ["", None] or sovits_weights_path in ["", None]:
+        return JSONResponse(status_code=400, content={"message": "gpt_weights_path and sovits_weights_path are required"})
+    name = model_name(gpt_weights_path, sovits_weights_path)
+    if model_registry.has(name):
+        return JSONResponse(status_code=200, content={"message": "resident", "model": name})
+    if name not in model_registry.loading:
+        asyncio.ensure_future(load_model_in_background(gpt_weights_path, sovits_weights_path))
+    return JSONResponse(status_code=202, content={"message": "loading", "model": name})
+
+
+@APP.get("/models")
+async def models_endpoint():
+    return JSONResponse(model_registry.snapshot(), status_code=200)
+
 @APP.get("/cut_methods")
 def cut_methods_endpoint():
     return JSONResponse(cut_method_names, status_code=200) 
     
     
+async def catalog_response(request:Request, name:str):
+    body, etag = await catalog.payload(name)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
 @APP.get("/available_models")
-async def available_models():
-    gpt_weights = [f for f in os.listdir("GPT_weights") if f.endswith(".ckpt")]
-    sovits_weights = [f for f in os.listdir("SoVITS_weights") if f.endswith(".pth")]
-    gpt_weights_v2 = [f for f in os.listdir("GPT_weights_v2") if f.endswith(".ckpt")]
-    sovits_weights_v2 = [f for f in os.listdir("SoVITS_weights_v2") if f.endswith(".pth")]
-    return JSONResponse({
-        "gpt_weights": gpt_weights,
-        "sovits_weights": sovits_weights,
-        "gpt_weights_v2": gpt_weights_v2,
-        "sovits_weights_v2": sovits_weights_v2
-    }, status_code=200)
+async def available_models(request: Request):
+    return await catalog_response(request, "available_models")
 
 @APP.get("/set_model")
 async def set_model(gpt_weights: str = None, sovits_weights: str = None, gpt_weights_v2: str = None, sovits_weights_v2: str = None):
@@ -602,31 +4009,102 @@ async def set_model(gpt_weights: str = None, sovits_weights: str = None, gpt_wei
     if (gpt_weights_v2 and not sovits_weights_v2) or (sovits_weights_v2 and not gpt_weights_v2):
         return JSONResponse(status_code=400, content={"message": "Must select both GPT and SoVITS weights for v2."})
 
+    name = None
     try:
         if gpt_weights and sovits_weights:
-            tts_pipeline.init_t2s_weights(os.path.join("GPT_weights", gpt_weights))
-            tts_pipeline.init_vits_weights(os.path.join("SoVITS_weights", sovits_weights))
+            name = await switch_model(os.path.join("GPT_weights", gpt_weights), os.path.join("SoVITS_weights", sovits_weights))
         elif gpt_weights_v2 and sovits_weights_v2:
-            tts_pipeline.init_t2s_weights(os.path.join("GPT_weights_v2", gpt_weights_v2))
-            tts_pipeline.init_vits_weights(os.path.join("SoVITS_weights_v2", sovits_weights_v2))
+            name = await switch_model(os.path.join("GPT_weights_v2", gpt_weights_v2), os.path.join("SoVITS_weights_v2", sovits_weights_v2))
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": f"Failed to change model weights.", "Exception": str(e)})
 
-    return JSONResponse(status_code=200, content={"message": "success"})
+    return JSONResponse(status_code=200, content={"message": "success", "model": name})
 
 
 
 
 @APP.get("/speakers")
-def speakers_endpoint():
+async def speakers_endpoint(request: Request):
+    return await catalog_response(request, "speakers")
+
+
+async def precompute_ref_audio():
+    """逐个提交参考音频的特征提取任务, 每个文件单独排队, 不阻塞正常请求"""
+    await catalog.built.wait()
+    for path in sorted(catalog.voice_paths.values()):
+        while True:
+            try:
+                await tts_executor.submit(load_ref_audio, path, priority=PRIORITY_BULK).result()
+            except queue.Full:
+                await asyncio.sleep(1)
+                continue
+            except Exception as e:
+                print(f"precompute ref audio {path} failed: {e}")
+            break
+    print("precompute ref audio finished")
+
+
+@APP.on_event("startup")
+async def startup():
+    init_server()
+    asyncio.ensure_future(srt_jobs.collect())
+    asyncio.ensure_future(catalog.watch(args.catalog_interval))
+    if args.precompute_ref:
+        asyncio.ensure_future(precompute_ref_audio())
+
+
+def readiness() -> dict:
+    status = startup_progress.snapshot()
+    workers = tts_executor.status() if tts_executor is not None else []
+    status["workers_ready"] = sum(1 for worker in workers if worker["ready"])
+    status["workers"] = len(workers)
+    return status
+
 
-    voices = []
+@APP.get("/health")
+async def health_endpoint():
+    return JSONResponse(readiness(), status_code=200)
 
-    for name in os.listdir("参考音频"):
-        name = name.replace(".wav","").replace(".mp3","").replace(".WAV","")
-        voices.append({"name":name,"voice_id":name})
 
-    return JSONResponse(voices, status_code=200)
+@APP.get("/ready")
+async def ready_endpoint():
+    if startup_progress.ready.is_set():
+        return JSONResponse(readiness(), status_code=200)
+    headers = None if startup_progress.stage == "failed" else {"Retry-After": "5"}
+    return JSONResponse(readiness(), status_code=503, headers=headers)
+
+
+@APP.get("/metrics")
+async def metrics_endpoint():
+    workers = tts_executor.status() if tts_executor is not None else []
+    gauges = [
+        ("tts_queue_depth", "Inference jobs waiting in the queue", tts_executor.jobs.qsize() if tts_executor is not None else 0),
+        ("tts_active_requests", "Admitted requests", admission.active),
+        ("tts_resident_models", "Models resident in the model pool", len(model_registry.resident)),
+        ("tts_workers_ready", "Inference workers ready to serve", sum(1 for worker in workers if worker["ready"])),
+    ]
+    return Response(render_metrics(gauges), media_type="text/plain; version=0.0.4")
+
+
+def text_feature_cache_stats() -> dict:
+    with TEXT_FEATURES.lock:
+        counts = {labels[0]: value for labels, value in TEXT_FEATURES.values.items()}
+    lookups = sum(counts.values())
+    hits = counts.get("memory_hit", 0) + counts.get("disk_hit", 0)
+    return dict(counts, lookups=lookups, hit_rate=round(hits / lookups, 4) if lookups else None)
+
+
+@APP.get("/stats")
+async def stats_endpoint():
+    return JSONResponse({
+        "queue_depth": tts_executor.jobs.qsize(),
+        "cancelled_jobs": tts_executor.cancelled_jobs,
+        "active_requests": admission.active,
+        "rejected_requests": admission.rejected,
+        "inflight": len(single_flight.inflight),
+        "workers": tts_executor.status(),
+        "text_feature_cache": text_feature_cache_stats(),
+    }, status_code=200)
 
 
 @APP.get("/speakers_list")
@@ -636,7 +4114,7 @@ def speakerlist_endpoint():
 
 
 @APP.post("/tts_to_audio/")
-async def tts_to_audio(request: TTS_Request):
+async def tts_to_audio(request: TTS_Request, raw_request: Request):
     req = request.dict()
     # "text": "",                   # str.(required) text to be synthesized
     # "text_lang": "",              # str.(required) language of the text to be synthesized
@@ -648,7 +4126,7 @@ async def tts_to_audio(request: TTS_Request):
     req["prompt_text"] = global_config.llama_text
     req["prompt_lang"] = global_config.llama_prompt_lang
     req["batch_size"] = 10
-    return await tts_handle(req)
+    return await tts_handle(req, raw_request, PRIORITY_BULK)
 
 def graceful_exit(signum, frame):
     print("exit...")
@@ -659,7 +4137,7 @@ if __name__ == "__main__":
     try:
         signal.signal(signal.SIGTERM, graceful_exit)
         signal.signal(signal.SIGINT, graceful_exit)  
-        uvicorn.run(app=APP, host="0.0.0.0", port=9880, workers=1)
+        uvicorn.run(app=APP, host=host, port=port, workers=1)
     except Exception as e:
         traceback.print_exc()
         os.kill(os.getpid(), signal.SIGTERM)
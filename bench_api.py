@@ -0,0 +1,568 @@
+"""
+# api_v5 离线基准测试
+
+` python bench_api.py --transcripts chats/*.jsonl --concurrency 1,4,16 --output bench.json `
+
+以可替换的假 TTS 后端在进程内启动 api_v5, 用聊天记录构造并发负载, 测量服务端自身的开销
+(排队, 合批, 编码, 流式传输等), 不需要 GPT-SoVITS, 模型权重或 GPU. 结果以 json 输出, 便于比较不同版本.
+api_v5 在模块级导入 torch, numpy, soundfile 与 fastapi, 这些依赖仍需安装 (torch 用 CPU 版即可).
+
+假后端按 "字数 / --chars_per_second" 计算每段音频的时长, 产出正弦波合成音频, 并按 --rtf 倍的音频时长 sleep 模拟推理耗时;
+同一 batch 内的分段并行推理, 耗时取其中最长的一段. 以 --backend 指定 "模块:类名" 可换成其他实现
+(接口同 GPT_SoVITS.TTS_infer_pack.TTS.TTS); --real_tts 则使用已安装的 GPT-SoVITS.
+
+## 执行参数:
+    `--transcripts` - `聊天记录文件, 可多个. .jsonl 为 SillyTavern 聊天记录 (取 mes 字段), .json 为字符串或 {"text": ""} 列表, 其余按行读取; 为空时使用内置的示例消息`
+    `--include_user` - `聊天记录中的用户消息也参与合成 (默认只取角色消息)`
+    `--endpoints` - `要测试的接口, 逗号分隔: tts(非流式 /), stream(流式 /), srt(/srt 字幕任务), tts_to_audio(/tts_to_audio/), 默认全部`
+    `--media_types` - `tts / stream / tts_to_audio 测试的输出格式, 逗号分隔, 默认"wav,ogg"; ogg 只支持流式, 只用于 stream`
+    `--concurrency` - `并发客户端数, 逗号分隔, 每个值各测一轮, 默认"1,4,16"`
+    `--requests` - `每轮发送的请求数, 默认32`
+    `--text_lang` - `消息文本的语言, 默认"zh"`
+    `--text_split_method` - `默认"cut5"`
+    `--batch_size` - `默认1`
+    `--rtf` - `假后端的实时率 (推理耗时 / 音频时长), 默认0.3`
+    `--chars_per_second` - `假后端每秒音频对应的字数, 默认5`
+    `--sample_rate` - `假后端的采样率, 默认32000`
+    `--backend` - `假后端的 TTS 类, "模块:类名", 默认"bench_api:FakeTTS"`
+    `--real_tts` - `不替换 GPT-SoVITS, 使用已安装的真实模型 (需在 GPT-SoVITS 目录下运行)`
+    `--keep_cache` - `保留音频缓存 (默认关闭, 否则重复文本会命中缓存)`
+    `--timeout` - `单个请求的超时(秒), 默认300`
+    `--output` - `结果 json 的路径, 默认输出到 stdout`
+    `--` 之后的参数原样传给 api_v5, 如 `-- --workers 2 --batch_window 0.05`
+
+## 结果:
+```
+{
+    "config": {...},                    # 本次运行的参数
+    "scenarios": [{
+        "endpoint": "stream",           # 同 --endpoints
+        "media_type": "ogg",
+        "concurrency": 4,
+        "requests": 32, "errors": 0, "rejected": 0,   # rejected 为 429 的数量, 不计入 errors
+        "wall_seconds": 12.3,
+        "throughput_rps": 2.6,          # 成功请求数 / wall_seconds
+        "audio_seconds_per_second": 21.0,
+        "latency_ms": {"mean": 0, "p50": 0, "p99": 0, "max": 0},   # 完整响应 (srt 为任务完成) 的耗时
+        "ttfb_ms": {...},               # 第一个音频字节的耗时, srt 为空
+        "encode_ms": {"ogg": {"calls": 64, "mean": 1.2}}          # 本轮服务端各格式的编码调用次数与平均耗时
+    }]
+}
+```
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import importlib
+import http.client
+import concurrent.futures
+from types import ModuleType
+
+import numpy as np
+
+now_dir = os.path.dirname(os.path.abspath(__file__))
+
+# 环境变量用于把假后端的设置带到 spawn 出的推理工作进程中
+ENV_FAKE = "BENCH_TTS_FAKE"
+ENV_BACKEND = "BENCH_TTS_BACKEND"
+ENV_RTF = "BENCH_TTS_RTF"
+ENV_CHARS_PER_SECOND = "BENCH_TTS_CHARS_PER_SECOND"
+ENV_SAMPLE_RATE = "BENCH_TTS_SAMPLE_RATE"
+ENV_REF_AUDIO = "BENCH_TTS_REF_AUDIO"
+
+SAMPLE_MESSAGES = [
+    "你好呀, 今天过得怎么样? 我刚刚泡了一壶茶, 要不要一起坐下来聊聊天。",
+    "先帝创业未半而中道崩殂, 今天下三分, 益州疲弊, 此诚危急存亡之秋也。",
+    "嗯……让我想想。如果明天不下雨的话, 我们就去山上看日出吧! 记得早点睡哦。",
+    "这件事说来话长。那年冬天特别冷, 湖面结了厚厚的冰, 村里的孩子们每天都在冰上玩到天黑才回家。",
+    "好的, 我明白了。",
+    "Hello there! It has been a long day, but I am glad you came by. Shall we continue the story?",
+]
+
+
+# ---------------------------------------------------------------- 假 TTS 后端
+
+SPLITS = {"，", "。", "？", "！", ",", ".", "?", "!", "~", ":", "：", "—", "…"}
+
+
+def cut_sentences(text:str, punctuation:set) -> str:
+    pieces, current = [], ""
+    for char in text:
+        current += char
+        if char in punctuation:
+            pieces.append(current)
+            current = ""
+    if current:
+        pieces.append(current)
+    return "\n".join(pieces)
+
+
+CUT_METHODS = {
+    "cut0": lambda text: text,
+    "cut1": lambda text: "\n".join(text[i:i + 40] for i in range(0, len(text), 40)),
+    "cut2": lambda text: "\n".join(text[i:i + 50] for i in range(0, len(text), 50)),
+    "cut3": lambda text: cut_sentences(text, {"。"}),
+    "cut4": lambda text: cut_sentences(text, {"."}),
+    "cut5": lambda text: cut_sentences(text, SPLITS),
+}
+
+
+def get_method(name:str):
+    return CUT_METHODS[name]
+
+
+def get_method_names() -> list:
+    return list(CUT_METHODS.keys())
+
+
+class FakeI18nAuto:
+    def __call__(self, key):
+        return key
+
+
+class FakeTTSConfig:
+    languages = ["auto", "auto_yue", "en", "zh", "ja", "yue", "ko", "all_zh", "all_ja", "all_yue", "all_ko"]
+
+    def __init__(self, config_path=None):
+        self.version = "fake"
+        self.device = "cpu"
+        self.t2s_weights_path = "fake/gpt.ckpt"
+        self.vits_weights_path = "fake/sovits.pth"
+        self.sampling_rate = int(os.environ.get(ENV_SAMPLE_RATE, 32000))
+
+    def __str__(self):
+        return f"FakeTTSConfig(sampling_rate={self.sampling_rate})"
+
+
+class FakeTextPreprocessor:
+    def pre_seg_text(self, text:str, lang:str, text_split_method:str) -> list:
+        text = get_method(text_split_method)(text.strip("\n")) if text_split_method in CUT_METHODS else text
+        texts = [item.strip() for item in text.split("\n") if item.strip()]
+        # 同 TextPreprocessor: 过短的分段并入下一段
+        merged, current = [], ""
+        for item in texts:
+            current += item
+            if len(current) >= 5:
+                merged.append(current)
+                current = ""
+        if current:
+            if merged:
+                merged[-1] += current
+            else:
+                merged.append(current)
+        return merged
+
+
+class FakeTTS:
+    """
+    按 TTS.run 的产出形式生成正弦波音频: return_fragment 时每个 batch 产出一次, 否则最后产出整段.
+    每个 batch 按其中最长一段音频的 rtf 倍 sleep, 推理期间可被 stop() 打断.
+    """
+    def __init__(self, configs:FakeTTSConfig):
+        self.configs = configs
+        self.rtf = float(os.environ.get(ENV_RTF, 0.3))
+        self.chars_per_second = float(os.environ.get(ENV_CHARS_PER_SECOND, 5))
+        self.text_preprocessor = FakeTextPreprocessor()
+        self.prompt_cache = {"ref_audio_path": None, "prompt_semantic": None, "refer_spec": [],
+                             "prompt_text": None, "prompt_lang": None, "phones": None, "bert_features": None, "norm_text": None}
+        self.stop_flag = False
+
+    def init_t2s_weights(self, weights_path:str):
+        self.configs.t2s_weights_path = weights_path
+
+    def init_vits_weights(self, weights_path:str):
+        self.configs.vits_weights_path = weights_path
+
+    def set_ref_audio(self, ref_audio_path:str):
+        if not os.path.exists(ref_audio_path):
+            raise ValueError(f"{ref_audio_path} not exists")
+        self.prompt_cache["ref_audio_path"] = ref_audio_path
+        self.prompt_cache["prompt_semantic"] = np.zeros(16, dtype=np.int64)
+
+    def stop(self):
+        self.stop_flag = True
+
+    def synthesize(self, text:str, speed_factor:float, rng:np.random.Generator) -> np.ndarray:
+        sr = self.configs.sampling_rate
+        samples = max(1, int(sr * len(text) / self.chars_per_second / max(speed_factor, 0.01)))
+        t = np.arange(samples, dtype=np.float32) / sr
+        tone = 0.3 * np.sin(2 * np.pi * rng.uniform(120, 320) * t)
+        return (tone + 0.01 * rng.standard_normal(samples)).astype(np.float32)
+
+    def audio_postprocess(self, audio:list, sr:int, batch_index_list:list=None, speed_factor:float=1.0,
+                          split_bucket:bool=True, fragment_interval:float=0.3):
+        zero = np.zeros(int(sr * fragment_interval), dtype=np.float32)
+        fragments = [np.concatenate([fragment, zero]) for batch in audio for fragment in batch]
+        data = np.concatenate(fragments) if fragments else zero
+        return sr, (np.clip(data, -1, 1) * 32767).astype(np.int16)
+
+    def run(self, inputs:dict):
+        self.stop_flag = False
+        sr = self.configs.sampling_rate
+        texts = self.text_preprocessor.pre_seg_text(inputs["text"], inputs.get("text_lang"), inputs.get("text_split_method", "cut0"))
+        batch_size = max(1, int(inputs.get("batch_size", 1)))
+        return_fragment = inputs.get("return_fragment", False)
+        speed_factor = float(inputs.get("speed_factor", 1.0))
+        fragment_interval = float(inputs.get("fragment_interval", 0.3))
+        seed = inputs.get("seed", -1)
+        rng = np.random.default_rng(None if seed in [None, -1] else seed)
+        if len(texts) == 0:
+            yield sr, np.zeros(int(sr), dtype=np.int16)
+            return
+
+        audio = []
+        for start in range(0, len(texts), batch_size):
+            if self.stop_flag:
+                break
+            batch = [self.synthesize(text, speed_factor, rng) for text in texts[start:start + batch_size]]
+            time.sleep(self.rtf * max(len(fragment) for fragment in batch) / sr)
+            if return_fragment:
+                yield self.audio_postprocess([batch], sr, None, speed_factor, False, fragment_interval)
+            else:
+                audio.append(batch)
+        if not return_fragment:
+            yield self.audio_postprocess(audio, sr, None, speed_factor, inputs.get("split_bucket", True), fragment_interval)
+
+
+def load_backend(spec:str):
+    module_name, class_name = spec.split(":", 1)
+    if module_name in [__name__, "bench_api"] and class_name in globals():
+        return globals()[class_name]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def install_fake_backend():
+    """在 sys.modules 中放入 api_v5 在模块级导入的 GPT_SoVITS / tools.i18n / config 的替身"""
+    def module(name:str, **attrs) -> ModuleType:
+        instance = sys.modules.get(name) or ModuleType(name)
+        instance.__dict__.update(attrs)
+        sys.modules[name] = instance
+        parent, _, child = name.rpartition(".")
+        if parent:
+            setattr(sys.modules[parent], child, instance)
+        return instance
+
+    ref_audio = os.environ.get(ENV_REF_AUDIO, "")
+    module("GPT_SoVITS")
+    module("GPT_SoVITS.TTS_infer_pack")
+    module("GPT_SoVITS.TTS_infer_pack.TTS", TTS=load_backend(os.environ.get(ENV_BACKEND, "bench_api:FakeTTS")), TTS_Config=FakeTTSConfig)
+    module("GPT_SoVITS.TTS_infer_pack.text_segmentation_method",
+           get_method=get_method, get_method_names=get_method_names, splits=SPLITS)
+    module("tools")
+    module("tools.i18n")
+    module("tools.i18n.i18n", I18nAuto=FakeI18nAuto)
+    module("config", llama_audio=ref_audio, llama_text="这是一段用于基准测试的参考音频。",
+           llama_lang="zh", llama_prompt_lang="zh")
+
+
+# spawn 出的推理工作进程会重新导入本模块 (作为 __mp_main__), 在反序列化 api_v5 的任务之前装好替身
+if os.environ.get(ENV_FAKE) == "1" and "GPT_SoVITS.TTS_infer_pack.TTS" not in sys.modules:
+    install_fake_backend()
+
+
+def write_ref_audio(path:str, sr:int=32000, seconds:float=3.0):
+    import wave
+    t = np.arange(int(sr * seconds), dtype=np.float32) / sr
+    data = (0.3 * np.sin(2 * np.pi * 220 * t) * 32767).astype(np.int16)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sr)
+        f.writeframes(data.tobytes())
+
+
+# ---------------------------------------------------------------- 负载
+
+def load_transcripts(paths:list, include_user:bool=False) -> list:
+    texts = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    # SillyTavern 聊天记录的首行为元数据, 不含 mes
+                    if "mes" not in record or record.get("is_system") or (record.get("is_user") and not include_user):
+                        continue
+                    texts.append(record["mes"])
+            elif path.endswith(".json"):
+                for item in json.load(f):
+                    texts.append(item["text"] if isinstance(item, dict) else item)
+            else:
+                texts.extend(f.read().splitlines())
+    return [text.strip() for text in texts if text and text.strip()]
+
+
+def percentiles(values:list) -> dict:
+    if not values:
+        return {}
+    values = np.array(values) * 1000
+    return {
+        "mean": round(float(values.mean()), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "max": round(float(values.max()), 2),
+    }
+
+
+def encode_totals(histogram) -> dict:
+    """当前 ENCODE 直方图各 media_type 的 (调用次数, 总耗时)"""
+    with histogram.lock:
+        return {labels[0]: (sum(counts), total) for labels, (counts, total) in histogram.values.items()}
+
+
+class Bench:
+    def __init__(self, host:str, port:int, args, ref_audio_path:str):
+        self.host = host
+        self.port = port
+        self.args = args
+        self.ref_audio_path = ref_audio_path
+
+    def payload(self, endpoint:str, text:str, media_type:str, index:int) -> dict:
+        return {
+            "text": text,
+            "text_lang": self.args.text_lang,
+            "ref_audio_path": self.ref_audio_path,
+            "prompt_text": "这是一段用于基准测试的参考音频。",
+            "prompt_lang": "zh",
+            "text_split_method": self.args.text_split_method,
+            "batch_size": self.args.batch_size,
+            "media_type": "wav" if endpoint == "srt" else media_type,
+            "streaming_mode": endpoint == "stream",
+            # 每个请求的 seed 不同, 避免相同文本被合并为同一次推理
+            "seed": index,
+        }
+
+    def call(self, method:str, path:str, body:dict=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.args.timeout)
+        conn.request(method, path, body=None if body is None else json.dumps(body, ensure_ascii=False).encode("utf-8"),
+                     headers={"Content-Type": "application/json"})
+        return conn, conn.getresponse()
+
+    def run_one(self, endpoint:str, text:str, media_type:str, index:int) -> dict:
+        """发送一个请求, 返回 status / latency / ttfb / 音频字节数"""
+        path = {"tts": "/", "stream": "/", "srt": "/srt", "tts_to_audio": "/tts_to_audio/"}[endpoint]
+        started = time.perf_counter()
+        conn, resp = self.call("POST", path, self.payload(endpoint, text, media_type, index))
+        try:
+            if endpoint == "srt":
+                job = json.loads(resp.read())
+                if resp.status != 202:
+                    return {"status": resp.status}
+                return self.wait_srt(job["job_id"], started)
+            ttfb, size = None, 0
+            while True:
+                chunk = resp.read1(65536)
+                if not chunk:
+                    break
+                if ttfb is None:
+                    ttfb = time.perf_counter() - started
+                size += len(chunk)
+            return {"status": resp.status, "latency": time.perf_counter() - started, "ttfb": ttfb, "bytes": size}
+        finally:
+            conn.close()
+
+    def wait_srt(self, job_id:str, started:float) -> dict:
+        while True:
+            conn, resp = self.call("GET", f"/srt/jobs/{job_id}")
+            try:
+                job = json.loads(resp.read())
+            finally:
+                conn.close()
+            if job["status"] in ["done", "failed", "cancelled"]:
+                latency = time.perf_counter() - started
+                conn, resp = self.call("DELETE", f"/srt/jobs/{job_id}")
+                resp.read()
+                conn.close()
+                return {"status": 200 if job["status"] == "done" else 500, "latency": latency, "audio_seconds": job["audio_seconds"]}
+            time.sleep(0.05)
+
+    def scenario(self, endpoint:str, media_type:str, concurrency:int, texts:list, encode_histogram) -> dict:
+        encode_before = encode_totals(encode_histogram)
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(self.run_one, endpoint, texts[index % len(texts)], media_type, index)
+                       for index in range(self.args.requests)]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append({"status": 0, "error": str(e)})
+        wall = time.perf_counter() - started
+
+        ok = [result for result in results if result["status"] == 200]
+        encode_ms = {}
+        for name, (calls, total) in encode_totals(encode_histogram).items():
+            before_calls, before_total = encode_before.get(name, (0, 0.0))
+            if calls > before_calls:
+                encode_ms[name] = {"calls": calls - before_calls, "mean": round((total - before_total) / (calls - before_calls) * 1000, 3)}
+        audio_seconds = sum(result.get("audio_seconds", 0) for result in ok)
+        if endpoint != "srt":
+            # 字节数换算音频时长只对未压缩格式准确, 压缩格式以 0 计
+            bytes_per_second = self.args.sample_rate * 2 if media_type in ["wav", "raw"] else None
+            audio_seconds = sum(result["bytes"] for result in ok) / bytes_per_second if bytes_per_second else 0
+        return {
+            "endpoint": endpoint,
+            "media_type": "wav" if endpoint == "srt" else media_type,
+            "concurrency": concurrency,
+            "requests": len(results),
+            "errors": sum(1 for result in results if result["status"] not in [200, 429]),
+            "rejected": sum(1 for result in results if result["status"] == 429),
+            "wall_seconds": round(wall, 3),
+            "throughput_rps": round(len(ok) / wall, 3) if wall > 0 else 0,
+            "audio_seconds_per_second": round(audio_seconds / wall, 3) if wall > 0 else 0,
+            "latency_ms": percentiles([result["latency"] for result in ok]),
+            "ttfb_ms": percentiles([result["ttfb"] for result in ok if result.get("ttfb") is not None]),
+            "encode_ms": encode_ms,
+        }
+
+
+# api_v5 的非流式接口不接受的输出格式
+STREAM_ONLY_MEDIA_TYPES = {"ogg"}
+
+
+def endpoint_media_types(endpoint:str, media_types:list) -> list:
+    """srt 只输出 wav; 非流式接口跳过只支持流式的格式"""
+    if endpoint == "srt":
+        return ["wav"]
+    if endpoint == "stream":
+        return media_types
+    return [media_type for media_type in media_types if media_type not in STREAM_ONLY_MEDIA_TYPES]
+
+
+def start_server(api, host:str, port:int):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(api.APP, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="bench-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def wait_ready(host:str, port:int, timeout:float=600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn = http.client.HTTPConnection(host, port, timeout=10)
+        try:
+            conn.request("GET", "/ready")
+            resp = conn.getresponse()
+            body = json.loads(resp.read())
+            if resp.status == 200:
+                return body
+            if body.get("stage") == "failed":
+                raise RuntimeError(f"server failed to load: {body.get('error')}")
+        finally:
+            conn.close()
+        time.sleep(0.2)
+    raise TimeoutError("server not ready")
+
+
+def free_port(host:str) -> int:
+    import socket
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    argv = sys.argv[1:]
+    server_args = []
+    if "--" in argv:
+        server_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+
+    parser = argparse.ArgumentParser(description="api_v5 offline benchmark")
+    parser.add_argument("--transcripts", type=str, nargs="*", default=[], help="聊天记录文件")
+    parser.add_argument("--include_user", action="store_true", help="用户消息也参与合成")
+    parser.add_argument("--endpoints", type=str, default="tts,stream,srt,tts_to_audio", help="default: tts,stream,srt,tts_to_audio")
+    parser.add_argument("--media_types", type=str, default="wav,ogg", help="default: wav,ogg")
+    parser.add_argument("--concurrency", type=str, default="1,4,16", help="default: 1,4,16")
+    parser.add_argument("--requests", type=int, default=32, help="每轮请求数, default: 32")
+    parser.add_argument("--text_lang", type=str, default="zh", help="default: zh")
+    parser.add_argument("--text_split_method", type=str, default="cut5", help="default: cut5")
+    parser.add_argument("--batch_size", type=int, default=1, help="default: 1")
+    parser.add_argument("--rtf", type=float, default=0.3, help="假后端实时率, default: 0.3")
+    parser.add_argument("--chars_per_second", type=float, default=5, help="假后端每秒音频的字数, default: 5")
+    parser.add_argument("--sample_rate", type=int, default=32000, help="假后端采样率, default: 32000")
+    parser.add_argument("--backend", type=str, default="bench_api:FakeTTS", help="假后端的 TTS 类, default: bench_api:FakeTTS")
+    parser.add_argument("--real_tts", action="store_true", help="使用已安装的 GPT-SoVITS")
+    parser.add_argument("--keep_cache", action="store_true", help="保留音频缓存")
+    parser.add_argument("--timeout", type=float, default=300, help="单个请求的超时(秒), default: 300")
+    parser.add_argument("--output", type=str, default=None, help="结果 json 路径, 默认输出到 stdout")
+    args = parser.parse_args(argv)
+
+    texts = load_transcripts(args.transcripts, args.include_user) or SAMPLE_MESSAGES
+    random.Random(0).shuffle(texts)
+
+    output_path = os.path.abspath(args.output) if args.output else None
+    host, port = "127.0.0.1", free_port("127.0.0.1")
+    if args.real_tts:
+        workdir = os.getcwd()
+        ref_audio_path = None
+    else:
+        # 在临时目录中运行, 缓存与字幕输出不落到当前目录
+        workdir = tempfile.mkdtemp(prefix="bench_api_")
+        ref_audio_path = os.path.join(workdir, "bench_ref.wav")
+        write_ref_audio(ref_audio_path, args.sample_rate)
+        os.environ.update({
+            ENV_FAKE: "1",
+            ENV_BACKEND: args.backend,
+            ENV_RTF: str(args.rtf),
+            ENV_CHARS_PER_SECOND: str(args.chars_per_second),
+            ENV_SAMPLE_RATE: str(args.sample_rate),
+            ENV_REF_AUDIO: ref_audio_path,
+        })
+        install_fake_backend()
+        os.chdir(workdir)
+
+    defaults = ["--ref_cache_dir", ""]
+    if not args.keep_cache:
+        defaults += ["--audio_cache_memory_mb", "0", "--audio_cache_disk_mb", "0"]
+    # api_v5 在导入时解析 sys.argv; 推理工作进程经 spawn 继承同一份 argv
+    sys.argv = ["api_v5.py", "-a", host, "-p", str(port), "--max_queue", "1024", "--max_client_requests", "0"] + defaults + server_args
+    sys.path.insert(0, now_dir)
+    import api_v5 as api
+
+    server, thread = start_server(api, host, port)
+    ready = wait_ready(host, port)
+    if ref_audio_path is None:
+        import config as global_config
+        ref_audio_path = global_config.llama_audio
+
+    bench = Bench(host, port, args, ref_audio_path)
+    scenarios = []
+    for endpoint in args.endpoints.split(","):
+        for media_type in endpoint_media_types(endpoint, args.media_types.split(",")):
+            for concurrency in [int(value) for value in args.concurrency.split(",")]:
+                result = bench.scenario(endpoint, media_type, concurrency, texts, api.ENCODE)
+                print(f"{endpoint} {result['media_type']} x{concurrency}: {result['throughput_rps']} req/s, "
+                      f"p50 {result['latency_ms'].get('p50')} ms, p99 {result['latency_ms'].get('p99')} ms", file=sys.stderr)
+                scenarios.append(result)
+
+    report = {
+        "config": dict(vars(args), server_args=sys.argv[1:], messages=len(texts), startup=ready.get("timings")),
+        "scenarios": scenarios,
+    }
+    server.should_exit = True
+    thread.join(timeout=10)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,183 @@
 import { getPreviewString, saveTtsProviderSettings } from './index.js';
+import { eventSource, event_types } from '../../../script.js';
+import { extension_settings, getContext } from '../../extensions.js';
 
 export { GptSovitsV2Provider };
 
+/**
+ * One incremental synthesis over the /ws/tts WebSocket: text deltas are pushed as they arrive,
+ * and the raw 16-bit mono PCM the server sends back is scheduled gaplessly through WebAudio.
+ */
+class IncrementalTtsSession {
+    constructor(endpoint, params) {
+        this.socket = new WebSocket(`${endpoint.replace(/^http/, 'ws')}/ws/tts`);
+        this.socket.binaryType = 'arraybuffer';
+        this.context = new AudioContext();
+        this.sampleRate = null;
+        this.playhead = 0;
+        this.outbox = [JSON.stringify({ type: 'start', ...params })];
+        this.socket.onopen = () => this.flush();
+        this.socket.onmessage = (event) => this.onMessage(event);
+        this.socket.onclose = () => {
+            // Let the scheduled audio finish before releasing the audio context
+            const remaining = Math.max(0, this.playhead - this.context.currentTime);
+            setTimeout(() => this.closeContext(), remaining * 1000 + 500);
+        };
+    }
+
+    send(message) {
+        this.outbox.push(JSON.stringify(message));
+        this.flush();
+    }
+
+    flush() {
+        if (this.socket.readyState !== WebSocket.OPEN) {
+            return;
+        }
+        for (const message of this.outbox) {
+            this.socket.send(message);
+        }
+        this.outbox = [];
+    }
+
+    push(text) {
+        if (text) {
+            this.send({ type: 'text', text: text });
+        }
+    }
+
+    end() {
+        this.send({ type: 'end' });
+    }
+
+    cancel() {
+        this.send({ type: 'cancel' });
+        this.socket.close();
+        this.closeContext();
+    }
+
+    closeContext() {
+        if (this.context.state !== 'closed') {
+            this.context.close();
+        }
+    }
+
+    onMessage(event) {
+        if (typeof event.data === 'string') {
+            const message = JSON.parse(event.data);
+            if (message.type === 'audio_start') {
+                this.sampleRate = message.sample_rate;
+            } else if (message.type === 'error') {
+                console.warn(`GPT-SoVITS-V2: incremental TTS error: ${message.message}`);
+            }
+            return;
+        }
+        this.play(event.data);
+    }
+
+    play(data) {
+        const samples = new Int16Array(data, 0, Math.floor(data.byteLength / 2));
+        if (samples.length === 0 || !this.sampleRate || this.context.state === 'closed') {
+            return;
+        }
+        const buffer = this.context.createBuffer(1, samples.length, this.sampleRate);
+        const channel = buffer.getChannelData(0);
+        for (let i = 0; i < samples.length; i++) {
+            channel[i] = samples[i] / 32768;
+        }
+        const source = this.context.createBufferSource();
+        source.buffer = buffer;
+        source.connect(this.context.destination);
+        this.playhead = Math.max(this.playhead, this.context.currentTime);
+        source.start(this.playhead);
+        this.playhead += buffer.duration;
+    }
+}
+
+const idbRequest = (request) => new Promise((resolve, reject) => {
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+});
+
+/**
+ * Size-bounded store of synthesized audio in IndexedDB, keyed by the whole request (endpoint, text, voice and
+ * generation settings). Every hit refreshes the entry's lastUsed time and the least recently used entries are evicted.
+ */
+class TtsAudioCache {
+    constructor(maxBytes) {
+        this.maxBytes = maxBytes;
+        this.db = null;
+    }
+
+    open() {
+        if (this.db === null) {
+            this.db = new Promise((resolve, reject) => {
+                const request = indexedDB.open('gpt-sovits-v2-audio', 1);
+                request.onupgradeneeded = () => {
+                    const store = request.result.createObjectStore('audio', { keyPath: 'key' });
+                    store.createIndex('lastUsed', 'lastUsed');
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            });
+        }
+        return this.db;
+    }
+
+    async store(mode) {
+        const db = await this.open();
+        return db.transaction('audio', mode).objectStore('audio');
+    }
+
+    async get(key) {
+        const store = await this.store('readwrite');
+        const entry = await idbRequest(store.get(key));
+        if (entry) {
+            entry.lastUsed = Date.now();
+            await idbRequest(store.put(entry));
+        }
+        return entry;
+    }
+
+    async put(key, blob) {
+        const store = await this.store('readwrite');
+        await idbRequest(store.put({ key: key, blob: blob, size: blob.size, lastUsed: Date.now() }));
+        await this.evict();
+    }
+
+    async evict() {
+        const store = await this.store('readwrite');
+        // Oldest first
+        const entries = [];
+        await new Promise((resolve, reject) => {
+            const request = store.index('lastUsed').openCursor();
+            request.onsuccess = () => {
+                const cursor = request.result;
+                if (!cursor) {
+                    resolve();
+                    return;
+                }
+                entries.push([cursor.primaryKey, cursor.value.size]);
+                cursor.continue();
+            };
+            request.onerror = () => reject(request.error);
+        });
+        let total = entries.reduce((sum, [, size]) => sum + size, 0);
+        for (const [key, size] of entries) {
+            if (total <= this.maxBytes) {
+                break;
+            }
+            store.delete(key);
+            total -= size;
+        }
+    }
+
+    async clear() {
+        const store = await this.store('readwrite');
+        await idbRequest(store.clear());
+    }
+}
+
 class GptSovitsV2Provider {
     //########//
     // Config //
@@ -12,6 +188,14 @@ class GptSovitsV2Provider {
     voices = [];
     separator = '. ';
     audioElement = document.createElement('audio');
+    incrementalSession = null;
+    incrementalText = '';
+    eventsRegistered = false;
+    audioCache = null;
+    // Requests in flight by cache key, shared between playback and prefetch
+    pending = new Map();
+    prefetchQueue = [];
+    prefetchActive = 0;
 
     /**
      * Perform any text processing before passing to TTS engine.
@@ -23,7 +207,10 @@ class GptSovitsV2Provider {
         return text;
     }
 
-    audioFormats = ['wav', 'ogg', 'aac', 'raw'];
+    audioFormats = ['wav', 'ogg', 'aac', 'raw', 'opus', 'webm'];
+
+    // 0 表示保持模型采样率 (opus/webm 为 48000)
+    sampleRates = [0, 16000, 24000, 48000];
 
     languageLabels = {
         'zh': '中文',
@@ -45,7 +232,15 @@ class GptSovitsV2Provider {
         top_k: 5,
         top_p: 1.0,
         temperature: 1.0,
-        repetition_penalty: 1.35
+        repetition_penalty: 1.35,
+        sample_rate: 0,
+        bitrate: 32,
+        incremental: false,
+        incremental_voice: '',
+        low_latency: false,
+        cache_mb: 200,
+        prefetch: false,
+        prefetch_concurrency: 2
     };
 
     get settingsHtml() {
@@ -78,10 +273,41 @@ class GptSovitsV2Provider {
         }
 
         html += `</select><br/>
+        <label for="sample_rate">输出采样率:</label>
+        <select id="sample_rate">`;
+
+        for (let rate of this.sampleRates) {
+            html += `<option value="${rate}" ${rate === this.defaultSettings.sample_rate ? 'selected' : ''}>${rate === 0 ? '默认' : rate}</option>`;
+        }
+
+        html += `</select><br/>
+        <label for="bitrate">比特率 (kbps, aac/opus/webm): <span id="bitrate_output">${this.defaultSettings.bitrate}</span></label>
+        <input id="bitrate" type="range" value="${this.defaultSettings.bitrate}" min="8" max="192" step="8" /><br/>
+
         <label for="streaming" class="checkbox_label">
             <input id="streaming" type="checkbox" ${this.defaultSettings.streaming ? 'checked' : ''}/>
             <span>Streaming</span>
+        </label>
+        <label for="low_latency" class="checkbox_label">
+            <input id="low_latency" type="checkbox" ${this.defaultSettings.low_latency ? 'checked' : ''}/>
+            <span>首句优先 (流式时先单独合成第一句)</span>
         </label><br/>
+
+        <label for="incremental" class="checkbox_label">
+            <input id="incremental" type="checkbox" ${this.defaultSettings.incremental ? 'checked' : ''}/>
+            <span>边生成边朗读 (WebSocket, 启用时请关闭自动朗读)</span>
+        </label>
+        <label for="incremental_voice">边生成边朗读的音色:</label>
+        <select id="incremental_voice"></select><br/>
+
+        <label for="cache_mb">本地音频缓存 (MB, 0 为关闭, 非流式时生效): <span id="cache_mb_output">${this.defaultSettings.cache_mb}</span></label>
+        <input id="cache_mb" type="range" value="${this.defaultSettings.cache_mb}" min="0" max="2000" step="50" /><br/>
+        <label for="prefetch" class="checkbox_label">
+            <input id="prefetch" type="checkbox" ${this.defaultSettings.prefetch ? 'checked' : ''}/>
+            <span>预先合成 (后台合成新消息与相邻的 swipe)</span>
+        </label>
+        <label for="prefetch_concurrency">预先合成并发数: <span id="prefetch_concurrency_output">${this.defaultSettings.prefetch_concurrency}</span></label>
+        <input id="prefetch_concurrency" type="range" value="${this.defaultSettings.prefetch_concurrency}" min="1" max="4" step="1" /><br/>
         
         <label for="text_split_method">切分:</label>
         <select id="text_split_method">`;
@@ -152,6 +378,7 @@ class GptSovitsV2Provider {
         this.settings.prompt_lang = $('#prompt_lang').val();
         this.settings.format = $('#format').val();
         this.settings.streaming = $('#streaming').is(':checked');
+        this.settings.low_latency = $('#low_latency').is(':checked');
         this.settings.text_split_method = $('#text_split_method').val();
         this.settings.batch_size = parseInt($('#batch_size').val(), 10);
         this.settings.batch_threshold = parseFloat($('#batch_threshold').val());
@@ -160,6 +387,14 @@ class GptSovitsV2Provider {
         this.settings.top_p = parseFloat($('#top_p').val());
         this.settings.temperature = parseFloat($('#temperature').val());
         this.settings.repetition_penalty = parseFloat($('#repetition_penalty').val());
+        this.settings.sample_rate = parseInt($('#sample_rate').val(), 10);
+        this.settings.bitrate = parseInt($('#bitrate').val(), 10);
+        this.settings.incremental = $('#incremental').is(':checked');
+        this.settings.incremental_voice = $('#incremental_voice').val() ?? '';
+        this.settings.cache_mb = parseInt($('#cache_mb').val(), 10);
+        this.settings.prefetch = $('#prefetch').is(':checked');
+        this.settings.prefetch_concurrency = parseInt($('#prefetch_concurrency').val(), 10);
+        this.updateAudioCache();
 
         // Update UI to reflect changes
         $('#batch_size_output').text(this.settings.batch_size);
@@ -169,6 +404,9 @@ class GptSovitsV2Provider {
         $('#top_p_output').text(this.settings.top_p);
         $('#temperature_output').text(this.settings.temperature);
         $('#repetition_penalty_output').text(this.settings.repetition_penalty);
+        $('#bitrate_output').text(this.settings.bitrate);
+        $('#cache_mb_output').text(this.settings.cache_mb);
+        $('#prefetch_concurrency_output').text(this.settings.prefetch_concurrency);
 
         saveTtsProviderSettings();
         this.changeTTSSettings();
@@ -187,6 +425,7 @@ class GptSovitsV2Provider {
         $('#prompt_lang').val(this.settings.prompt_lang);
         $('#format').val(this.settings.format);
         $('#streaming').prop('checked', this.settings.streaming);
+        $('#low_latency').prop('checked', this.settings.low_latency);
         $('#text_split_method').val(this.settings.text_split_method);
         $('#batch_size').val(this.settings.batch_size);
         $('#batch_threshold').val(this.settings.batch_threshold);
@@ -195,6 +434,13 @@ class GptSovitsV2Provider {
         $('#top_p').val(this.settings.top_p);
         $('#temperature').val(this.settings.temperature);
         $('#repetition_penalty').val(this.settings.repetition_penalty);
+        $('#sample_rate').val(this.settings.sample_rate);
+        $('#bitrate').val(this.settings.bitrate);
+        $('#incremental').prop('checked', this.settings.incremental);
+        $('#cache_mb').val(this.settings.cache_mb);
+        $('#prefetch').prop('checked', this.settings.prefetch);
+        $('#prefetch_concurrency').val(this.settings.prefetch_concurrency);
+        this.updateAudioCache();
 
         // Update UI to reflect initial settings 
         $('#batch_size_output').text(this.settings.batch_size);
@@ -204,9 +450,12 @@ class GptSovitsV2Provider {
         $('#top_p_output').text(this.settings.top_p);
         $('#temperature_output').text(this.settings.temperature);
         $('#repetition_penalty_output').text(this.settings.repetition_penalty);
+        $('#bitrate_output').text(this.settings.bitrate);
+        $('#cache_mb_output').text(this.settings.cache_mb);
+        $('#prefetch_concurrency_output').text(this.settings.prefetch_concurrency);
 
         // Register event listeners
-        $('#tts_endpoint, #lang, #prompt_lang, #format, #streaming, #text_split_method, #batch_size, #batch_threshold, #speed_factor, #top_k, #top_p, #temperature, #repetition_penalty, #change_model_button').on('input change click', () => {
+        $('#tts_endpoint, #lang, #prompt_lang, #format, #sample_rate, #bitrate, #streaming, #low_latency, #incremental, #incremental_voice, #cache_mb, #prefetch, #prefetch_concurrency, #text_split_method, #batch_size, #batch_threshold, #speed_factor, #top_k, #top_p, #temperature, #repetition_penalty, #change_model_button').on('input change click', () => {
             if (event.target.id === 'change_model_button') {
                 this.changeModel(); // Call changeModel function for button click
             } else {
@@ -215,12 +464,31 @@ class GptSovitsV2Provider {
         });
 
 
-        await this.checkReady();
+        if (!this.eventsRegistered) {
+            this.eventsRegistered = true;
+            eventSource.on(event_types.STREAM_TOKEN_RECEIVED, (text) => this.onStreamToken(text));
+            eventSource.on(event_types.GENERATION_ENDED, () => this.endIncremental());
+            eventSource.on(event_types.GENERATION_STOPPED, () => this.cancelIncremental());
+            eventSource.on(event_types.MESSAGE_RECEIVED, (messageId) => this.prefetchMessage(messageId));
+            eventSource.on(event_types.MESSAGE_SWIPED, (messageId) => this.prefetchSwipes(messageId));
+        }
+
+        try {
+            await this.checkReady();
+        } catch (error) {
+            console.warn(error.message);
+        }
         await this.fetchAvailableModels(); // Fetch available models on load
         console.info('GPT-SoVITS-V2: Settings loaded');
     }
 
     async checkReady() {
+        // The server binds before the model is loaded; /ready reports the loading stage until it can synthesize
+        const response = await fetch(`${this.settings.provider_endpoint}/ready`);
+        if (!response.ok) {
+            const status = await response.json().catch(() => ({}));
+            throw new Error(`GPT-SoVITS is not ready: ${status.error ?? status.stage ?? response.statusText}`);
+        }
         await Promise.allSettled([this.fetchTtsVoiceObjects(), this.changeTTSSettings()]);
     }
 
@@ -233,12 +501,13 @@ class GptSovitsV2Provider {
     //#################//
 
     async getVoice(voiceName) {
-        if (this.voices.length === 0) {
+        let match = this.voices.find(v => v.name === voiceName);
+        if (!match) {
+            // The list is revalidated with its ETag, so re-fetching only costs a 304 when nothing changed
             this.voices = await this.fetchTtsVoiceObjects();
+            match = this.voices.find(v => v.name === voiceName);
         }
 
-        const match = this.voices.filter(v => v.name === voiceName)[0];
-
         if (!match) {
             throw `TTS Voice name ${voiceName} not found`;
         }
@@ -254,27 +523,71 @@ class GptSovitsV2Provider {
     // API CALLS //
     //###########//
     async fetchTtsVoiceObjects() {
-        const response = await fetch(`${this.settings.provider_endpoint}/speakers`);
+        const response = await fetch(`${this.settings.provider_endpoint}/speakers`, { cache: 'no-cache' });
 
         if (!response.ok) {
             throw new Error(`HTTP ${response.status}: ${await response.json()}`);
         }
         const responseJson = await response.json();
         this.voices = responseJson;
+        this.populateVoiceDropdown();
         return responseJson;
     }
 
+    populateVoiceDropdown() {
+        const voiceSelect = $('#incremental_voice');
+        voiceSelect.empty();
+        this.voices.forEach(voice => {
+            voiceSelect.append(`<option value="${voice.voice_id}">${voice.name}</option>`);
+        });
+        if (this.settings.incremental_voice) {
+            voiceSelect.val(this.settings.incremental_voice);
+        }
+    }
+
+    /**
+     * Called with the whole message text so far while the LLM is streaming; pushes only the new part.
+     * @param {string} text Message text received so far
+     */
+    onStreamToken(text) {
+        if (!this.settings.incremental || typeof text !== 'string') {
+            return;
+        }
+        if (this.incrementalSession === null || !text.startsWith(this.incrementalText)) {
+            // A new message (or a swipe/regeneration) started: drop whatever was still playing
+            this.cancelIncremental();
+            const voiceId = this.settings.incremental_voice || this.voices[0]?.voice_id;
+            if (!voiceId) {
+                return;
+            }
+            this.incrementalSession = new IncrementalTtsSession(this.settings.provider_endpoint, { ...this.ttsParams(voiceId), media_type: 'raw' });
+        }
+        this.incrementalSession.push(this.processText(text.slice(this.incrementalText.length)));
+        this.incrementalText = text;
+    }
+
+    endIncremental() {
+        this.incrementalSession?.end();
+        this.incrementalSession = null;
+        this.incrementalText = '';
+    }
+
+    cancelIncremental() {
+        this.incrementalSession?.cancel();
+        this.incrementalSession = null;
+        this.incrementalText = '';
+    }
+
     async changeTTSSettings() {
         // No specific settings to change in GPT-SoVITS-V2 based on these UI settings
         // You might want to add logic here if your API supports dynamic settings changes
     }
 
-    async fetchTtsGeneration(inputText, voiceId) {
-        console.info(`Generating new TTS for voice_id ${voiceId}`);
-
+    ttsParams(voiceId) {
+        // The server reports each voice's real file, so .mp3 voices are not sent as .wav
+        const voice = this.voices.find(v => v.voice_id === voiceId);
         const params = {
-            text: inputText,
-            ref_audio_path: `./参考音频/${voiceId}.wav`, // Assuming this path structure
+            ref_audio_path: voice?.ref_audio_path ?? `./参考音频/${voiceId}.wav`,
             text_lang: this.settings.lang,
             prompt_lang: this.settings.prompt_lang,
             text_split_method: this.settings.text_split_method,
@@ -288,10 +601,41 @@ class GptSovitsV2Provider {
             streaming_mode: this.settings.streaming.toString(),
             repetition_penalty: this.settings.repetition_penalty,
         };
+        if (voice?.prompt_text) {
+            params.prompt_text = voice.prompt_text;
+        }
+        if (this.settings.sample_rate) {
+            params.sample_rate = this.settings.sample_rate;
+        }
+        if (this.settings.streaming && this.settings.low_latency) {
+            params.low_latency = true;
+        }
+        if (['aac', 'opus', 'webm'].includes(this.settings.format)) {
+            params.bitrate = this.settings.bitrate;
+        }
+        return params;
+    }
 
-        const url = `${this.settings.provider_endpoint}/`;
+    async fetchTtsGeneration(inputText, voiceId) {
+        const params = { text: inputText, ...this.ttsParams(voiceId) };
+        if (this.settings.streaming || this.audioCache === null) {
+            console.info(`Generating new TTS for voice_id ${voiceId}`);
+            return this.requestTts(params);
+        }
 
-        const response = await fetch(url, {
+        const key = this.cacheKey(params);
+        const cached = await this.audioCache.get(key).catch(() => undefined);
+        if (cached) {
+            console.info(`Using cached TTS for voice_id ${voiceId}`);
+            return new Response(cached.blob, { headers: { 'Content-Type': cached.blob.type } });
+        }
+        console.info(`Generating new TTS for voice_id ${voiceId}`);
+        const blob = await (this.pending.get(key) ?? this.synthesize(params, key));
+        return new Response(blob, { headers: { 'Content-Type': blob.type } });
+    }
+
+    async requestTts(params, quiet = false) {
+        const response = await fetch(`${this.settings.provider_endpoint}/`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -300,18 +644,129 @@ class GptSovitsV2Provider {
         });
 
         if (!response.ok) {
-            toastr.error(response.statusText, 'TTS Generation Failed');
+            if (!quiet) {
+                toastr.error(response.statusText, 'TTS Generation Failed');
+            }
             throw new Error(`HTTP ${response.status}: ${await response.text()}`);
         }
         return response;
     }
 
+    cacheKey(params) {
+        return JSON.stringify([this.settings.provider_endpoint, params]);
+    }
+
+    updateAudioCache() {
+        if (this.settings.cache_mb > 0 && typeof indexedDB !== 'undefined') {
+            this.audioCache ??= new TtsAudioCache(0);
+            this.audioCache.maxBytes = this.settings.cache_mb * 1024 * 1024;
+        } else {
+            this.audioCache = null;
+        }
+    }
+
+    /**
+     * Runs one non-streaming request and stores the audio in the cache. While it runs, playback and prefetch
+     * of the same request wait for it instead of sending another one.
+     */
+    synthesize(params, key, quiet = false) {
+        const pending = this.requestTts(params, quiet)
+            .then(async (response) => {
+                const blob = await response.blob();
+                await this.audioCache?.put(key, blob).catch((error) => console.warn(`GPT-SoVITS-V2: audio cache write failed: ${error}`));
+                return blob;
+            })
+            .finally(() => this.pending.delete(key));
+        this.pending.set(key, pending);
+        return pending;
+    }
+
+    prefetch(text, voiceId) {
+        if (!this.settings.prefetch || this.settings.streaming || this.audioCache === null || !text || !voiceId) {
+            return;
+        }
+        this.prefetchQueue.push({ text, voiceId });
+        this.drainPrefetch();
+    }
+
+    drainPrefetch() {
+        while (this.prefetchActive < this.settings.prefetch_concurrency && this.prefetchQueue.length > 0) {
+            const { text, voiceId } = this.prefetchQueue.shift();
+            this.prefetchActive++;
+            this.prefetchOne(text, voiceId)
+                .catch((error) => console.debug(`GPT-SoVITS-V2: prefetch failed: ${error}`))
+                .finally(() => {
+                    this.prefetchActive--;
+                    this.drainPrefetch();
+                });
+        }
+    }
+
+    async prefetchOne(text, voiceId) {
+        const params = { text: this.processText(text), ...this.ttsParams(voiceId) };
+        const key = this.cacheKey(params);
+        if (this.pending.has(key) || await this.audioCache.get(key)) {
+            return;
+        }
+        await this.synthesize(params, key, true);
+    }
+
+    /**
+     * Mirrors the clean-up the TTS extension applies to a message before calling generateTts, so prefetched
+     * entries match the requests made at playback. A mismatch only costs one redundant synthesis.
+     */
+    ttsText(text) {
+        const tts = extension_settings.tts ?? {};
+        if (tts.narrate_quoted_only) {
+            return '';
+        }
+        if (tts.skip_codeblocks) {
+            text = text.replace(/^\s{4}.*$/gm, '').trim();
+            text = text.replace(/```.*?```/gs, '').trim();
+        }
+        if (tts.skip_tags) {
+            text = text.replace(/<.*?>[\s\S]*?<\/.*?>/g, '').trim();
+        }
+        if (!tts.pass_asterisks) {
+            text = tts.narrate_dialogues_only ? text.replace(/\*[^*]*?(\*|$)/g, '').trim() : text.replaceAll('*', '').trim();
+        }
+        return text.replace(/\s+/g, ' ').trim();
+    }
+
+    voiceIdFor(characterName) {
+        const voiceMap = extension_settings.tts?.[extension_settings.tts?.currentProvider]?.voiceMap ?? {};
+        const voiceName = voiceMap[characterName] ?? voiceMap['[Default Voice]'];
+        return this.voices.find(v => v.name === voiceName)?.voice_id;
+    }
+
+    prefetchMessage(messageId) {
+        const message = getContext().chat[messageId];
+        if (!message || message.is_user || message.is_system) {
+            return;
+        }
+        this.prefetch(this.ttsText(message.mes), this.voiceIdFor(message.name));
+    }
+
+    prefetchSwipes(messageId) {
+        const message = getContext().chat[messageId];
+        if (!message || !Array.isArray(message.swipes)) {
+            return;
+        }
+        // The swipes on either side of the current one are the next to be shown
+        const voiceId = this.voiceIdFor(message.name);
+        for (const index of [message.swipe_id + 1, message.swipe_id - 1]) {
+            if (index >= 0 && index < message.swipes.length) {
+                this.prefetch(this.ttsText(message.swipes[index]), voiceId);
+            }
+        }
+    }
+
     async fetchTtsFromHistory(history_item_id) {
         return Promise.resolve(history_item_id);
     }
 
     async fetchAvailableModels() {
-        const response = await fetch(`${this.settings.provider_endpoint}/available_models`);
+        const response = await fetch(`${this.settings.provider_endpoint}/available_models`, { cache: 'no-cache' });
         if (!response.ok) {
             throw new Error(`HTTP ${response.status}: ${await response.text()}`);
         }
@@ -364,6 +819,8 @@ class GptSovitsV2Provider {
             toastr.error(response.statusText, 'Failed to Change Model');
             throw new Error(`HTTP ${response.status}: ${await response.text()}`);
         }
+        // Cached audio was produced by the previous weights
+        await this.audioCache?.clear().catch(() => undefined);
         toastr.success('Model Changed Successfully');
     }
 }
\ No newline at end of file